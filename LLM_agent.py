@@ -1,11 +1,18 @@
 import socket
+import select
 import json
 import os
 import torch
 import numpy as np
-from open_clip import tokenize
-from openai import OpenAI
 import collections
+import re
+import time
+import hashlib
+from typing import TYPE_CHECKING
+from utils.llm_backends import as_backend
+if TYPE_CHECKING:
+    from openai import OpenAI
+    from utils.llm_backends import LLMBackend
 
 MAX_HISTORY_SIZE = 30  # Adjust this limit as needed
 
@@ -34,8 +41,17 @@ def load_best_frames(source_dir, tf_name):
 
     return best_frames
 
+#* datasets whose objects the command prompt maps to TFs through the dataset info, not the open-vocabulary results
+TF_MAPPED_DATASETS = ["mantle", "supernova", "hurricane"]
+
+def dataset_maps_tfs(dataset_info, source_dir):
+    """True if the TF of an object is given by the dataset info ("TF03 is the ...") rather than by CLIP."""
+    names = f"{dataset_info} {os.path.basename(os.path.normpath(source_dir or ''))}".lower()
+    return any(name in names for name in TF_MAPPED_DATASETS) or re.search(r"\btf\s*\d+", names) is not None
+
 def embed_text(description, model):
     """Embeds a textual description using CLIP."""
+    from open_clip import tokenize
     tokenized_text = tokenize([description])
     with torch.no_grad():
         text_embedding = model.encode_text(tokenized_text).squeeze(0).numpy()
@@ -79,6 +95,178 @@ def find_best_tfs(description_embedding, description, tf_embeddings, threshold=0
 
     return top_tfs
 
+class TextEmbeddingService:
+    """
+    CLIP text embeddings and TF similarity search for the open-vocabulary stage.
+    The TF embeddings are normalized once into a [num_TF, D] matrix, the descriptions of a query are encoded
+    with one batched encode_text call and kept in an LRU cache (text -> normalized embedding).
+    """
+    def __init__(self, clip_model, tf_embeddings: dict, cache_size=512):
+        self.clip_model = clip_model
+        self.tf_names = list(tf_embeddings.keys())
+        tf_matrix = np.stack([np.asarray(tf_embeddings[name], dtype=np.float32).reshape(-1) for name in self.tf_names])
+        self.tf_matrix = tf_matrix / np.linalg.norm(tf_matrix, axis=1, keepdims=True)
+        self.cache_size = cache_size
+        self.cache = collections.OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def embed_texts(self, descriptions):
+        """Normalized embeddings [len(descriptions), D]; only the uncached descriptions are encoded, in one batch."""
+        missing = list(dict.fromkeys(d for d in descriptions if d not in self.cache))
+        self.cache_hits += len(descriptions) - len(missing)
+        self.cache_misses += len(missing)
+        if missing:
+            from open_clip import tokenize
+            with torch.no_grad():
+                text_embeddings = self.clip_model.encode_text(tokenize(missing)).float().cpu().numpy()
+            text_embeddings /= np.linalg.norm(text_embeddings, axis=1, keepdims=True)
+            for description, text_embedding in zip(missing, text_embeddings):
+                self.cache[description] = text_embedding
+        embeddings = []
+        for description in descriptions:
+            self.cache.move_to_end(description)
+            embeddings.append(self.cache[description])
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return np.stack(embeddings) if embeddings else np.zeros((0, self.tf_matrix.shape[1]), dtype=np.float32)
+
+    def similarities(self, descriptions):
+        """Cosine similarities [len(descriptions), num_TF] as one matrix product."""
+        return self.embed_texts(descriptions) @ self.tf_matrix.T
+
+    def find_best_tf(self, description):
+        similarity = self.similarities([description])[0]
+        best = int(np.argmax(similarity))
+        return self.tf_names[best], similarity[best]
+
+    def find_best_tfs(self, descriptions, threshold=0.01):
+        """Same selection as find_best_tfs, for every description: [[(tf_name, similarity, description), ...], ...]."""
+        results = []
+        for description, similarity in zip(descriptions, self.similarities(descriptions)):
+            order = np.argsort(-similarity, kind="stable")
+            best = similarity[order[0]]
+            #* the best match is always included, then the sorted TFs within the threshold
+            results.append([(self.tf_names[i], similarity[i], description)
+                            for i in order if similarity[i] >= best - threshold])
+        return results
+
+class SemanticResponseCache:
+    """
+    Final answers (Part1 commands + Part2 explanations) of first-iteration requests, found again for a paraphrase:
+    an entry is returned when its request embedding (TextEmbeddingService) has a cosine similarity >= threshold with
+    the new one, and the dataset / scene status digest, the resolved objects (targets) and the literal words (numbers,
+    colors) of both requests are equal. The lookup happens after the extraction call and the CLIP matching, a hit
+    skips the command call. Entries expire after ttl seconds, the least recently used ones are evicted beyond max_entries.
+    """
+    #* words a near-identical embedding does not tell apart ("the bones in red" / "the bones in blue")
+    LITERAL_WORDS = {"red", "green", "blue", "yellow", "orange", "purple", "pink", "white", "black", "gray", "grey",
+                     "brown", "cyan", "magenta", "transparent", "opaque", "hide", "only", "all", "not",
+                     "more", "less", "brighter", "darker", "left", "right", "top", "bottom", "front", "back"}
+
+    def __init__(self, threshold=0.95, ttl=24 * 3600, max_entries=256, path=None):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.path = path
+        self.entries = collections.OrderedDict()  # id -> dict(embedding, digest, targets, literals, commands, explanations, time)
+        self.next_id = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    #* status entries that describe the renderer, not the scene
+    RENDERER_STATUS = {"adaptive_resolution"}
+
+    @classmethod
+    def status_digest(cls, status, dataset_info, source_dir):
+        """
+        The context the commands depend on: dataset and the scene status (mode, opacities, palettes, light,
+        freeze_view, legend, ...). The commands are absolute values computed from the status ("brighter" ->
+        set_light ambient 1.5, a set_view only without freeze_view), so an answer is only replayed on the same state.
+        """
+        scene = {key: value for key, value in status.items() if key not in cls.RENDERER_STATUS}
+        relevant = {"dataset": dataset_info, "source_dir": os.path.abspath(source_dir), "status": scene}
+        return hashlib.sha1(json.dumps(relevant, sort_keys=True).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def targets(best_tf, best_stylization_tf, stylize_prompt):
+        """
+        The objects a request resolved to: for every extracted description the TFs CLIP matched, and the stylization
+        prompt. "make the skull red" and "make the jaw red" embed alike but differ here.
+        """
+        def tf_sets(matches):
+            if not isinstance(matches, list):
+                return None  # "no TF specified"
+            per_description = collections.defaultdict(set)
+            for description, tf_name, _ in matches:
+                per_description[description].add(tf_name)
+            return sorted(sorted(tf_names) for tf_names in per_description.values())
+        return json.dumps({"manipulation": tf_sets(best_tf), "stylization": tf_sets(best_stylization_tf),
+                           "stylize_prompt": stylize_prompt}, sort_keys=True)
+
+    @classmethod
+    def literals(cls, text):
+        words = re.findall(r"[a-z]+|\d+(?:\.\d+)?", text.lower())
+        return sorted({w for w in words if w in cls.LITERAL_WORDS or w[0].isdigit()})
+
+    def expire(self, now=None):
+        now = time.time() if now is None else now
+        for key in [key for key, entry in self.entries.items() if now - entry["time"] > self.ttl]:
+            del self.entries[key]
+            self.evictions += 1
+
+    def get(self, embedding, digest, targets, text):
+        """(commands, explanations) of the most similar matching entry, or None."""
+        self.expire()
+        literals = self.literals(text)
+        best_key, best_similarity = None, self.threshold
+        for key, entry in self.entries.items():
+            if entry["digest"] != digest or entry.get("targets") != targets or entry["literals"] != literals:
+                continue
+            similarity = float(np.dot(entry["embedding"], embedding))
+            if similarity >= best_similarity:
+                best_key, best_similarity = key, similarity
+        if best_key is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(best_key)
+        entry = self.entries[best_key]
+        return list(entry["commands"]), list(entry["explanations"])
+
+    def put(self, embedding, digest, targets, text, commands, explanations):
+        self.entries[self.next_id] = {"embedding": np.asarray(embedding, dtype=np.float32), "digest": digest,
+                                      "targets": targets, "literals": self.literals(text), "text": text, "commands": list(commands),
+                                      "explanations": list(explanations), "time": time.time()}
+        self.next_id += 1
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        if self.path is not None:
+            self.save(self.path)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self.entries), "evictions": self.evictions}
+
+    def save(self, path):
+        entries = [dict(entry, embedding=entry["embedding"].tolist()) for entry in self.entries.values()]
+        with open(path, "w") as f:
+            json.dump(entries, f)
+
+    def load(self, path):
+        with open(path, "r") as f:
+            entries = json.load(f)
+        for entry in entries:
+            entry["embedding"] = np.asarray(entry["embedding"], dtype=np.float32)
+            self.entries[self.next_id] = entry
+            self.next_id += 1
+        self.expire()
+
 def send_command(command, host="127.0.0.1", port=65432):
     """
     Sends a single command string to the gui.py server.
@@ -88,29 +276,137 @@ def send_command(command, host="127.0.0.1", port=65432):
         s.sendall(command.encode("utf-8"))
         print(f"Sent command: {command}")
 
+def recv_line(sock):
+    """Reads one newline-terminated reply (of any size) from the GUI server."""
+    chunks = []
+    while True:
+        data = sock.recv(65536)
+        if not data:
+            break
+        chunks.append(data)
+        if data.endswith(b"\n"):
+            break
+    return b"".join(chunks).decode("utf-8")
+
+def send_commands(commands, host="127.0.0.1", port=65432):
+    """
+    Sends a batch of commands to the gui.py server as one framed JSON message (see utils/command_server.py).
+    The GUI applies all of them or none; returns the reply dict {"ok", "results" | "errors"}.
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.connect((host, port))
+        s.sendall((json.dumps({"commands": list(commands)}) + "\n").encode("utf-8"))
+        reply = json.loads(recv_line(s))
+    if not reply["ok"]:
+        print(f"Command batch rejected: {reply['errors']}")
+    return reply
+
 def get_status(host="127.0.0.1", port=65432):
     """
     Sends 'get_status' command to the GUI and waits for the returned status JSON.
     Returns the parsed JSON as a Python dict, or None if failed.
     """
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.connect((host, port))
-        s.sendall(b"get_status")
-        data = s.recv(4096).decode('utf-8')
+    try:
+        reply = send_commands(["get_status"], host, port)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Failed to get GUI status: {e}")
+        return None
+    if not reply["ok"]:
+        print("No status returned by GUI.")
+        return None
+    return reply["results"][0]
 
-    if "Current Status:" in data:
-        json_str = data.split("Current Status:")[1].strip()
+class GUIClient:
+    """
+    Reusable client of the gui.py socket server: one persistent connection for all commands and status reads
+    (framed JSON protocol, see utils/command_server.py). A connection the GUI has closed is replaced before sending,
+    a batch is resent only if it could not be sent: once sent it may have been applied, so a lost reply raises.
+    """
+    def __init__(self, host="127.0.0.1", port=65432, timeout=30.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.sock = None
+        self.reader = None
+
+    def connect(self):
+        self.close()
+        self.sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile("rb")
+
+    def close(self):
+        if self.sock is not None:
+            self.reader.close()
+            self.sock.close()
+        self.sock, self.reader = None, None
+
+    def is_stale(self):
+        """True if the GUI closed the idle connection (e.g. restarted): readable, but at end of stream."""
+        readable, _, _ = select.select([self.sock], [], [], 0)
+        if not readable:
+            return False
         try:
-            status = json.loads(json_str)
-            return status
-        except json.JSONDecodeError:
-            print("Failed to parse JSON status.")
+            return self.sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT) == b""
+        except BlockingIOError:
+            return False
+        except OSError:
+            return True
+
+    def send_commands(self, commands):
+        """Sends a batch of commands, applied all-or-nothing by the GUI. Returns the reply dict."""
+        message = (json.dumps({"commands": list(commands)}) + "\n").encode("utf-8")
+        if self.sock is None or self.is_stale():
+            self.connect()
+        try:
+            self.sock.sendall(message)
+        except OSError:
+            #* the GUI never applies an incomplete JSON line: retry once on a new connection
+            self.connect()
+            self.sock.sendall(message)
+        line = self.reader.readline()
+        if not line:
+            self.close()
+            raise ConnectionError("GUI server closed the connection before replying, the batch may have been applied")
+        reply = json.loads(line)
+        if not reply["ok"]:
+            print(f"Command batch rejected: {reply['errors']}")
+        return reply
+
+    def send_command(self, command):
+        return self.send_commands([command])
+
+    def get_status(self):
+        try:
+            reply = self.send_commands(["get_status"])
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Failed to get GUI status: {e}")
+            self.close()
             return None
-    else:
-        print("No status returned by GUI.")
-        return None
+        return reply["results"][0] if reply["ok"] else None
+
+class InProcessGUIClient:
+    """
+    Same interface as GUIClient, bound directly to the GUI object when the agent runs inside NLI.py:
+    status reads and command batches are plain function calls instead of loopback round-trips.
+    """
+    def __init__(self, gui):
+        self.gui = gui
 
-def call_llm(conversation_history: list, client: OpenAI, system: str = None, model: str = "gpt-4o", response_format=None) -> str:
+    def send_commands(self, commands):
+        return self.gui.apply_command_batch(list(commands))
+
+    def send_command(self, command):
+        return self.send_commands([command])
+
+    def get_status(self):
+        with self.gui.scheduler.batch(): # consistent with the command batches being applied
+            return self.gui.get_status()
+
+    def close(self):
+        pass
+
+def llm_params(conversation_history: list, system: str = None, model: str = "gpt-4o", response_format=None, stream=False) -> dict:
     params = {
         "model": model,
         "messages": [
@@ -119,13 +415,103 @@ def call_llm(conversation_history: list, client: OpenAI, system: str = None, mod
         ] + list(conversation_history),
         "max_tokens": 500,
         "temperature": 0.1,
-        "stream": False
+        "stream": stream
     }
     if response_format:
         params["response_format"] = response_format
-    response = client.chat.completions.create(**params)
+    return params
+
+def call_llm(conversation_history: list, client: "LLMBackend | OpenAI", system: str = None, model: str = "gpt-4o", response_format=None) -> str:
+    response = as_backend(client).complete(llm_params(conversation_history, system, model, response_format))
     # In JSON mode, the content should be a valid serialized JSON string.
-    return response.choices[0].message.content.strip()
+    return response.strip()
+
+def stream_llm(conversation_history: list, client: "LLMBackend | OpenAI", system: str = None, model: str = "gpt-4o"):
+    """call_llm with "stream": True, yields the content deltas as they arrive."""
+    yield from as_backend(client).stream(llm_params(conversation_history, system, model, stream=True))
+
+class ResponseStreamParser:
+    """
+    Incremental parser of the "Part1: / Part2: / ITERATE:" answer of the command LLM.
+    feed(delta) returns the events completed by the received text:
+    ("commands", lines) once the Part1 section is complete (at the Part2 marker, so well before the end of the
+    answer; applied as one atomic batch), ("explanation", index, text, final) for the Part2 line `index`
+    (final=False: the line received so far, to stream it into the chat) and ("iterate", "YES" | "NO").
+    """
+    MARKERS = ["PART1:", "PART2:", "ITERATE:"]
+
+    def __init__(self):
+        self.buffer = ""
+        self.section = None
+        self.commands = []
+        self.explanations = []
+        self.iterate_decision = "NO"
+        self.partial = ""
+
+    def feed(self, delta):
+        self.buffer += delta
+        events = []
+        while "\n" in self.buffer:
+            line, self.buffer = self.buffer.split("\n", 1)
+            events += self.parse_line(line)
+        return events + self.partial_explanation()
+
+    def close(self):
+        line, self.buffer = self.buffer, ""
+        return self.parse_line(line) + self.end_part1()
+
+    def end_part1(self):
+        if self.section != "part1":
+            return []
+        self.section = None
+        return [("commands", list(self.commands))]
+
+    def parse_line(self, line):
+        line_stripped = line.strip()
+        if line_stripped.lower() == "part1:":
+            self.section = "part1"
+            return []
+        elif line_stripped.lower() == "part2:":
+            events = self.end_part1()
+            self.section = "part2"
+            return events
+        # Check if this line is the iterate decision.
+        elif line_stripped.upper().startswith("ITERATE:"):
+            events = self.end_part1()
+            self.iterate_decision = line_stripped.split("ITERATE:")[1].strip().upper()
+            return events + [("iterate", self.iterate_decision)]
+        if not line_stripped:
+            return []
+        if self.section == "part1":
+            self.commands.append(line_stripped)
+            return []
+        elif self.section == "part2":
+            cleaned_text = line_stripped.strip('"').strip()
+            self.explanations.append(cleaned_text)
+            self.partial = ""
+            return [("explanation", len(self.explanations) - 1, cleaned_text, True)]
+        return []
+
+    def partial_explanation(self):
+        text = self.buffer.strip()
+        if self.section != "part2" or not text:
+            return []
+        # hold back what may still turn into a section header or the iterate decision
+        upper = text.upper()
+        if any(marker.startswith(upper) or upper.startswith(marker) for marker in self.MARKERS):
+            return []
+        cleaned_text = text.strip('"').strip()
+        if not cleaned_text or cleaned_text == self.partial:
+            return []
+        self.partial = cleaned_text
+        return [("explanation", len(self.explanations), cleaned_text, False)]
+
+def parse_llm_response(llm_response: str):
+    """(Part1 commands, Part2 explanations, iterate decision) of a complete answer."""
+    parser = ResponseStreamParser()
+    parser.feed(llm_response.strip())
+    parser.close()
+    return parser.commands, parser.explanations, parser.iterate_decision
 
 def process_user_query(
     user_input: str, 
@@ -133,14 +519,28 @@ def process_user_query(
     conversation_history_controller: collections.deque,
     step: int,
     iteration: int,
-    client: OpenAI,
-    clip_model,
-    tf_embeddings: dict,
+    client: "OpenAI",
+    text_embeddings: TextEmbeddingService,
     model_name: str,
     source_dir: str,
     dataset_info: str,
-    current_image: str  # base64-encoded current visualization image
+    current_image: str,  # base64-encoded current visualization image
+    gui_client=None,  # GUIClient / InProcessGUIClient, None for a one-shot socket connection
+    stream_handler=None,  # on_commands(commands) / on_explanation(index, text, final) while the answer streams in
+    timings=None,  # dict, gets the seconds spent in each stage: status, intent, cache, extraction, clip, commands, parse
+    response_cache=None,  # SemanticResponseCache, answers paraphrases of earlier requests without calling the LLM
+    intent_parser=None,  # utils.intent_utils.LocalIntentParser, answers simple requests without calling the LLM
+    image_mime="image/jpeg"  # media type of current_image (utils.frame_utils.AgentImageEncoder.mime)
 ):
+    #* stage timings (benchmarks/bench_agent_pipeline.py)
+    timings = {} if timings is None else timings
+    tic = time.perf_counter()
+    def lap(stage):
+        nonlocal tic
+        toc = time.perf_counter()
+        timings[stage] = timings.get(stage, 0.0) + toc - tic
+        tic = toc
+
     debug_text = f"Step {step}, Iteration {iteration}:\n"
     open_vocab_results = f"------------Iteration {iteration}------------\n"
 
@@ -148,13 +548,39 @@ def process_user_query(
     manage_conversation_history(conversation_history_parser, {"role": "user", "content": user_input})
 
     # 2) Get GUI status
-    status = get_status()
+    status = gui_client.get_status() if gui_client is not None else get_status()
+    lap("status")
     if not status:
         debug_text += "Failed to retrieve GUI status.\n"
         return ([], ["Sorry, I cannot connect to the GUI."], "NO", None, debug_text)
 
     debug_text += f"Current Status: {status}\n"
 
+    def local_answer(part1_commands, part2_explanations):
+        #* an answer found without the LLM: same stream_handler calls and controller history as an LLM answer
+        if stream_handler is not None:
+            stream_handler.on_commands(part1_commands)
+            for index, explanation in enumerate(part2_explanations):
+                stream_handler.on_explanation(index, explanation, True)
+        llm_response = "\n".join(["Part1:"] + part1_commands + ["Part2:"] + [f'"{e}"' for e in part2_explanations] + ["ITERATE: NO"])
+        manage_conversation_history(conversation_history_controller, {"role": "user", "content": f"User request in step {step}: {user_input}"})
+        manage_conversation_history(conversation_history_controller, {"role": "assistant", "content": llm_response})
+        return (part1_commands, part2_explanations, "NO", None, debug_text, open_vocab_results, conversation_history_parser, conversation_history_controller)
+
+    #* local fast path: simple requests ("make the skull red", "set fov to 40") resolved by a grammar + the CLIP TF matcher;
+    #* where the dataset info maps objects to TFs, only requests without an object description ("hide TF2") are local
+    if intent_parser is not None and iteration == 0:
+        intent_embeddings = None if dataset_maps_tfs(dataset_info, source_dir) else text_embeddings
+        intent = intent_parser.parse(user_input, status, intent_embeddings, lambda tf_name: load_best_frames(source_dir, tf_name))
+        lap("intent")
+        if intent is not None:
+            part1_commands, part2_explanations, objects = intent
+            debug_text += f"Local intent: {part1_commands}\n"
+            #* the extraction call is skipped, its history gets the answer it would have given
+            extraction = {"manipulation": objects or None, "stylization": None, "stylize_prompt": None}
+            manage_conversation_history(conversation_history_parser, {"role": "assistant", "content": json.dumps(extraction)})
+            return local_answer(part1_commands, part2_explanations)
+
     # 3) Parse object descriptions using the LLM
     system_message_for_object_extraction = (
         "You are an assistant that extracts two kinds of descriptions from user input: a manipulation description and a stylization description, as well as a stylization prompt if applicable. "
@@ -196,6 +622,7 @@ def process_user_query(
         model=model_name,
         response_format={"type": "json_object"}
     )
+    lap("extraction")
     manage_conversation_history(conversation_history_parser, {"role": "assistant", "content": extraction_response})
     debug_text += f"Extraction response: {extraction_response}\n"
 
@@ -220,6 +647,12 @@ def process_user_query(
         debug_text += "Failed to parse extraction response.\n"
         manipulation_desc, stylization_desc, stylize_prompt = None, None, None
 
+    #* encode all object descriptions of this query in one batch (cached across refinement iterations)
+    query_descriptions = list(manipulation_desc or [])
+    if stylization_desc is not None and stylization_desc != "whole":
+        query_descriptions += list(stylization_desc)
+    text_embeddings.embed_texts(query_descriptions)
+
     # Extract the best matching TFs based on the manipulation description
     if manipulation_desc is not None:
         best_tf = []
@@ -227,11 +660,8 @@ def process_user_query(
         debug_text += f"Extracted manipulation object descriptions: {manipulation_desc}\n"
 
         # 3. Embed each extracted object description and find matching TFs
-        for description in manipulation_desc:
-            description_embedding = embed_text(description, clip_model)
-
-            # 4. Find the best matching TFs based on the embedding
-            top_tfs = find_best_tfs(description_embedding, description, tf_embeddings, threshold=0.01)
+        # 4. Find the best matching TFs based on the embedding
+        for description, top_tfs in zip(manipulation_desc, text_embeddings.find_best_tfs(manipulation_desc, threshold=0.01)):
             tf_to_best_frames = {}
             open_vocab_results += f"Query: {description}\n"
             for tf_name, similarity, description in top_tfs:
@@ -253,11 +683,8 @@ def process_user_query(
         debug_text += f"Extracted stylization object descriptions: {stylization_desc}\n"
 
         # 3. Embed each extracted object description and find matching TFs
-        for description in stylization_desc:
-            description_embedding = embed_text(description, clip_model)
-
-            # 4. Find the best matching TFs based on the embedding
-            top_tfs = find_best_tfs(description_embedding, description, tf_embeddings, threshold=0.01)
+        # 4. Find the best matching TFs based on the embedding
+        for description, top_tfs in zip(stylization_desc, text_embeddings.find_best_tfs(stylization_desc, threshold=0.01)):
             try:
                 tf_to_best_frames
             except NameError:
@@ -278,6 +705,20 @@ def process_user_query(
     else:
         debug_text += "No object to stylize.\n"
         best_stylization_tf = "no TF specified"
+    lap("clip")
+
+    #* semantic cache: only complete first-iteration answers, later iterations depend on the rendered image;
+    #* looked up once the objects are resolved, so a paraphrase about another object never hits
+    use_cache = response_cache is not None and iteration == 0
+    if use_cache:
+        request_embedding = text_embeddings.embed_texts([user_input])[0]
+        request_digest = SemanticResponseCache.status_digest(status, dataset_info, source_dir)
+        request_targets = SemanticResponseCache.targets(best_tf, best_stylization_tf, stylize_prompt)
+        cached = response_cache.get(request_embedding, request_digest, request_targets, user_input)
+        lap("cache")
+        if cached is not None:
+            debug_text += f"Semantic cache hit: {cached[0]}\n"
+            return local_answer(*cached)
 
     # 4) Construct the system and user prompts for the LLM to generate commands
     system_message_for_commands = (
@@ -481,7 +922,7 @@ def process_user_query(
             "role": "user",
             "content": [
                 {"type": "text", "text": prompt_for_commands},
-                {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{current_image}"}}
+                {"type": "image_url", "image_url": {"url": f"data:{image_mime};base64,{current_image}"}}
             ]
         })
     else:
@@ -489,33 +930,33 @@ def process_user_query(
         manage_conversation_history(conversation_history_controller, {"role": "user", "content": prompt_for_commands})
 
     # 6. Call the LLM to generate commands
-    llm_response = call_llm(conversation_history=conversation_history_controller, client=client, system=system_message_for_commands, model=model_name)
+    if stream_handler is None:
+        llm_response = call_llm(conversation_history=conversation_history_controller, client=client, system=system_message_for_commands, model=model_name)
+        lap("commands")
+        part1_commands, part2_explanations, iterate_decision = parse_llm_response(llm_response)
+        lap("parse")
+    else:
+        #* streaming: the Part1 commands go to the GUI as one batch as soon as Part1 is complete, every Part2 line
+        #* to the chat as soon as it has arrived
+        parser = ResponseStreamParser()
+        chunks = []
+        def dispatch(events):
+            for event in events:
+                if event[0] == "commands":
+                    stream_handler.on_commands(event[1])
+                elif event[0] == "explanation":
+                    stream_handler.on_explanation(*event[1:])
+        for delta in stream_llm(conversation_history=conversation_history_controller, client=client, system=system_message_for_commands, model=model_name):
+            chunks.append(delta)
+            dispatch(parser.feed(delta))
+        dispatch(parser.close())
+        #* parsing (and the stream_handler) overlaps the command call here
+        lap("commands")
+        llm_response = "".join(chunks).strip()
+        part1_commands, part2_explanations, iterate_decision = parser.commands, parser.explanations, parser.iterate_decision
 
     manage_conversation_history(conversation_history_controller, {"role": "assistant", "content": llm_response})
+    if use_cache and iterate_decision == "NO":
+        response_cache.put(request_embedding, request_digest, request_targets, user_input, part1_commands, part2_explanations)
 
-    lines = llm_response.strip().split("\n")
-    part1_commands = []
-    part2_explanations = []
-    iterate_decision = "NO"
-    current_section = None
-    for line in lines:
-        line_stripped = line.strip()
-        if line_stripped.lower() == "part1:":
-            current_section = "part1"
-            continue
-        elif line_stripped.lower() == "part2:":
-            current_section = "part2"
-            continue
-        # Check if this line is the iterate decision.
-        elif line_stripped.upper().startswith("ITERATE:"):
-            iterate_decision = line_stripped.split("ITERATE:")[1].strip().upper()
-            continue
-        if not line_stripped:
-            continue
-        if current_section == "part1" and current_section !="```":
-            part1_commands.append(line_stripped)
-        elif current_section == "part2" and current_section !="```":
-            cleaned_text = line_stripped.strip('"').strip()
-            part2_explanations.append(cleaned_text)
-
-    return (part1_commands, part2_explanations, iterate_decision, best_tf, debug_text, open_vocab_results, conversation_history_parser, conversation_history_controller)
\ No newline at end of file
+    return (part1_commands, part2_explanations, iterate_decision, best_tf, debug_text, open_vocab_results, conversation_history_parser, conversation_history_controller)
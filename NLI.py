@@ -2,50 +2,49 @@ from icecream import install
 install()
 ic.configureOutput(includeContext=True) #type: ignore
 
-import glob
+import time
+_import_start = time.perf_counter()
 import json
 import os
 import torchvision.transforms
 import dearpygui.dearpygui as dpg
 from dearpygui_ext.themes import create_theme_imgui_light
-from scipy.spatial.transform import Rotation as R
 import numpy as np
 import torch
 import torch.nn.functional as F
 import torchvision
-from gaussian_renderer import render_fn_dict
-from scene import GaussianModel
+from gaussian_renderer import render_fn_dict, render_palette_layers, composite_palette_layers, render_gbuffer, shade_gbuffer
+from gaussian_renderer.offscreen import RenderSnapshot, render_offscreen
 from utils.general_utils import safe_state
-from utils.camera_utils import Camera, JSON_to_camera
+from utils.camera_utils import JSON_to_camera
 from argparse import ArgumentParser
 from arguments import ModelParams, PipelineParams
-from utils.system_utils import searchForMaxIteration
 from utils.graphics_utils import focal2fov,ThetaPhi2xyz,fov2focal
-from scene.palette_color import LearningPaletteColor
-from scene.opacity_trans import LearningOpacityTransform
-from scene.light_trans import LearningLightTransform
-from pyquaternion import Quaternion
+from utils.gui_utils import FrameScheduler, AdaptiveResolution, ArcBallCamera, load_json_config, read_initial_view
+from utils.gui_utils import initial_c2w, encode_frame, overlay_legend
+from utils.frame_utils import FrameReadback, FrameCache, AgentImageEncoder, render_state_key
+from utils.command_server import AsyncCommandServer
+from utils.scene_utils import SceneState, load_scene
 import cv2
 import socket
 import threading
-from LLM_agent import process_user_query, call_llm
-from open_clip import create_model_and_transforms
-from openai import OpenAI
-import sounddevice as sd
-import soundfile as sf
-import pygame
-from scene.ip2p import InstructPix2Pix
+from LLM_agent import process_user_query, call_llm, TextEmbeddingService, SemanticResponseCache, InProcessGUIClient
+from utils.lazy_utils import LazySubsystem, StartupReport, warm_up_all
+from utils.intent_utils import LocalIntentParser
 from PIL import Image
 import torchvision.transforms as transforms
 import shlex
 import base64
 from io import BytesIO
 from PIL import Image, ImageDraw, ImageFont
-import ast
 import datetime
 import collections
 
 MAX_HISTORY_SIZE = 30  # Maximal messages to keep in history
+PREVIEW_RENDER_PATHS = {"palette_composite", "deferred_light"}  # approximate render paths, replaced by a full render once edits stop
+
+startup_report = StartupReport()
+startup_report.record("imports", time.perf_counter() - _import_start)
 
 def manage_conversation_history(history, new_message):
     """
@@ -57,154 +56,105 @@ def manage_conversation_history(history, new_message):
         history.pop(0)  # Remove the oldest message
 
 
-def screen_to_arcball(p:np.ndarray):
-    dist = np.dot(p, p)
-    if dist < 1.:
-        return np.array([*p, np.sqrt(1.-dist)])
-    else:
-        return np.array([*normalize_vec(p), 0.])
-
-def normalize_vec(v: np.ndarray):
-    if v is None:
-        print("None")
-    norm = np.linalg.norm(v, axis=-1, keepdims=True)
-    if np.all(norm == np.zeros_like(norm)):
-        return np.zeros_like(v)
-    else:
-        return v/norm
+def make_llm_client(args, llm_name):
+    """Backend of the selected LLM (utils/llm_backends.py), or a record/replay corpus with --llm_replay / --llm_record."""
+    from utils.llm_backends import make_backend
+    return make_backend(args.api_key, llm_name, replay=args.llm_replay, record=args.llm_record)
+
+def load_text_embeddings(image_path, embedding_name):
+    """CLIP ViT-B-32 + the TF embeddings of the dataset, for the open-vocabulary query."""
+    from open_clip import create_model_and_transforms
+    clip_model, preprocess_train, preprocess_val = create_model_and_transforms("ViT-B-32", pretrained="openai")
+    clip_model.eval()
+
+    tf_embeddings = {}
+    for folder_name in os.listdir(image_path):
+        if folder_name.startswith("TF"):
+            embedding_path = os.path.join(image_path, folder_name, embedding_name)
+            if os.path.exists(embedding_path):
+                tf_embeddings[folder_name] = np.load(embedding_path)
+    #* normalized TF matrix + cached CLIP text embeddings
+    return TextEmbeddingService(clip_model, tf_embeddings)
+
+def load_audio(api_key):
+    """Speech-to-text / text-to-speech client and the playback mixer."""
+    import pygame
+    from openai import OpenAI
+    pygame.mixer.init()
+    return OpenAI(api_key=api_key['openai_audio'])
+
+def load_ip2p():
+    from scene.ip2p import InstructPix2Pix
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    return InstructPix2Pix(device=device, ip2p_use_full_precision=False)
 
 def safe_normalize(x, eps=1e-20):
     return x / torch.sqrt(torch.clamp(torch.sum(x * x, -1, keepdim=True), min=eps))
 
-def load_ckpts_paths(source_dir, stylize_name=None):
-    TFs_folders = sorted(glob.glob(f"{source_dir}/TF*"))
-    TFs_names = sorted([os.path.basename(folder) for folder in TFs_folders])
-
-    ckpts_transforms = {}
-    for idx, TF_folder in enumerate(TFs_folders):
-        one_TF_json = {'path': None, 'palette':None, 'transform': [1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0]}
-        if stylize_name and os.path.exists(os.path.join(TF_folder, "neilf", stylize_name, 'time.txt')):
-            ckpt_dir = os.path.join(TF_folder, "neilf", stylize_name)
-        else:
-            ckpt_dir = os.path.join(TF_folder, "neilf", "point_cloud")
-        max_iters = searchForMaxIteration(ckpt_dir)
-        ckpt_path = os.path.join(ckpt_dir, f"iteration_{max_iters}", "point_cloud.ply")
-        palette_path = os.path.join(ckpt_dir, f"iteration_{max_iters}", "palette_colors_chkpnt.pth")
-        one_TF_json['path'] = ckpt_path
-        one_TF_json['palette'] = palette_path
-        ckpts_transforms[TFs_names[idx]] = one_TF_json
-
-    return ckpts_transforms
-
-def scene_composition(scene_dict: dict, dataset: ModelParams):
-    gaussians_list = []
-    for scene in scene_dict:
-        gaussians = GaussianModel(dataset.sh_degree, render_type="phong")
-        print("Compose scene from GS path:", scene_dict[scene]["path"])
-        gaussians.my_load_ply(scene_dict[scene]["path"], quantised=True, half_float=True)
-        
-        torch_transform = torch.tensor(scene_dict[scene]["transform"], device="cuda").reshape(4, 4)
-        gaussians.set_transform(transform=torch_transform)
+def replace_color_to_contrast(color):
+    return (1 - color) * 0.7
 
-        gaussians_list.append(gaussians)
 
-    gaussians_composite = GaussianModel.create_from_gaussians(gaussians_list, dataset)
-    n = gaussians_composite.get_xyz.shape[0]
-    print(f"Totally {n} points loaded.")
+def wrap_text(text, max_chars_per_line):
+    """
+    Wraps text manually based on the number of characters per line.
+    If a newline ("\n") is encountered in the input, it forces a new line.
+    """
+    lines = []
+    # Split the text by newline to handle existing line breaks
+    paragraphs = text.split("\n")
+    for paragraph in paragraphs:
+        # For each paragraph, wrap the words.
+        words = paragraph.split()
+        current_line = ""
+        for word in words:
+            # If current_line is empty, start with the word.
+            if not current_line:
+                current_line = word
+            # Else, if adding the word fits within the max length, append it.
+            elif len(current_line) + 1 + len(word) <= max_chars_per_line:
+                current_line += " " + word
+            else:
+                # Otherwise, append the current line and start a new one.
+                lines.append(current_line)
+                current_line = word
+        # If there's any remaining text in current_line, append it.
+        if current_line:
+            lines.append(current_line)
+    return lines
 
-    return gaussians_composite
 
-class ArcBallCamera:
-    def __init__(self, W, H, fovy=60, near=0.1, far=10, rot=None, translate=None, center=None):
-        self.W = W
-        self.H = H
-        if translate is None:
-            self.radius = 1
-            self.original_radius = 1
-        else:
-            self.radius = np.linalg.norm(translate)
-            self.original_radius = np.linalg.norm(translate)
-            
-        # self.radius *= 2
-        self.radius *= 2
-        self.fovy = fovy  # in degree
-        self.near = near
-        self.far = far
-
-        if center is None:
-            self.center = np.array([0, 0, 0], dtype=np.float32)  # look at this point
-        else:
-            self.center = center
-        
-        self.original_center = self.center
+class StreamedAnswer:
+    """
+    stream_handler of process_user_query for one LLM answer: the Part1 commands are applied as one atomic batch
+    (apply_command_batch) as soon as Part1 is complete, every Part2 line is written into its chat bubble while it
+    streams in.
+    """
+    def __init__(self, gui):
+        self.gui = gui
+        self.bubbles = {}
+        self.applied = []
+        self.rejected = []
+
+    def on_commands(self, commands):
+        if not commands:
+            return
+        reply = self.gui.apply_command_batch(commands)
+        if not reply["ok"]:
+            #* nothing of the batch is applied if any command is invalid
+            self.rejected = list(commands)
+            for error in reply["errors"]:
+                self.gui.append_command_log(f"rejected: {error['command']} ({error['error']})")
+            return
+        self.applied = list(commands)
 
-        if rot is None:
-            self.rot = R.from_matrix(np.array([[1, 0, 0], [0, 1, 0], [0, 0, -1]]))  # looking back to z axis
-            self.original_rot = R.from_matrix(np.array([[1, 0, 0], [0, 1, 0], [0, 0, -1]]))
+    def on_explanation(self, index, text, final):
+        if index not in self.bubbles:
+            self.bubbles[index] = self.gui.append_chat_bubble("Assistant", text)
         else:
-            self.rot = R.from_matrix(rot)
-            self.original_rot = R.from_matrix(rot)
-
-        # self.up = np.array([0, -1, 0], dtype=np.float32)  # need to be normalized!
-        self.up = -self.rot.as_matrix()[:3, 1]
+            self.gui.update_chat_bubble(self.bubbles[index], "Assistant", text)
 
-    # pose
-    @property
-    def pose(self):
-        # first move camera to radius
-        res = np.eye(4, dtype=np.float32)
-        res[2, 3] = self.radius
-        # rotate
-        rot = np.eye(4, dtype=np.float32)
-        rot[:3, :3] = self.rot.as_matrix()
-        res = rot @ res
-        # translate
-        res[:3, 3] -= self.center
-        return res
-
-    # view
-    @property
-    def view(self):
-        return np.linalg.inv(self.pose)
-
-    # intrinsics
-    @property
-    def intrinsics(self):
-        focal = self.H / (2 * np.tan(np.radians(self.fovy) / 2))
-        return np.array([focal, focal, self.W // 2, self.H // 2], dtype=np.float32)
-    
-    def reset_view(self):
-        self.rot = self.original_rot
-        self.radius = self.original_radius
-        self.radius *= 2
-        self.center = np.array([0, 0, 0], dtype=np.float32)
-
-    def set_view(self, rot, radius):
-        self.rot = rot
-        self.radius = radius
-        self.radius *= 2
-
-    def orbit(self, lastX, lastY, X, Y):
-        def vec_angle(v0: np.ndarray, v1: np.ndarray):
-            return np.arccos(np.clip(np.dot(v0, v1)/(np.linalg.norm(v0)*np.linalg.norm(v1)), -1., 1.))
-        ball_start = screen_to_arcball(np.array([lastX+1e-6, lastY+1e-6]))
-        ball_curr = screen_to_arcball(np.array([X, Y]))
-        rot_radians = vec_angle(ball_start, ball_curr)
-        rot_axis = normalize_vec(np.cross(ball_start, ball_curr))
-        q = Quaternion(axis=rot_axis, radians=rot_radians)
-        self.rot = self.rot * R.from_matrix(q.inverse.rotation_matrix)
-    
-    def scale(self, delta):
-        self.radius *= 1.1 ** (-delta)
-
-    def pan(self, dx, dy, dz=0):
-        # pan in camera coordinate system (careful on the sensitivity!)
-        self.center += 0.0005 * self.rot.as_matrix()[:3, :3] @ np.array([-dx, -dy, dz])
-
-def replace_color_to_contrast(color):
-    return (1 - color) * 0.7
-
-class GUI:
+class GUI(SceneState):
     def __init__(self, H, W, fovy, c2w, center, render_fn, render_kwargs, TFnums, args,
                  mode="phong", debug=True):
         """
@@ -233,8 +183,15 @@ class GUI:
         self.cam = ArcBallCamera(self.imgW, self.imgH, fovy=fovy * 180 / np.pi, rot=rot, translate=translate, center=center)
 
         self.render_buffer = np.zeros((self.imgW, self.imgH, 3), dtype=np.float32)
+        self.readback = FrameReadback(self.imgH, self.imgW)
+        self.frame_cache = FrameCache(int(args.frame_cache_mb * 2**20))
+        # stylization / agent renders run on their own stream, concurrently with the interactive view
+        self.offscreen_stream = torch.cuda.Stream() if torch.cuda.is_available() else None
         self.resize_fn = torchvision.transforms.Resize((self.imgH, self.imgW), antialias=True)
         self.downsample = 1
+        #* coarser frames while the camera is dragged and frames miss the target, full resolution once idle
+        self.adaptive = AdaptiveResolution(args.target_fps, [int(level) for level in args.resolution_levels.split(",")],
+                                           enabled=not args.no_adaptive_resolution)
         self.start = torch.cuda.Event(enable_timing=True)
         self.end = torch.cuda.Event(enable_timing=True)
 
@@ -252,51 +209,39 @@ class GUI:
         # Chat conversation histories
         self.conversation_history_parser = collections.deque(maxlen=MAX_HISTORY_SIZE)
         self.conversation_history_controller = collections.deque(maxlen=MAX_HISTORY_SIZE)
+        #* paraphrases of earlier requests are answered from the cache, without the two LLM calls
+        self.response_cache = None if args.response_cache_threshold <= 0 else SemanticResponseCache(
+            threshold=args.response_cache_threshold, path=args.response_cache_path)
+        self.agent_image = AgentImageEncoder(size=args.agent_image_size, image_format=args.agent_image_format,
+                                             quality=args.agent_image_quality)
+        #* simple requests (set_opacity / set_color / set_background / set_light / set_fov / reset_view) without the LLM
+        self.intent_parser = None if args.no_intent_fast_path else LocalIntentParser(
+            min_similarity=args.intent_min_similarity, margin=args.intent_margin)
         
         # A text buffer to display the conversation
         self.chat_log = ""
 
         self.args = args
 
-        # Optionally store references to agent's embeddings
-        if 'deepseek' in args.llm_name.lower():
-            client = OpenAI(api_key=args.api_key[args.llm_name], base_url="https://api.deepseek.com")
-        elif 'gpt' in args.llm_name.lower():
-            client = OpenAI(api_key=args.api_key[args.llm_name])
-        else:
-            client = OpenAI(api_key=args.api_key[args.llm_name], base_url="https://api.llama-api.com")
-
-        # Load CLIP model
-        clip_model, preprocess_train, preprocess_val = create_model_and_transforms("ViT-B-32", pretrained="openai")
-        clip_model.eval()
-
-        # Load TF embeddings
-        tf_embeddings = {}
-        for folder_name in os.listdir(args.image_path):
-            if folder_name.startswith("TF"):
-                embedding_path = os.path.join(args.image_path, folder_name, args.embedding_name)
-                if os.path.exists(embedding_path):
-                    tf_embeddings[folder_name] = np.load(embedding_path)
-        self.tf_embeddings = tf_embeddings
-        self.llm_client = client
-        self.clip_model = clip_model
+        #* heavy subsystems are built on first use, or on a background thread after the first frame (--no_warm_up)
+        self.llm = LazySubsystem("LLM client", lambda: make_llm_client(args, args.llm_name), startup_report)
+        self.clip = LazySubsystem("CLIP + TF embeddings", lambda: load_text_embeddings(args.image_path, args.embedding_name), startup_report)
+        self.audio = LazySubsystem("audio", lambda: load_audio(args.api_key), startup_report)
+        self.stylizer = LazySubsystem("InstructPix2Pix", load_ip2p, startup_report)
+        self.first_frame_shown = False
+        #* the agent runs in this process: read the status directly instead of over the loopback socket
+        self.gui_client = InProcessGUIClient(self)
         self.query_step = 0
         self.img_path = args.image_path
         self.llm_name = args.llm_name
 
         # variables about audio recording
-        self.audio_client = OpenAI(api_key=args.api_key['openai_audio'])
         self.is_recording = False  # Recording state flag
         self.audio_data = []
         self.fs = 44100
         self.recording_thread = None
-        pygame.mixer.init()
         self.audio_mute = False
 
-        # Stylization
-        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        self.ip2p = InstructPix2Pix(device=device, ip2p_use_full_precision=False)
-
         # Legend
         self.legend_dict = {}
 
@@ -304,7 +249,18 @@ class GUI:
 
         self.freeze_view = False
 
-        self.step()
+        # screen-space edit paths (only for the inverse renderer): cached per-TF palette layers and G-buffer
+        self.screen_space_edit = args.type == "inverse" and not args.no_screen_space_edit
+        self.palette_layers = None
+        self.gbuffer = None
+        #* screen-space frames are previews of an edit in progress: once the edits stop, the frame is re-rendered
+        #* by render_fn, so screenshots, the agent image and the frame cache only ever see exact frames
+        self.preview_frame = False
+        self.last_screen_space_edit = -np.inf
+
+        # commands only mark the state dirty, the render loop renders once per frame
+        self.scheduler = FrameScheduler()
+        self.scheduler.render(self.step)
         self.mode = "phong"
         dpg.create_context()
         
@@ -320,214 +276,119 @@ class GUI:
         self.start_socket_server()
 
     def __del__(self):
-        pygame.mixer.music.stop() 
+        self.stop_audio_playback()
         dpg.destroy_context()
 
+    @property
+    def llm_client(self):
+        return self.llm.get()
+
+    @property
+    def text_embeddings(self):
+        return self.clip.get()
+
+    @property
+    def audio_client(self):
+        return self.audio.get()
+
+    @property
+    def ip2p(self):
+        return self.stylizer.get()
+
+    def stop_audio_playback(self):
+        if self.audio.loaded:
+            import pygame
+            pygame.mixer.music.stop()
+
+    @property
+    def need_update(self):
+        return self.scheduler.dirty
+
+    @need_update.setter
+    def need_update(self, value):
+        if value:
+            self.scheduler.mark_dirty()
+        else:
+            self.scheduler.clear()
+
+    def mark_color_update(self):
+        """Palette-only change: previewed by re-compositing the cached palette layers in screen space."""
+        self.last_screen_space_edit = time.perf_counter()
+        self.scheduler.mark_dirty("color")
+
+    def mark_light_update(self):
+        """Light-only change (slider drags): previewed by shading the cached G-buffer per pixel."""
+        self.last_screen_space_edit = time.perf_counter()
+        self.scheduler.mark_dirty("light")
+
+    def flush_render(self):
+        """Renders once if any command changed the render state since the last frame."""
+        return self.scheduler.flush(self.step)
+
+    def flush_full_resolution(self):
+        """flush_render at full resolution, for frames that leave the view (screenshots, get_frame, stylization, agent)."""
+        self.adaptive.end_interaction()
+        if self.downsample != 1 or self.preview_frame:
+            self.scheduler.mark_dirty("exact")
+        return self.flush_render()
+
+    def render_snapshot(self):
+        """Immutable copy of the current render state (camera, palettes, opacities, light, mode)."""
+        with self.scheduler.batch():
+            return RenderSnapshot.capture(self.cam, self.render_kwargs, self.mode, self.imgH, self.imgW)
+
+    def render_offscreen(self, snapshot):
+        """Renders a snapshot at full resolution without touching the interactive view, returns the (H, W, 4) frame."""
+        result = render_offscreen(snapshot, self.render_fn, self.render_kwargs["pc"], self.render_kwargs["pipe"],
+                                  stream=self.offscreen_stream)
+        return result["rgba"].cpu().numpy()
+
+    def get_render_stats(self):
+        stats = self.scheduler.stats()
+        stats["frame_cache"] = self.frame_cache.stats()
+        return stats
+
     def get_status(self):
-        status = {
-            "mode": self.mode,
-            "field_of_view": self.cam.fovy,
-            "background_color": self.render_kwargs["bg_color"].tolist(),
-            "opacity_factors": [
-                opacity.opacity_factor.item() if isinstance(opacity.opacity_factor, torch.Tensor) else opacity.opacity_factor
-                for opacity in self.render_kwargs["dict_params"]["opacity_factors"]
-            ],
-            "palette_colors": [
-                color.palette_color.tolist()
-                for color in self.render_kwargs["dict_params"]["palette_colors"]
-            ],
-            "light": {
-                "angle": self.light_angle,
-                "elevation": self.light_elevation,
-                "ambient": self.render_kwargs["dict_params"]["light_transform"].ambient_multi 
-                        if not isinstance(self.render_kwargs["dict_params"]["light_transform"].ambient_multi, torch.Tensor)
-                        else self.render_kwargs["dict_params"]["light_transform"].ambient_multi.item(),
-                "diffuse": self.render_kwargs["dict_params"]["light_transform"].light_intensity_multi
-                        if not isinstance(self.render_kwargs["dict_params"]["light_transform"].light_intensity_multi, torch.Tensor)
-                        else self.render_kwargs["dict_params"]["light_transform"].light_intensity_multi.item(),
-                "specular": self.render_kwargs["dict_params"]["light_transform"].specular_multi
-                            if not isinstance(self.render_kwargs["dict_params"]["light_transform"].specular_multi, torch.Tensor)
-                            else self.render_kwargs["dict_params"]["light_transform"].specular_multi.item(),
-                "shininess": self.render_kwargs["dict_params"]["light_transform"].shininess_multi
-                            if not isinstance(self.render_kwargs["dict_params"]["light_transform"].shininess_multi, torch.Tensor)
-                            else self.render_kwargs["dict_params"]["light_transform"].shininess_multi.item(),
-            },
-            "freeze_view": self.freeze_view,
-            "legend": self.legend_dict,
-        }
+        status = super().get_status()
+        status["adaptive_resolution"] = self.adaptive.status()
         return status
 
     def process_message(self, message, conn):
-        def can_convert_to_float(s):
-            try:
-                float(s)
-                return True
-            except ValueError:
-                return False
-            
         # Log the received command
         self.append_command_log(message)
+        self.scheduler.command_applied()
 
-        # Parse and handle incoming messages here
-        if message.startswith("set_opacity"):
-            _, tf_index, value = message.split()
-            tf_index = int(tf_index)
-            value = float(value)
-            slider_tag = f"_slider_TF{tf_index}"
-            if dpg.does_item_exist(slider_tag):
-                dpg.set_value(slider_tag, value)
-                with torch.no_grad():
-                    self.render_kwargs["dict_params"]["opacity_factors"][tf_index].opacity_factor = torch.tensor(
-                        value, dtype=torch.float32, device="cuda"
-                    )
-                self.need_update = True  # Notify the GUI to refresh the visualization
-
-        elif message.startswith("set_color"):
-            _, tf_index, r, g, b = message.split()
-            tf_index = int(tf_index)
-            color_tag = f"_color_TF{tf_index}"
-            color_value = (int(r), int(g), int(b), 255)
-            if dpg.does_item_exist(color_tag):
-                dpg.set_value(color_tag, color_value)
-                with torch.no_grad():
-                    self.render_kwargs["dict_params"]["palette_colors"][tf_index].palette_color = torch.tensor(
-                        [int(r) / 255, int(g) / 255, int(b) / 255], dtype=torch.float32, device="cuda"
-                    )
-                self.need_update = True
-
-        elif message.startswith("set_light"):
-            parts = message.split()
-            if len(parts) == 3:
-                if can_convert_to_float(parts[2]):
-                    param, value = parts[1], float(parts[2])
-                else:
-                    param = parts[1]
-                if param == "angle" or param == "elevation":
-                    if param == "angle":
-                        dpg.set_value("_slider_light_angle", value)
-                        self.light_angle = value
-                    elif param == "elevation":
-                        dpg.set_value("_slider_light_elevation", value)
-                        self.light_elevation = value
-                    self.render_kwargs["dict_params"]["light_transform"].set_light_theta_phi(
-                        self.light_angle, self.light_elevation
-                    )
-                elif param == "ambient":
-                    dpg.set_value("_slider_ambient_multi", value)
-                    self.render_kwargs["dict_params"]["light_transform"].ambient_multi = torch.tensor(
-                        value, dtype=torch.float32, device="cuda"
-                    )
-                elif param == "diffuse":
-                    dpg.set_value("_slider_light_intensity_multi", value)
-                    self.render_kwargs["dict_params"]["light_transform"].light_intensity_multi = torch.tensor(
-                        value, dtype=torch.float32, device="cuda"
-                    )
-                elif param == "specular":
-                    dpg.set_value("_slider_specular_multi", value)
-                    self.render_kwargs["dict_params"]["light_transform"].specular_multi = torch.tensor(
-                        value, dtype=torch.float32, device="cuda"
-                    )
-                elif param == "shininess":
-                    dpg.set_value("_slider_shininess_multi", value)
-                    self.render_kwargs["dict_params"]["light_transform"].shininess_multi = torch.tensor(
-                        value, dtype=torch.float32, device="cuda"
-                    )
-                elif parts[1] == "headlight":
-                    value = parts[2].lower() == "true"
-                    dpg.set_value("_checkbox_headlight", value)
-                    self.useHeadlight = value
-                    self.render_kwargs["dict_params"]["light_transform"].useHeadLight = self.useHeadlight
-                else:
-                    raise ValueError(f"Invalid message: {message}")
-                self.need_update = True
-            else:
-                raise ValueError(f"Invalid message: {message}")
-            
-        elif message.startswith("set_mode"):
-            parts = message.split()
-            if len(parts) == 2:
-                _, mode = parts
-                if mode in self.menu_map:  # Validate if the mode exists in menu_map
-                    self.mode = mode  # Update the internal mode
-                    gui_mode = self.menu_map[mode]  # Get the user-facing name of the mode
-                    dpg.set_value("_log_infer_time", f"Mode set to {gui_mode}")
-                    dpg.set_value("_combo_mode", gui_mode)  # Update the combo box value
-                    self.need_update = True
-                    self.step()  # Refresh visualization
-                else:
-                    print(f"Invalid mode: {mode}. Available modes: {list(self.menu_map.keys())}")
-            else:
-                print("Invalid set_mode command format. Use: set_mode <mode>")
-
-        elif message.startswith("set_fov"):
-            _, fov = message.split()
-            fov = int(fov)
-            if 1 <= fov <= 120:
-                dpg.set_value("_slider_fovy", fov)
-                self.cam.fovy = fov
-                self.need_update = True
-            else:
-                print("Field of View must be between 1 and 120 degrees.")
-
-        elif message.startswith("set_background"):
-            _, r, g, b = message.split()
-            bg_color = [int(r) / 255, int(g) / 255, int(b) / 255]
-            dpg.set_value("_color_edit_background", (int(r), int(g), int(b), 255))
-            self.render_kwargs["bg_color"] = torch.tensor(bg_color, dtype=torch.float32, device="cuda")
-            self.need_update = True
+        # Scene commands change the render state (utils.scene_utils.SceneState), the widgets follow
+        if self.apply_scene_command(message):
+            self.sync_widgets(message)
 
         elif message.startswith("get_status"):
             #print("Current Status:", self.get_status())
-            status_json = json.dumps(self.get_status())
-            conn.sendall(f"Current Status: {status_json}\n".encode("utf-8"))
-        
-        elif message.startswith("reset_view"):
-            file_path = os.path.join(self.img_path, "initial_view.txt")
-            if os.path.exists(file_path):
-                try:
-                    with open(file_path, "r") as f:
-                        lines = f.readlines()
-                    # Find index for the "Radius:" line.
-                    radius_index = None
-                    for i, line in enumerate(lines):
-                        if line.startswith("Radius:"):
-                            radius_index = i
-                            break
-                    if radius_index is None or radius_index < 2:
-                        print("Initial view file format is incorrect.")
-                    else:
-                        # Join the lines that contain the rotation matrix (from index 1 to radius_index).
-                        rot_str = " ".join(line.strip() for line in lines[1:radius_index])
-                        rot_matrix = np.array(ast.literal_eval(rot_str))
-                        rot_obj = R.from_matrix(rot_matrix)
-                        
-                        # Parse the radius.
-                        radius_line = lines[radius_index].strip()  # e.g., "Radius: 3.305785123966942"
-                        radius = float(radius_line.split("Radius:")[1].strip())
-                        
-                        # Parse the center from the next line.
-                        center_line = lines[radius_index+1].strip()  # e.g., "Center: [ 0.06522223, -0.02958885,  0.00098899]"
-                        center = np.array(ast.literal_eval(center_line.split("Center:")[1].strip()))
-                        
-                        # Set the camera parameters.
-                        self.cam.rot = rot_obj
-                        self.cam.radius = radius
-                        self.cam.center = center
-                        
-                        print("Loaded initial view from", file_path)
-                except Exception as e:
-                    print("Error loading initial view:", e)
-                    self.cam.reset_view()
+            status = self.get_status()
+            if conn is not None:
+                conn.sendall(f"Current Status: {json.dumps(status)}\n".encode("utf-8"))
+            return status
+
+        elif message.startswith("get_frame"):
+            #* the last rendered frame (with legend) as base64 PNG, or raw RGBA bytes
+            self.flush_full_resolution()
+            parts = message.split()
+            frame = encode_frame(self.render_buffer, self.save_rgba_buffer[..., 3:], parts[1] if len(parts) > 1 else "png")
+            if conn is not None:
+                conn.sendall(f"Frame: {json.dumps(frame)}\n".encode("utf-8"))
+            return frame
+
+        elif message.startswith("get_render_stats"):
+            stats = self.get_render_stats()
+            if conn is not None:
+                conn.sendall(f"Render Stats: {json.dumps(stats)}\n".encode("utf-8"))
             else:
-                print("Initial view file not found:", file_path)
-                self.cam.reset_view()
-            if self.freeze_view:
-                dpg.configure_item("_freeze_view_button", label="Freeze View")
-                print("View unfrozen.")
-                self.freeze_view = False
-            self.need_update = True
+                print("Render Stats:", json.dumps(stats))
+            return stats
         
         elif message.startswith("save_image"):
+            # the saved image has to reflect the commands applied before it
+            self.flush_full_resolution()
             rendered_img = self.save_rgba_buffer
             rendered_img = (rendered_img*255).astype(np.uint8)[...,[2,1,0,3]]
             # Get current timestamp
@@ -538,47 +399,13 @@ class GUI:
             cv2.imwrite(filename, rendered_img)
             print("Image Saved")
         
-        elif message.startswith("reset_color_opacity"):
-            with torch.no_grad():
-                for TFidx in range(self.TFnums):
-                    self.render_kwargs["dict_params"]["opacity_factors"][TFidx].opacity_factor = torch.tensor(1.0, dtype=torch.float32, device="cuda")
-                    self.render_kwargs["dict_params"]["palette_colors"][TFidx].palette_color = self.original_palette_colors[TFidx]
-                    color_value = [int(x*255) for x in self.original_palette_colors[TFidx].detach().cpu().numpy()]
-                    dpg.set_value(f"_slider_TF{TFidx}", 1)
-                    dpg.set_value(f"_color_TF{TFidx}", tuple(color_value))
-            self.legend_dict = {}
-            self.need_update = True
-        elif message.startswith("set_view"):
-            _, tf_number, frame_number = message.split()
-            tf_number = int(tf_number)
-            frame_number = int(frame_number)
-            TFs_folders = sorted(glob.glob(f"{args.image_path}/TF*"))
-            view_config_file = f"{TFs_folders[tf_number]}/transforms_train.json"
-            view_dict = load_json_config(view_config_file)
-            all_views = view_dict["frames"]
-            c2w = np.array(all_views[frame_number]["transform_matrix"]).reshape(4, 4)
-            c2w /= 2
-            c2w[:3, 1:3] *= -1
-            # Extract rotation matrix (top-left 3x3) and translation vector (top 3 elements of last column)
-            rotation_matrix = c2w[:3, :3]
-            translation = c2w[:3, 3]
-
-            # Compute radius
-            radius = np.linalg.norm(translation)
-
-            # Convert rotation matrix to scipy Rotation object
-            rot = R.from_matrix(rotation_matrix)
-
-            self.cam.set_view(rot, radius)
-
-            self.need_update = True
         elif message.startswith("stylize"):
             parts = shlex.split(message)
             tf_numbers = parts[1]
             prompt = parts[2]
             dpg.configure_item("_freeze_view_button", label="Unfreeze View")
             self.freeze_view = True
-            self.step()
+            self.flush_full_resolution()
             if tf_numbers == "whole":
                 #tf_numbers = list(range(self.TFnums))
                 # Run the IP2P process in a separate thread so as not to block the GUI.
@@ -587,134 +414,74 @@ class GUI:
                 tf_numbers = [int(x) for x in tf_numbers.split("&")]
                 threading.Thread(target=self.process_ip2p_prompt, args=(prompt, tf_numbers), daemon=True).start()
 
-
-        elif message.startswith("legend add"):
-            # Use shlex.split to handle quotes in the text label.
-            parts = shlex.split(message)
-            if len(parts) != 6:
-                print("Invalid legend add command format. Use: legend add <text> <r> <g> <b>")
-            else:
-                # parts[0] is "legend", parts[1] is "add", parts[2] is the text label,
-                # and parts[3], parts[4], parts[5] are the color components.
-                label = parts[2]
-                try:
-                    r, g, b = int(parts[3]), int(parts[4]), int(parts[5])
-                except ValueError:
-                    print("Color values must be integers.")
-                    return
-                # Initialize the legend dictionary if it doesn't exist.
-                if not hasattr(self, "legend_dict"):
-                    self.legend_dict = {}
-                self.legend_dict[label] = [r, g, b]
-                print(f"Added legend entry: {label} -> {[r, g, b]}")
-                #self.append_command_log(f"Added legend entry: {label} -> {[r, g, b]}")
-                self.need_update = True
-
-        elif message.startswith("legend delete"):
-            parts = shlex.split(message)
-            if len(parts) != 3:
-                print("Invalid legend delete command format. Use: legend delete <text>")
-            else:
-                label = parts[2]
-                if hasattr(self, "legend_dict") and label in self.legend_dict:
-                    del self.legend_dict[label]
-                    print(f"Deleted legend entry: {label}")
-                    #self.append_command_log(f"Deleted legend entry: {label}")
-                    self.need_update = True
-                else:
-                    print(f"Legend entry '{label}' not found.")
-        
-        elif message.startswith("start_tour"):
-            if self.initialize_visualization():
-                print("Tour started.")
-                dpg.configure_item("_freeze_view_button", label="Unfreeze View")
-                print("View frozen.")
-                self.freeze_view = True
-            self.need_update = True
-
         else:
             print(f"Unknown command: {message}")
 
-        # Force the render to refresh
-        self.step()
-    
+        # No render here: the frame scheduler renders once for all commands of a frame/batch
+
+    def sync_widgets(self, message):
+        """Shows the state changed by a scene command in the widgets."""
+        parts = shlex.split(message)
+        name = parts[0]
+        if name == "set_opacity":
+            dpg.set_value(f"_slider_TF{int(parts[1])}", float(parts[2]))
+        elif name == "set_color":
+            dpg.set_value(f"_color_TF{int(parts[1])}", (int(parts[2]), int(parts[3]), int(parts[4]), 255))
+        elif name == "set_light" and parts[1] == "headlight":
+            dpg.set_value("_checkbox_headlight", self.useHeadlight)
+        elif name == "set_light":
+            slider_tag = {"angle": "_slider_light_angle", "elevation": "_slider_light_elevation",
+                          "ambient": "_slider_ambient_multi", "diffuse": "_slider_light_intensity_multi",
+                          "specular": "_slider_specular_multi", "shininess": "_slider_shininess_multi"}[parts[1]]
+            dpg.set_value(slider_tag, float(parts[2]))
+        elif name == "set_mode":
+            dpg.set_value("_log_infer_time", f"Mode set to {self.menu_map[self.mode]}")
+            dpg.set_value("_combo_mode", self.menu_map[self.mode])  # Update the combo box value
+        elif name == "set_fov":
+            dpg.set_value("_slider_fovy", self.cam.fovy)
+        elif name == "set_background":
+            dpg.set_value("_color_edit_background", (int(parts[1]), int(parts[2]), int(parts[3]), 255))
+        elif name in ["reset_color_opacity", "start_tour"]:
+            self.sync_tf_widgets()
+        if name in ["reset_view", "start_tour"]:
+            dpg.configure_item("_freeze_view_button", label="Unfreeze View" if self.freeze_view else "Freeze View")
+
+    def sync_tf_widgets(self):
+        for TFidx in range(self.TFnums):
+            color_tensor = self.render_kwargs["dict_params"]["palette_colors"][TFidx].palette_color.detach().cpu()
+            color_array = np.nan_to_num(color_tensor.numpy(), nan=0.0)  # replace NaN with 0.0
+            color_value = [int(x * 255) for x in color_array]
+            dpg.set_value(f"_slider_TF{TFidx}", float(self.render_kwargs["dict_params"]["opacity_factors"][TFidx].opacity_factor))
+            dpg.set_value(f"_color_TF{TFidx}", tuple(color_value))
+
     def initialize_visualization(self):
-        with torch.no_grad():
-            for TFidx in range(self.TFnums):
-                self.render_kwargs["dict_params"]["opacity_factors"][TFidx].opacity_factor = torch.tensor(1.0, dtype=torch.float32, device="cuda")
-                self.render_kwargs["dict_params"]["palette_colors"][TFidx].palette_color = self.original_palette_colors[TFidx]
-                #color_value = [int(x*255) for x in self.original_palette_colors[TFidx].detach().cpu().numpy()]
-                color_tensor = self.original_palette_colors[TFidx].detach().cpu()
-                color_array = np.nan_to_num(color_tensor.numpy(), nan=0.0)  # replace NaN with 0.0
-                color_value = [int(x * 255) for x in color_array]
-                dpg.set_value(f"_slider_TF{TFidx}", 1)
-                dpg.set_value(f"_color_TF{TFidx}", tuple(color_value))
-        file_path = os.path.join(self.img_path, "initial_view.txt")
-        if os.path.exists(file_path):
-            try:
-                with open(file_path, "r") as f:
-                    lines = f.readlines()
-                # Find index for the "Radius:" line.
-                radius_index = None
-                for i, line in enumerate(lines):
-                    if line.startswith("Radius:"):
-                        radius_index = i
-                        break
-                if radius_index is None or radius_index < 2:
-                    print("Initial view file format is incorrect.")
-                else:
-                    # Join the lines that contain the rotation matrix (from index 1 to radius_index).
-                    rot_str = " ".join(line.strip() for line in lines[1:radius_index])
-                    rot_matrix = np.array(ast.literal_eval(rot_str))
-                    rot_obj = R.from_matrix(rot_matrix)
-                    
-                    # Parse the radius.
-                    radius_line = lines[radius_index].strip()  # e.g., "Radius: 3.305785123966942"
-                    radius = float(radius_line.split("Radius:")[1].strip())
-                    
-                    # Parse the center from the next line.
-                    center_line = lines[radius_index+1].strip()  # e.g., "Center: [ 0.06522223, -0.02958885,  0.00098899]"
-                    center = np.array(ast.literal_eval(center_line.split("Center:")[1].strip()))
-                    
-                    # Set the camera parameters.
-                    self.cam.rot = rot_obj
-                    self.cam.radius = radius
-                    self.cam.center = center
-                    
-                    print("Loaded initial view from", file_path)
-            except Exception as e:
-                print("Error loading initial view:", e)
-                self.need_update = True
-                return False
-        else:
-            print("Initial view file not found:", file_path)
-            self.need_update = True
-            return False
-        self.need_update = True
-        return True
-
-    def start_socket_server(self, host="127.0.0.1", port=65432):
-        def handle_client_connection(conn):
-            with conn:
-                while True:
-                    data = conn.recv(1024)
-                    if not data:
-                        break
-                    message = data.decode("utf-8")
-                    print(f"Received: {message}")
-                    self.process_message(message, conn)
-
-        def server_thread():
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.bind((host, port))
-                s.listen()
-                print(f"Socket server listening on {host}:{port}")
-                while True:
-                    conn, addr = s.accept()
-                    print(f"Connected by {addr}")
-                    threading.Thread(target=handle_client_connection, args=(conn,)).start()
-
-        threading.Thread(target=server_thread, daemon=True).start()
+        loaded = super().initialize_visualization()
+        self.sync_tf_widgets()
+        return loaded
+
+    def apply_command_batch(self, commands):
+        """
+        Applies a batch of text commands atomically: the whole batch is validated first (nothing is applied if
+        any command is invalid), and no frame is rendered until the last command was applied.
+        Returns the reply of the batch, with one result per command (the status dict for get_status, else None).
+        """
+        errors = self.validate_commands(commands)
+        if errors:
+            return {"ok": False, "errors": errors}
+        with self.scheduler.batch():
+            results = [self.process_message(command, None) for command in commands]
+        return {"ok": True, "results": results}
+
+    def start_socket_server(self, host="127.0.0.1", port=65432, max_clients=64):
+        def process_legacy_message(message, conn):
+            print(f"Received: {message}")
+            with self.scheduler.batch():
+                self.process_message(message, conn)
+
+        #* asyncio server: bounded number of clients, all commands applied by a single writer thread
+        #* (newline-delimited JSON batches, plus the old text commands, see utils/command_server.py)
+        self.command_server = AsyncCommandServer(self.apply_command_batch, process_legacy_message,
+                                                 host=host, port=port, max_clients=max_clients).start()
 
     
     def setup_font_theme(self):
@@ -751,145 +518,98 @@ class GUI:
             with dpg.theme_component(dpg.mvAll):
                 dpg.add_theme_color(dpg.mvThemeCol_ChildBg, (255, 255, 255, 255))
 
-    def get_buffer(self, render_results, mode=None):
-        if render_results is None or mode is None:
-            output = torch.ones(self.imgH, self.imgW, 3, dtype=torch.float32, device='cuda').detach().cpu().numpy()
-        else:
-            output = render_results[mode]
-            
-            if mode == "depth":
-                output = (output - output.min()) / (output.max() - output.min())
-            elif mode == "num_contrib":
-                output = output.clamp_max(1000) / 1000
-
-            if len(output.shape) == 2:
-                output = output[None]
-            if output.shape[0] == 1:
-                output = output.repeat(3, 1, 1)
-            if "normal" in mode:
-                opacity = render_results["opacity"]
-                output = output * 0.5 + 0.5 * opacity
-                output = output + (1 - opacity)
-            elif mode in ["diffuse_term", "specular_term", "ambient_term"]:
-                opacity = render_results["opacity"]
-                output = output + (1 - opacity)
-            if (self.imgH, self.imgW) != tuple(output.shape[1:]):
-                output = self.resize_fn(output)
-
-            output = output.permute(1, 2, 0).contiguous().detach().cpu().numpy()
-        return output
-
-    def get_rgba_buffer(self, render_results, mode=None):
-        if render_results is None or mode is None:
-            output = torch.ones(self.imgH, self.imgW, 3, dtype=torch.float32, device='cuda').detach().cpu().numpy()
-        else:
-            output = render_results[mode]
-            
-            if mode == "depth":
-                output = (output - output.min()) / (output.max() - output.min())
-            elif mode == "num_contrib":
-                output = output.clamp_max(1000) / 1000
-
-            if len(output.shape) == 2:
-                output = output[None]
-            if output.shape[0] == 1:
-                output = output.repeat(3, 1, 1)
-            if "normal" in mode:
-                opacity = render_results["opacity"]
-                output = output * 0.5 + 0.5 * opacity
-                output = output + (1 - opacity)
-            elif mode in ["diffuse_term", "specular_term", "ambient_term"]:
-                opacity = render_results["opacity"]
-                output = output + (1 - opacity)
-            if (self.imgH, self.imgW) != tuple(output.shape[1:]):
-                output = self.resize_fn(output)
-
-            output = output.permute(1, 2, 0).contiguous().detach().cpu().numpy()
-        # If output only has 3 channels, add an alpha channel set to 1 (opaque)
-        if output.shape[-1] == 3:
-            alpha = render_results["opacity"].permute(1, 2, 0).detach().cpu().numpy().astype(output.dtype)
-            output = np.concatenate([output, alpha], axis=-1)
-        return output
-    
     def overlay_legend(self, render_buffer, legend_dict, position=(10, 10), square_size=60, padding=15):
-        #60, 15
-        #40, 10
-        #20, 5
-        """
-        Overlays a legend on the input image.
-        
-        Parameters:
-            render_buffer (np.ndarray): Image array with values in [0,1].
-            legend_dict (dict): Dictionary with keys as labels and values as [R, G, B] colors (0-255).
-            position (tuple): (x, y) position for the top-left corner of the legend.
-            square_size (int): Size of the color square.
-            padding (int): Padding between legend items.
-            
-        Returns:
-            np.ndarray: The image with the legend overlay, normalized to [0,1].
-        """
-        # If legend_dict is empty, return the original render_buffer
-        if not legend_dict:
-            return render_buffer
-        # Convert the render_buffer (float in [0,1]) to a PIL Image in uint8 format.
-        img = Image.fromarray((render_buffer * 255).astype(np.uint8))
-        draw = ImageDraw.Draw(img)
-        
-        # Try loading a TrueType font; if unavailable, use the default font.
-        try:
-            font = ImageFont.truetype("./assets/font/Helvetica.ttf", 50) #22, 35, 50
-        except IOError:
-            font = ImageFont.load_default()
-
-        x, y = position
-        for label, rgb in legend_dict.items():
-            # Draw a filled rectangle (the colored square)
-            draw.rectangle([x, y, x + square_size, y + square_size], fill=tuple(rgb))
-            # Draw the label text to the right of the square (text in black)
-            draw.text((x + square_size + padding, y), label, fill=(0, 0, 0), font=font)
-            # Move y for the next legend item
-            y += square_size + padding
-
-        # Convert the PIL image back to a NumPy array normalized to [0,1]
-        annotated_img = np.array(img).astype(np.float32) / 255.0
-        return annotated_img
+        return overlay_legend(render_buffer, legend_dict, position, square_size, padding)
 
-    @property
-    def custom_cam(self):
-        w2c = self.cam.view
-        R = w2c[:3, :3].T
-        T = w2c[:3, 3]
-        down = self.downsample
-        H, W = self.imgH // down, self.imgW // down
-        fovy = self.cam.fovy * np.pi / 180
-        fovx = fovy * W / H
-        custom_cam = Camera(colmap_id=0, R=R, T=-T,
-                            FoVx=fovx, FoVy=fovy, fx=None, fy=None, cx=None, cy=None,
-                            image=torch.zeros(3, H, W), image_name=None, uid=0)
-        return custom_cam
+
+    def needs_exact_frame(self):
+        """True when the frame on screen is a screen-space preview and the edits have been idle for the idle delay."""
+        return self.preview_frame and time.perf_counter() - self.last_screen_space_edit >= self.adaptive.idle_delay
 
     @torch.no_grad()
     def render(self):
-        if getattr(self, "need_update", False):
-            self.step()  # update texture from the scene render, etc.
-            self.need_update = False  # reset flag after updating
+        if self.adaptive.needs_refine():
+            self.scheduler.mark_dirty("exact")  # input went idle: replace the downsampled frame by a full-resolution one
+        if self.needs_exact_frame():
+            self.scheduler.mark_dirty("exact")  # edits stopped: replace the screen-space preview by a full render
+        self.flush_render()  # update texture from the scene render once per display frame
         dpg.render_dearpygui_frame()
+        if not self.first_frame_shown:
+            #* the first frame is on screen: load the remaining subsystems without blocking the window
+            self.first_frame_shown = True
+            startup_report.record("first frame (total)", time.perf_counter() - startup_report.start)
+            print(startup_report.summary())
+            if not self.args.no_warm_up:
+                warm_up_all([self.llm, self.clip, self.audio, self.stylizer], startup_report)
+
+
+    def drop_screen_space_caches(self, kinds):
+        """Drops the cached palette layers / G-buffer that the changes in kinds invalidate ("exact" changes nothing)."""
+        if kinds - {"color", "exact"}:
+            self.palette_layers = None # camera, opacity, light, ... changed
+        if kinds - {"light", "exact"}:
+            self.gbuffer = None # camera, opacity, palette (the base color of the G-buffer), ... changed
+
+    def render_scene(self, kinds):
+        """
+        Renders the current state. If only palette colors changed since the last frame (kinds == {"color"}),
+        the per-TF palette layers are rasterized once and then re-composited in screen space.
+        If only the light changed (kinds == {"light"}), the G-buffer is rasterized once and then shaded per pixel.
+        Any other set of kinds is rendered by render_fn.
+        Returns (render_pkg, name of the render path).
+        """
+        self.drop_screen_space_caches(kinds)
+        if self.screen_space_edit and self.mode == "phong" and kinds == {"color"}:
+            if self.palette_layers is None:
+                self.palette_layers = render_palette_layers(viewpoint_camera=self.custom_cam, **self.render_kwargs)
+            render_pkg = composite_palette_layers(self.palette_layers, self.render_kwargs["dict_params"]["palette_colors"],
+                                                  self.render_kwargs["bg_color"])
+            return render_pkg, "palette_composite"
+        if self.screen_space_edit and kinds == {"light"}:
+            if self.gbuffer is None:
+                self.gbuffer = render_gbuffer(viewpoint_camera=self.custom_cam, **self.render_kwargs)
+            render_pkg = shade_gbuffer(self.gbuffer, self.render_kwargs["dict_params"]["light_transform"],
+                                       self.render_kwargs["bg_color"])
+            return render_pkg, "deferred_light"
+        return self.render_fn(viewpoint_camera=self.custom_cam, **self.render_kwargs), "full"
+
+    def step(self, kinds=frozenset()):
+        downsample = self.adaptive.next_downsample()
+        if downsample != self.downsample:
+            # the cached palette layers / G-buffer have the resolution they were rendered at
+            self.palette_layers = None
+            self.gbuffer = None
+            self.downsample = downsample
+        # finished frames of states seen before (LLM refinements, reset_view, set_view, tours) skip the rasterizer;
+        # frames of a camera drag are not cached, they are unlikely to repeat
+        key = None
+        if self.frame_cache.max_bytes > 0 and not self.adaptive.interacting:
+            key = render_state_key(self.cam, self.render_kwargs, self.mode, self.downsample)
+            cached_rgba = self.frame_cache.get(key)
+            if cached_rgba is not None:
+                self.render_buffer, self.save_rgba_buffer = self.readback.load(cached_rgba, self.legend_dict)
+                self.preview_frame = False
+                self.adaptive.frame_done(self.downsample, 0.0) # else needs_refine() stays True after a drag
+                self.drop_screen_space_caches(kinds)
+                if self.menu is not None:
+                    dpg.set_value("_log_infer_time", "cached frame")
+                    dpg.set_value("_texture", self.render_buffer)
+                return "cached"
 
-
-    def step(self):
         self.start.record()
-        render_pkg = self.render_fn(viewpoint_camera=self.custom_cam, **self.render_kwargs)
+        render_pkg, render_path = self.render_scene(kinds)
         self.end.record()
         torch.cuda.synchronize()
         t = self.start.elapsed_time(self.end)
+        self.adaptive.frame_done(self.downsample, t)
 
-        buffer1 = self.get_buffer(render_pkg, self.mode)
-        # Overlay legend on the render buffer
-        self.render_buffer = self.overlay_legend(buffer1, self.legend_dict)
+        # one readback per frame: the texture (with legend) and the RGBA save buffer share the pinned host copy
+        self.render_buffer, self.save_rgba_buffer = self.readback.read(render_pkg, self.mode, self.resize_fn, self.legend_dict)
+        self.preview_frame = render_path in PREVIEW_RENDER_PATHS
+        # only exact frames are cached, a preview under the same key would be served as the exact frame later
+        if key is not None and render_path == "full":
+            self.frame_cache.put(key, self.save_rgba_buffer)
 
-        buffer2 = self.get_rgba_buffer(render_pkg, self.mode)
-        self.save_rgba_buffer = buffer2
-        
 
         if t == 0:
             fps = 0
@@ -906,9 +626,11 @@ class GUI:
             self.menu = ["Blinn-Phong", "Ambient", "Diffuse", "Specular", "Normal"]
             
         else:
-            dpg.set_value("_log_infer_time", f'{t:.4f} ms ({fps} FPS)')
+            resolution = f' @ 1/{self.downsample} res' if self.downsample != 1 else ''
+            dpg.set_value("_log_infer_time", f'{t:.4f} ms ({fps} FPS){resolution}')
             dpg.set_value("_texture", self.render_buffer)
         torch.cuda.empty_cache()
+        return render_path
     
     def add_oneTFSlider(self, TFidx):
         def callback_TF_slider(sender, app_data):
@@ -921,7 +643,7 @@ class GUI:
             TFidx = int(sender.replace("_color_TF", ""))
             with torch.no_grad():
                 self.render_kwargs["dict_params"]["palette_colors"][TFidx].palette_color = torch.tensor(app_data[:3], dtype=torch.float32, device="cuda")
-            self.need_update = True
+            self.mark_color_update()
         
         slider_tag = "_slider_TF" + str(TFidx)
         color_tag = "_color_TF" + str(TFidx)
@@ -1079,11 +801,8 @@ class GUI:
             # Set the conversation history to include the dataset info.
             conversation_history = [{"role": "user", "content": dataset_info}]
 
-            # Call the LLM function.
-            initial_message = call_llm(conversation_history, self.llm_client, system=welcome_prompt, model=self.llm_name)
-
-            # Append the generated message to the chat window.
-            self.append_chat_bubble("Assistant", initial_message)
+            # Call the LLM function off the main thread, the window opens without waiting for the reply.
+            threading.Thread(target=self.post_welcome_message, args=(conversation_history, welcome_prompt), daemon=True).start()
         
         dpg.bind_item_theme("_chat_window", self.white_bg_theme)
 
@@ -1115,6 +834,11 @@ class GUI:
         dpg.bind_item_theme("_query_window", self.white_bg_theme)
 
 
+    def post_welcome_message(self, conversation_history, welcome_prompt):
+        initial_message = call_llm(conversation_history, self.llm_client, system=welcome_prompt, model=self.llm_name)
+        # Append the generated message to the chat window.
+        self.append_chat_bubble("Assistant", initial_message)
+
     def on_mute_toggle(self, sender, app_data):
         """Toggle mute/unmute state and update the button icon."""
         self.audio_mute = not self.audio_mute
@@ -1123,7 +847,7 @@ class GUI:
         #dpg.set_value(sender, new_label)  # Update the button label to reflect new state.
         # Optionally, if you want to immediately stop any playing audio when muting:
         if self.audio_mute:
-            pygame.mixer.music.stop()
+            self.stop_audio_playback()
         print("Audio mute toggled. mute:", self.audio_mute)
     
     def on_freeze_view(self, sender, app_data):
@@ -1169,37 +893,15 @@ class GUI:
         upper_bound = 0.98
 
         if tf_numbers is not None:
-            # ===== Step 1: Save original opacities =====
-            ori_tf_opacity = {
-                i: (opacity.opacity_factor.item() if isinstance(opacity.opacity_factor, torch.Tensor) else opacity.opacity_factor)
-                for i, opacity in enumerate(self.render_kwargs["dict_params"]["opacity_factors"])
-            }
-            print("Original TF opacities:", ori_tf_opacity)
-
-            # ===== Step 2: Update opacities =====
-            # For each TF: if its index is in tf_numbers, set it to 1.0 (non-zero); otherwise, set to 0.0.
-            for i in range(len(self.render_kwargs["dict_params"]["opacity_factors"])):
-                if i in tf_numbers:
-                    if ori_tf_opacity[i] == 0.0:
-                        new_val = 1.0
-                    else:
-                        new_val = ori_tf_opacity[i]
-                else:
-                    new_val = 0.0
-                slider_tag = f"_slider_TF{i}"
-                if dpg.does_item_exist(slider_tag):
-                    dpg.set_value(slider_tag, new_val)
-                with torch.no_grad():
-                    self.render_kwargs["dict_params"]["opacity_factors"][i].opacity_factor = torch.tensor(
-                        new_val, dtype=torch.float32, device="cuda"
-                    )
-            self.need_update = True
-            self.step()  # Update the GUI with the new opacities
-            print("Updated TF opacities for target TFs:", tf_numbers)
-
-            # ===== Step 3: Grab the masked rendered image =====
-            # At this point self.save_rgba_buffer is assumed to have been updated (via your GUI) to reflect these opacity changes.
-            rendered_img = self.save_rgba_buffer  # Expected shape: (H, W, 3) or (H, W, 4)
+            # ===== Step 1-3: Render only the target TFs offscreen =====
+            # the interactive view, its sliders and render_kwargs keep their state (no flicker, no race with the GUI)
+            snapshot = self.render_snapshot()
+            print("Original TF opacities:", snapshot.opacity_factors)
+            # For each TF: if its index is in tf_numbers, keep it visible (1.0 if it was hidden); otherwise, hide it.
+            target_opacities = {i: ((1.0 if value == 0.0 else value) if i in tf_numbers else 0.0)
+                                for i, value in enumerate(snapshot.opacity_factors)}
+            rendered_img = self.render_offscreen(snapshot.with_opacities(target_opacities))  # (H, W, 4)
+            print("Rendered target TFs offscreen:", tf_numbers)
             rendered_uint8 = (rendered_img * 255).astype(np.uint8)
             if rendered_uint8.shape[-1] == 4:
                 masked_orig = Image.fromarray(rendered_uint8, mode="RGBA")
@@ -1245,22 +947,9 @@ class GUI:
             stylized_rgba.save("stylized_components.png")
             print("Generated stylized semantic components in memory based on target TFs.")
 
-            # ===== Step 5: Restore original opacities =====
-            for i, orig_val in ori_tf_opacity.items():
-                slider_tag = f"_slider_TF{i}"
-                if dpg.does_item_exist(slider_tag):
-                    dpg.set_value(slider_tag, orig_val)
-                with torch.no_grad():
-                    self.render_kwargs["dict_params"]["opacity_factors"][i].opacity_factor = torch.tensor(
-                        orig_val, dtype=torch.float32, device="cuda"
-                    )
-            self.need_update = True
-            self.step()  # Update the GUI with the restored opacities
-            print("Restored original TF opacities.")
-
-            # ===== Step 6: Composite the stylized result onto the full rendered image =====
-            # Get the full (restored) rendered image.
-            full_rendered_img = self.save_rgba_buffer
+            # ===== Step 5-6: Composite the stylized result onto the full rendered image =====
+            # Render the full image of the same snapshot.
+            full_rendered_img = self.render_offscreen(snapshot)
             full_rendered_uint8 = (full_rendered_img * 255).astype(np.uint8)
             if full_rendered_uint8.shape[-1] == 4:
                 full_orig = Image.fromarray(full_rendered_uint8, mode="RGBA")
@@ -1286,7 +975,7 @@ class GUI:
 
         else:
             # -------- Original processing when tf_numbers is None --------
-            rendered_img = self.save_rgba_buffer  # Expected shape: (H, W, 3) or (H, W, 4)
+            rendered_img = self.render_offscreen(self.render_snapshot())  # Expected shape: (H, W, 3) or (H, W, 4)
             rendered_uint8 = (rendered_img * 255).astype(np.uint8)
             if rendered_uint8.shape[-1] == 4:
                 orig = Image.fromarray(rendered_uint8, mode="RGBA")
@@ -1348,12 +1037,7 @@ class GUI:
         dpg.set_value("llm_selector", new_model)  # Update UI
 
         # Switch API key settings if using DeepSeek
-        if 'deepseek' in self.llm_name.lower():
-            self.llm_client = OpenAI(api_key=self.args.api_key[self.llm_name], base_url="https://api.deepseek.com")
-        elif 'gpt' in self.llm_name.lower():
-            self.llm_client = OpenAI(api_key=self.args.api_key[self.llm_name])
-        else:
-            self.llm_client = OpenAI(api_key=self.args.api_key[self.llm_name], base_url="https://api.llama-api.com")
+        self.llm = LazySubsystem("LLM client", lambda: make_llm_client(self.args, new_model), startup_report)
 
         # Log the change
         self.append_chat_bubble("System", f"Switched LLM to {new_model}")
@@ -1381,6 +1065,7 @@ class GUI:
 
     def record_audio(self):
         """Continuously record audio until stopped."""
+        import sounddevice as sd
         print("Recording started...")
         self.audio_data = []
         with sd.InputStream(samplerate=self.fs, channels=1, callback=self.audio_callback):
@@ -1396,6 +1081,7 @@ class GUI:
 
     def save_and_transcribe_audio(self):
         """Save recorded audio to a file and transcribe it using OpenAI Whisper."""
+        import soundfile as sf
         audio_filename = "user_audio.wav"
         audio_array = np.concatenate(self.audio_data, axis=0)
         sf.write(audio_filename, audio_array, self.fs)
@@ -1412,7 +1098,7 @@ class GUI:
 
     def on_audio_record_clicked(self, sender, app_data):
         """Toggle audio recording on button click."""
-        pygame.mixer.music.stop()
+        self.stop_audio_playback()
         if not self.is_recording:
             # Start recording
             self.is_recording = True
@@ -1456,6 +1142,7 @@ class GUI:
                 f.write(chunk)
 
         # Play audio in a separate thread to avoid blocking the GUI
+        import pygame
         pygame.mixer.music.stop()
         try:
             pygame.mixer.music.load(audio_file)
@@ -1468,12 +1155,20 @@ class GUI:
         """Runs LLM query in a separate thread with an iterative refinement loop."""
         max_refinements = 15 # maximum number of refinement iterations
         iteration = 0
-        buffer = BytesIO()
-        img = Image.fromarray((self.render_buffer * 255).astype('uint8'))
-        img.save(buffer, format="PNG")
-        current_image_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
+        #* downscaled JPEG / WebP instead of the full-resolution PNG, reused if the frame did not change
+        with self.scheduler.batch(): # the frame buffers are reused by every frame: copied before the next render
+            self.flush_full_resolution()
+            frame = self.agent_image.to_uint8(self.render_buffer)
+        image = self.agent_image.encode(frame)
+        image_future = None
         while iteration < max_refinements:
+            if image_future is not None:
+                image, image_future = image_future.result(), None
+            print(f"Agent image, iteration {iteration}: {image['width']}x{image['height']} {image['mime']}, "
+                  f"{image['bytes'] / 1024:.1f} kB, encoded in {image['seconds'] * 1e3:.1f} ms{' (reused)' if image['reused'] else ''}")
             self.append_command_log(f"------------Iteration {iteration}------------")
+            #* streamed answers apply each command and show each sentence as soon as it arrives (--no_stream_llm)
+            stream_handler = None if self.args.no_stream_llm else StreamedAnswer(self)
             part1_commands, part2_explanations, iterate_flag, best_tf, debug_text, open_vocab_text, self.conversation_history_parser, self.conversation_history_controller = process_user_query(
                 user_text,
                 self.conversation_history_parser,
@@ -1481,12 +1176,16 @@ class GUI:
                 self.query_step,
                 iteration,
                 self.llm_client,
-                self.clip_model,
-                self.tf_embeddings,
+                self.text_embeddings,
                 self.llm_name,
                 self.img_path,
                 self.dataset_info,
-                current_image_base64
+                image["data"],
+                self.gui_client,
+                stream_handler,
+                response_cache=self.response_cache,
+                intent_parser=self.intent_parser,
+                image_mime=image["mime"]
             )
             #print(debug_text)
             
@@ -1500,11 +1199,22 @@ class GUI:
                 dpg.bind_item_font(dpg.last_item(), self.chat_font)
                 dpg.set_y_scroll('query_history', -1.0)
 
-            for cmd in part1_commands:
-                self.process_message(cmd, None)
+            if stream_handler is None:
+                with self.scheduler.batch(): # not interleaved with socket commands or a frame
+                    for cmd in part1_commands:
+                        self.process_message(cmd, None)
+            # one render for the whole command batch
+            with self.scheduler.batch():
+                self.flush_full_resolution()
+                # Capture the updated visualization image after the commands have been executed
+                frame = self.agent_image.to_uint8(self.save_rgba_buffer) if iterate_flag != "NO" else None
+            if frame is not None:
+                #* encoded on the worker thread while the explanation is shown and spoken
+                image_future = self.agent_image.submit(frame)
 
-            for line in part2_explanations:
-                self.append_chat_bubble("Assistant", line)
+            if stream_handler is None:
+                for line in part2_explanations:
+                    self.append_chat_bubble("Assistant", line)
 
             if iterate_flag == "NO":
                 full_response = " ".join(part2_explanations)
@@ -1517,47 +1227,19 @@ class GUI:
                     "role": "user",
                     "content": f"Please refine your previous instructions based on the updated visualization. (Iteration {iteration})"
                 })
-                # Capture the updated visualization image after the commands have been executed
-                buffer = BytesIO()
-                img = Image.fromarray((self.save_rgba_buffer * 255).astype('uint8'))
-                img.save(buffer, format="PNG")
-                current_image_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-
                 full_response = " ".join(part2_explanations)
                 self.text_to_speech(full_response)
             self.append_command_log('')
         self.query_step += 1
+        if self.args.llm_record is not None:
+            self.llm_client.save()
+        if self.response_cache is not None:
+            print("Semantic response cache:", self.response_cache.stats())
+        if self.intent_parser is not None:
+            print("Local intent fast path:", self.intent_parser.stats())
 
     def append_chat_bubble(self, speaker: str, message: str):
         """Create a bubble with bigger font and different themes for user/assistant/system."""
-        def wrap_text(text, max_chars_per_line):
-            """
-            Wraps text manually based on the number of characters per line.
-            If a newline ("\n") is encountered in the input, it forces a new line.
-            """
-            lines = []
-            # Split the text by newline to handle existing line breaks
-            paragraphs = text.split("\n")
-            for paragraph in paragraphs:
-                # For each paragraph, wrap the words.
-                words = paragraph.split()
-                current_line = ""
-                for word in words:
-                    # If current_line is empty, start with the word.
-                    if not current_line:
-                        current_line = word
-                    # Else, if adding the word fits within the max length, append it.
-                    elif len(current_line) + 1 + len(word) <= max_chars_per_line:
-                        current_line += " " + word
-                    else:
-                        # Otherwise, append the current line and start a new one.
-                        lines.append(current_line)
-                        current_line = word
-                # If there's any remaining text in current_line, append it.
-                if current_line:
-                    lines.append(current_line)
-            return lines
-        
         with dpg.group(parent="chat_history", horizontal=True) as row_id:
             
             # If user, push bubble to right; else minimal left gap
@@ -1596,6 +1278,15 @@ class GUI:
 
         # Auto-scroll to the bottom
         dpg.set_y_scroll("chat_history", -1.0)
+        return bubble_id, text_tag
+
+    def update_chat_bubble(self, bubble, speaker: str, message: str):
+        """Replaces the text of a bubble returned by append_chat_bubble (streamed answers)."""
+        bubble_id, text_tag = bubble
+        lines = wrap_text(f"{speaker}: {message}", max_chars_per_line=36)
+        dpg.set_value(text_tag, "\n".join(lines))
+        dpg.configure_item(bubble_id, height=22 * len(lines) + 6)
+        dpg.set_y_scroll("chat_history", -1.0)
 
     def append_command_log(self, command, line_length=25):
         """Logs commands sent by the agent to the GUI."""
@@ -1696,35 +1387,12 @@ class GUI:
                     file_path = os.path.join(self.img_path, "initial_view.txt")
                     if os.path.exists(file_path):
                         try:
-                            with open(file_path, "r") as f:
-                                lines = f.readlines()
-                            # Find index for the "Radius:" line.
-                            radius_index = None
-                            for i, line in enumerate(lines):
-                                if line.startswith("Radius:"):
-                                    radius_index = i
-                                    break
-                            if radius_index is None or radius_index < 2:
+                            initial_view = read_initial_view(file_path)
+                            if initial_view is None:
                                 print("Initial view file format is incorrect.")
                             else:
-                                # Join the lines that contain the rotation matrix (from index 1 to radius_index).
-                                rot_str = " ".join(line.strip() for line in lines[1:radius_index])
-                                rot_matrix = np.array(ast.literal_eval(rot_str))
-                                rot_obj = R.from_matrix(rot_matrix)
-                                
-                                # Parse the radius.
-                                radius_line = lines[radius_index].strip()  # e.g., "Radius: 3.305785123966942"
-                                radius = float(radius_line.split("Radius:")[1].strip())
-                                
-                                # Parse the center from the next line.
-                                center_line = lines[radius_index+1].strip()  # e.g., "Center: [ 0.06522223, -0.02958885,  0.00098899]"
-                                center = np.array(ast.literal_eval(center_line.split("Center:")[1].strip()))
-                                
                                 # Set the camera parameters.
-                                self.cam.rot = rot_obj
-                                self.cam.radius = radius
-                                self.cam.center = center
-                                
+                                self.cam.rot, self.cam.radius, self.cam.center = initial_view
                                 print("Loaded initial view from", file_path)
                         except Exception as e:
                             print("Error loading initial view:", e)
@@ -1739,7 +1407,9 @@ class GUI:
                     self.need_update = True
                 
                 def callback_save_image(sender, app_data):
-                    rendered_img = self.save_rgba_buffer
+                    with self.scheduler.batch():
+                        self.flush_full_resolution()
+                        rendered_img = self.save_rgba_buffer.copy()
                     rendered_img = (rendered_img*255).astype(np.uint8)[...,[2,1,0,3]]
                     # cv2.imwrite(os.path.join("./GUI_results", f'rendered_img.png'), rendered_img)
                     # Get current timestamp
@@ -1820,35 +1490,12 @@ class GUI:
                         file_path = os.path.join(self.img_path, "initial_view.txt")
                         if os.path.exists(file_path):
                             try:
-                                with open(file_path, "r") as f:
-                                    lines = f.readlines()
-                                # Find index for the "Radius:" line.
-                                radius_index = None
-                                for i, line in enumerate(lines):
-                                    if line.startswith("Radius:"):
-                                        radius_index = i
-                                        break
-                                if radius_index is None or radius_index < 2:
+                                initial_view = read_initial_view(file_path)
+                                if initial_view is None:
                                     print("Initial view file format is incorrect.")
                                 else:
-                                    # Join the lines that contain the rotation matrix (from index 1 to radius_index).
-                                    rot_str = " ".join(line.strip() for line in lines[1:radius_index])
-                                    rot_matrix = np.array(ast.literal_eval(rot_str))
-                                    rot_obj = R.from_matrix(rot_matrix)
-                                    
-                                    # Parse the radius.
-                                    radius_line = lines[radius_index].strip()  # e.g., "Radius: 3.305785123966942"
-                                    radius = float(radius_line.split("Radius:")[1].strip())
-                                    
-                                    # Parse the center from the next line.
-                                    center_line = lines[radius_index+1].strip()  # e.g., "Center: [ 0.06522223, -0.02958885,  0.00098899]"
-                                    center = np.array(ast.literal_eval(center_line.split("Center:")[1].strip()))
-                                    
                                     # Set the camera parameters.
-                                    self.cam.rot = rot_obj
-                                    self.cam.radius = radius
-                                    self.cam.center = center
-                                    
+                                    self.cam.rot, self.cam.radius, self.cam.center = initial_view
                                     print("Loaded initial view from", file_path)
                             except Exception as e:
                                 print("Error loading initial view:", e)
@@ -1883,7 +1530,7 @@ class GUI:
                     else:
                         self.useHeadlight = app_data
                     self.render_kwargs["dict_params"]["light_transform"].useHeadLight = self.useHeadlight
-                    self.need_update = True
+                    self.mark_light_update()
                 with dpg.group(horizontal=True):
                     dpg.add_text("Headlight")
                     dpg.add_checkbox(label="", tag="_checkbox_headlight", callback=callback_headlight, default_value=self.useHeadlight)
@@ -1898,7 +1545,7 @@ class GUI:
                         self.light_elevation = app_data
                     
                     self.render_kwargs["dict_params"]["light_transform"].set_light_theta_phi(self.light_angle, self.light_elevation)
-                    self.need_update = True
+                    self.mark_light_update()
                 with dpg.group(horizontal=True):
                     dpg.add_text("Azimuthal")
                     dpg.add_slider_int(label="", tag="_slider_light_angle", indent=self.widget_indent,
@@ -1918,7 +1565,7 @@ class GUI:
                         self.render_kwargs["dict_params"]["light_transform"].specular_multi = torch.tensor(app_data, dtype=torch.float32, device="cuda")
                     elif sender == "_slider_shininess_multi":
                         self.render_kwargs["dict_params"]["light_transform"].shininess_multi = torch.tensor(app_data, dtype=torch.float32, device="cuda")
-                    self.need_update = True
+                    self.mark_light_update()
                 
                 with dpg.group(horizontal=True):
                     dpg.add_text("Ambient")
@@ -1971,6 +1618,7 @@ class GUI:
                 self.prev_mouseX = x
                 self.prev_mouseY = y
             
+            self.adaptive.interact()
             self.need_update = True
 
             if self.debug:
@@ -1990,6 +1638,7 @@ class GUI:
             delta = app_data
 
             self.cam.scale(delta)
+            self.adaptive.interact()
             self.need_update = True
 
             if self.debug:
@@ -2006,6 +1655,7 @@ class GUI:
             dy = app_data[2]
 
             self.cam.pan(dx, dy)
+            self.adaptive.interact()
             self.need_update = True
 
             if self.debug:
@@ -2034,15 +1684,6 @@ class GUI:
         dpg.setup_dearpygui()
         dpg.show_viewport()
 
-def load_json_config(json_file):
-    if not os.path.exists(json_file):
-        return None
-
-    with open(json_file, 'r', encoding='UTF-8') as f:
-        load_dict = json.load(f)
-
-    return load_dict
-
 if __name__ == '__main__':
     # Set up command line argument parser
     parser = ArgumentParser(description="Testing script parameters")
@@ -2065,8 +1706,45 @@ if __name__ == '__main__':
                         help="JSON string containing API keys for multiple LLMs")
     parser.add_argument("--llm_name", type=str, default="gpt-4o",
                         help="Name of the LLM model to use (e.g. gpt-3.5-turbo, gpt-4, gpt-4o)")
+    parser.add_argument("--no_screen_space_edit", action="store_true",
+                        help="always re-rasterize on color/light edits instead of using the cached per-TF layers / G-buffer")
+    parser.add_argument("--codebook_resident", action="store_true",
+                        help="keep the uint8 codebook ids on the GPU and decode them per frame (less GPU memory)")
     parser.add_argument("--embedding_name", type=str, default="image_filtered_embedding_entropy.npy",
                         help="Name of the embedding .npy file in each TF directory.")
+    parser.add_argument("--target_fps", type=float, default=30,
+                        help="frame-time target of the adaptive resolution while the camera is dragged")
+    parser.add_argument("--resolution_levels", type=str, default="1,2,4",
+                        help="comma-separated downsample factors the adaptive resolution can use")
+    parser.add_argument("--no_adaptive_resolution", action="store_true",
+                        help="always render at full resolution, also while the camera is dragged")
+    parser.add_argument("--frame_cache_mb", type=float, default=256,
+                        help="byte budget (MB) of the cache of finished frames keyed by camera and scene state, 0 to disable")
+    parser.add_argument("--no_warm_up", action="store_true",
+                        help="load CLIP, InstructPix2Pix, audio and the LLM client only on first use instead of in the background after the first frame")
+    parser.add_argument("--llm_replay", type=str, default=None,
+                        help="answer the LLM queries from a recorded corpus JSON instead of the LLM API (offline)")
+    parser.add_argument("--llm_record", type=str, default=None,
+                        help="record the answers of the LLM API into a corpus JSON for --llm_replay")
+    parser.add_argument("--response_cache_threshold", type=float, default=0,
+                        help="CLIP similarity above which a request is answered from the semantic response cache "
+                             "(opt-in, e.g. 0.95), 0 to disable")
+    parser.add_argument("--response_cache_path", type=str, default=None,
+                        help="JSON file the semantic response cache is loaded from and saved to, to keep it across sessions")
+    parser.add_argument("--no_intent_fast_path", action="store_true",
+                        help="send every request to the LLM, also the simple ones the local intent parser can resolve")
+    parser.add_argument("--intent_min_similarity", type=float, default=0.2,
+                        help="CLIP similarity the best TF needs for the local intent parser to resolve an object")
+    parser.add_argument("--intent_margin", type=float, default=0.02,
+                        help="CLIP similarity margin over the second best TF for the local intent parser to resolve an object")
+    parser.add_argument("--agent_image_size", type=int, default=512,
+                        help="longer side of the visualization image sent to the multimodal LLM, 0 for the full resolution")
+    parser.add_argument("--agent_image_format", type=str, default="jpeg", choices=["jpeg", "webp", "png"],
+                        help="encoding of the visualization image sent to the multimodal LLM")
+    parser.add_argument("--agent_image_quality", type=int, default=85,
+                        help="JPEG / WebP quality of the visualization image sent to the multimodal LLM")
+    parser.add_argument("--no_stream_llm", action="store_true",
+                        help="wait for the complete LLM answer before applying its commands, instead of applying each command as it streams in")
 
     args = parser.parse_args()
     # Convert API key JSON string to dictionary
@@ -2080,41 +1758,11 @@ if __name__ == '__main__':
     
     
     pbr_kwargs = dict()
-    scene_dict = load_ckpts_paths(args.source_dir, args.stylize_name)
-    TFs_names = list(scene_dict.keys())
+    # load gaussians (all TFs start hidden, initialize_visualization shows them)
+    with startup_report.phase("scene"):
+        render_kwargs, TFs_names = load_scene(dataset, pipe, args.source_dir, args.stylize_name,
+                                              args.codebook_resident, opacity_factor=0.0)
     TFs_nums = len(TFs_names)
-    palette_color_transforms = []
-    opacity_transforms = []
-    TFcount=0
-    for TFs_name in TFs_names:
-        
-        palette_color_transform = LearningPaletteColor()
-        palette_color_transform.create_from_ckpt(f"{scene_dict[TFs_name]['palette']}")
-        palette_color_transforms.append(palette_color_transform)
-        # ic(TFcount)
-        opacity_factor=0.0 if TFcount not in [] else 1.0
-        opacity_transform = LearningOpacityTransform(opacity_factor=opacity_factor)
-        opacity_transforms.append(opacity_transform)
-        TFcount+=1
-        
-        
-    light_transform = LearningLightTransform(theta=180, phi=0)
-    # load gaussians
-    gaussians_composite = scene_composition(scene_dict, dataset)
-    bg_color = [1, 1, 1] if dataset.white_background else [0, 0, 0]
-    background = torch.tensor(bg_color, dtype=torch.float32, device="cuda")
-    
-    render_kwargs = {
-        "pc": gaussians_composite,
-        "pipe": pipe,
-        "bg_color": background,
-        "is_training": False,
-        "dict_params": {
-            "palette_colors": palette_color_transforms,
-            "opacity_factors": opacity_transforms,
-            "light_transform": light_transform
-        }
-    }
     
     # ic(scene_dict)
     # ic(checkpoints)
@@ -2126,26 +1774,13 @@ if __name__ == '__main__':
     fovx = 30 * np.pi / 180
     fovy = focal2fov(fov2focal(fovx, W), H)
     # fovy = 30.5 * np.pi / 180
-    if args.view_config is None:
-        c2w = np.array([
-            [0.0, 0.0, -1.0, 2.0],
-            [1.0, 0.0, 0.0, 0.0],
-            [0.0, -1.0, 0.0, 0.0],
-            [0.0, 0.0, 0.0, 1.0]
-        ])
-    else:
-        view_config_file = f"{args.view_config}/transforms_test.json"
-        view_dict = load_json_config(view_config_file)
-        all_views = view_dict["frames"]
-        #todo: add view index
-        c2w = np.array(all_views[0]["transform_matrix"]).reshape(4, 4) 
-        c2w /= 2
-        c2w[:3, 1:3] *= -1
+    c2w = initial_c2w(args.view_config)
     
-    windows = GUI(H, W, fovy,
-                  c2w=c2w, center=np.zeros(3),
-                  render_fn=render_fn, render_kwargs=render_kwargs, TFnums=TFs_nums, args=args,
-                  mode=args.type, debug=args.gui_debug)
+    with startup_report.phase("GUI setup"):
+        windows = GUI(H, W, fovy,
+                      c2w=c2w, center=np.zeros(3),
+                      render_fn=render_fn, render_kwargs=render_kwargs, TFnums=TFs_nums, args=args,
+                      mode=args.type, debug=args.gui_debug)
     
     while dpg.is_dearpygui_running():
         windows.render()
\ No newline at end of file
@@ -0,0 +1,87 @@
+"""
+Payload of the visualization image in the multimodal LLM request, per refinement iteration: the former
+full-resolution PNG (base64 inline) vs. utils.frame_utils.AgentImageEncoder at several sizes / formats / qualities.
+Reports encoded bytes, base64 payload, encode time, the time of an unchanged frame (reused encoding) and the image
+tokens of a high-detail GPT-4o image (85 + 170 per 512 px tile after fitting into 2048 px, shorter side <= 768 px).
+
+usage: python benchmarks/bench_agent_image.py --image path/to/screenshot.png
+       python benchmarks/bench_agent_image.py --resolution 800 800   (synthetic volume-rendering-like frame)
+"""
+import os
+import sys
+import io
+import math
+import time
+import base64
+from argparse import ArgumentParser
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.frame_utils import AgentImageEncoder
+
+CONFIGS = [(0, "png", None), (0, "jpeg", 85), (768, "jpeg", 85), (512, "jpeg", 85), (512, "jpeg", 70),
+           (512, "webp", 80), (384, "jpeg", 80)]
+
+
+def synthetic_frame(H, W):
+    #* smooth shaded blobs on a white background, like a rendered volume (random noise would not compress)
+    y, x = np.mgrid[0:H, 0:W].astype(np.float32)
+    frame = np.ones((H, W, 3), dtype=np.float32)
+    rng = np.random.default_rng(0)
+    for _ in range(6):
+        cy, cx, r = rng.uniform(0.2, 0.8) * H, rng.uniform(0.2, 0.8) * W, rng.uniform(0.08, 0.25) * min(H, W)
+        d = np.sqrt((y - cy) ** 2 + (x - cx) ** 2) / r
+        shade = np.clip(1 - d, 0, 1)[..., None] ** 0.5
+        color = rng.uniform(0.1, 0.9, 3)
+        frame = frame * (1 - shade * 0.9) + (color * (0.4 + 0.6 * shade)) * shade * 0.9
+    return np.clip(frame, 0, 1)
+
+
+def previous_payload(frame):
+    #* GUI.process_llm_query: full-resolution PNG of the frame, base64
+    tic = time.perf_counter()
+    buffer = io.BytesIO()
+    Image.fromarray((frame * 255).astype('uint8')).save(buffer, format="PNG")
+    data = base64.b64encode(buffer.getvalue()).decode('utf-8')
+    return len(buffer.getvalue()), len(data), time.perf_counter() - tic
+
+
+def image_tokens(width, height):
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="multimodal LLM image payload: full-resolution PNG vs. AgentImageEncoder")
+    parser.add_argument("--image", type=str, default=None, help="a GUI screenshot instead of the synthetic frame")
+    parser.add_argument("--resolution", type=int, nargs=2, default=[800, 800], help="H W of the synthetic frame")
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.image is not None:
+        frame = np.asarray(Image.open(args.image).convert("RGB"), dtype=np.float32) / 255
+    else:
+        frame = synthetic_frame(*args.resolution)
+    H, W = frame.shape[:2]
+
+    runs = [previous_payload(frame) for _ in range(args.repeats)]
+    png_bytes, png_base64 = runs[0][0], runs[0][1]
+    print(f"{H}x{W} frame")
+    print(f"{'previous: full-res PNG':28s} {png_bytes / 1024:8.1f} kB | base64 {png_base64 / 1024:8.1f} kB | "
+          f"encode {np.median([r[2] for r in runs]) * 1e3:7.1f} ms | {image_tokens(W, H):5d} image tokens")
+    for size, image_format, quality in CONFIGS:
+        encoder = AgentImageEncoder(size=size, image_format=image_format, quality=quality or 85)
+        times = []
+        for _ in range(args.repeats):
+            encoder.last_key = None  # force a new encoding
+            times.append(encoder.encode(frame)["seconds"])
+        encoded = encoder.encode(frame)  # same frame: reused
+        name = f"{size or 'full'} px {image_format}" + (f" q{quality}" if quality else "")
+        print(f"{name:28s} {encoded['bytes'] / 1024:8.1f} kB | base64 {len(encoded['data']) / 1024:8.1f} kB | "
+              f"encode {np.median(times) * 1e3:7.1f} ms | {image_tokens(encoded['width'], encoded['height']):5d} image tokens"
+              f" | reused {encoded['seconds'] * 1e3:5.2f} ms")
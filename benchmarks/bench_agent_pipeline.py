@@ -0,0 +1,130 @@
+"""
+Per-stage latency of the agent pipeline (LLM_agent.process_user_query + command execution), offline: the LLM is a
+utils.llm_backends.RecordReplayBackend answering from a recorded corpus with a configurable artificial latency, the
+GUI is the headless stand-in of benchmarks/bench_gui_client.py bound in-process, CLIP runs on CPU.
+Stages: status fetch, local intent parse, extraction call, CLIP matching, semantic cache lookup, command call, parsing, command execution.
+
+usage: python benchmarks/bench_agent_pipeline.py --corpus benchmarks/llm_replay_corpus.json --latency_ms 300 --token_ms 10
+       python benchmarks/bench_agent_pipeline.py --image_path path/to/TF_dir   (TF embeddings of a dataset)
+       python benchmarks/bench_agent_pipeline.py --stream   (commands executed while the answer streams in)
+       python benchmarks/bench_agent_pipeline.py --response_cache   (LLM_agent.SemanticResponseCache, hits after the 1st run)
+       python benchmarks/bench_agent_pipeline.py --intent   (utils.intent_utils.LocalIntentParser before the LLM)
+"""
+import os
+import sys
+import time
+import tempfile
+import collections
+from argparse import ArgumentParser
+
+import numpy as np
+from open_clip import create_model_and_transforms
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from LLM_agent import process_user_query, TextEmbeddingService, SemanticResponseCache, InProcessGUIClient
+from utils.llm_backends import RecordReplayBackend
+from utils.intent_utils import LocalIntentParser
+from bench_gui_client import HeadlessGUI
+from bench_open_vocab import load_tf_embeddings
+
+STAGES = ["status", "intent", "extraction", "clip", "cache", "commands", "parse", "execution"]
+
+
+def random_tf_dir(num_TFs, dim, root):
+    #* random TF embeddings + best_frames.txt, the layout load_text_embeddings / load_best_frames expect
+    rng = np.random.default_rng(0)
+    tf_embeddings = {}
+    for i in range(num_TFs):
+        os.makedirs(os.path.join(root, f"TF{i}"), exist_ok=True)
+        with open(os.path.join(root, f"TF{i}", "best_frames.txt"), "w") as f:
+            f.write("\n".join(str(frame) for frame in rng.permutation(100)[:5]))
+        tf_embeddings[f"TF{i}"] = rng.standard_normal(dim).astype(np.float32)
+    return tf_embeddings
+
+
+class ExecutingHandler:
+    """stream_handler executing the Part1 batch as soon as it is complete, like NLI.StreamedAnswer."""
+    def __init__(self, gui_client):
+        self.gui_client = gui_client
+        self.seconds = 0.0
+
+    def on_commands(self, commands):
+        tic = time.perf_counter()
+        self.gui_client.send_commands(commands)
+        self.seconds += time.perf_counter() - tic
+
+    def on_explanation(self, index, text, final):
+        pass
+
+
+def run_query(query, step, backend, text_embeddings, source_dir, gui_client, stream, response_cache=None, intent_parser=None):
+    timings = {}
+    handler = ExecutingHandler(gui_client) if stream else None
+    part1_commands, *_ = process_user_query(
+        query, collections.deque(), collections.deque(), step, 0, backend, text_embeddings, "mock-llm",
+        source_dir, "benchmark dataset", "", gui_client, handler, timings, response_cache, intent_parser)
+    if stream:
+        #* executed inside the command call (or the intent parse / cache lookup that answered)
+        stage = "commands" if "commands" in timings else "cache" if "cache" in timings else "intent"
+        timings[stage] -= handler.seconds
+        timings["execution"] = handler.seconds
+    else:
+        tic = time.perf_counter()
+        gui_client.send_commands(part1_commands)
+        timings["execution"] = time.perf_counter() - tic
+    return timings
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="per-stage latency of process_user_query against a record/replay LLM backend")
+    parser.add_argument("--corpus", type=str, default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "llm_replay_corpus.json"))
+    parser.add_argument("--latency_ms", type=float, default=300, help="artificial time to first token of each LLM call")
+    parser.add_argument("--token_ms", type=float, default=10, help="artificial time per token (~4 characters)")
+    parser.add_argument("--runs", type=int, default=3, help="passes over the corpus")
+    parser.add_argument("--num_TFs", type=int, default=8, help="random TF embeddings if no --image_path")
+    parser.add_argument("--image_path", type=str, default=None)
+    parser.add_argument("--embedding_name", type=str, default="image_filtered_embedding_entropy.npy")
+    parser.add_argument("--stream", action="store_true", help="stream the command call and execute while streaming")
+    parser.add_argument("--response_cache", action="store_true", help="answer repeated requests from the semantic cache")
+    parser.add_argument("--intent", action="store_true", help="answer simple requests with the local intent parser")
+    args = parser.parse_args()
+
+    clip_model, _, _ = create_model_and_transforms("ViT-B-32", pretrained="openai")
+    clip_model.eval()
+    tmp_dir = tempfile.TemporaryDirectory()
+    if args.image_path is not None:
+        source_dir = args.image_path
+        tf_embeddings = load_tf_embeddings(args.image_path, args.embedding_name)
+    else:
+        source_dir = tmp_dir.name
+        tf_embeddings = random_tf_dir(args.num_TFs, clip_model.text_projection.shape[1], source_dir)
+    text_embeddings = TextEmbeddingService(clip_model, tf_embeddings)
+    gui = HeadlessGUI(len(tf_embeddings))
+    gui_client = InProcessGUIClient(gui)
+    backend = RecordReplayBackend(args.corpus, latency=args.latency_ms / 1e3, token_latency=args.token_ms / 1e3)
+    queries = list(backend.responses.keys())
+    response_cache = SemanticResponseCache() if args.response_cache else None
+    intent_parser = LocalIntentParser() if args.intent else None
+
+    results = collections.defaultdict(list)
+    for run in range(args.runs):
+        for step, query in enumerate(queries):
+            timings = run_query(query, step, backend, text_embeddings, source_dir, gui_client, args.stream, response_cache, intent_parser)
+            for stage in STAGES:
+                results[stage].append(timings.get(stage, 0.0) * 1e3)
+            results["total"].append(sum(timings.values()) * 1e3)
+            #* an intent answer returns before the extraction call, a cache hit before the command call
+            results["total (local)" if "commands" not in timings else "total (LLM)"].append(sum(timings.values()) * 1e3)
+
+    print(f"{len(queries)} queries x {args.runs} runs, {len(tf_embeddings)} TFs, LLM latency {args.latency_ms:g} ms "
+          f"+ {args.token_ms:g} ms/token, {'streamed' if args.stream else 'blocking'} command call")
+    for stage in STAGES + ["total", "total (LLM)", "total (local)"]:
+        if not results[stage]:
+            continue
+        t = np.array(results[stage])
+        print(f"{stage:18s} median {np.median(t):9.2f} ms | p95 {np.percentile(t, 95):9.2f} ms")
+    if response_cache is not None:
+        print("semantic response cache:", response_cache.stats())
+    if intent_parser is not None:
+        print("local intent fast path:", intent_parser.stats())
+    tmp_dir.cleanup()
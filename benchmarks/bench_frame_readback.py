@@ -0,0 +1,101 @@
+"""
+Per-frame host time of the GUI frame readback (everything in GUI.step after the rasterization), on a synthetic
+render package: the former get_buffer + get_rgba_buffer + full-frame overlay_legend vs. utils.frame_utils.FrameReadback
+(one RGBA transfer into a reused pinned buffer, legend alpha-blended in place from the cached
+utils.gui_utils.LegendSprite). The legend overlay alone is timed as well.
+
+usage: python benchmarks/bench_frame_readback.py --resolution 800 800 --frames 200 --legend 3
+"""
+import os
+import sys
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+import torch
+import torchvision
+from PIL import Image, ImageDraw, ImageFont
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.gui_utils import mode_to_rgb, overlay_legend
+from utils.frame_utils import FrameReadback
+
+
+def full_frame_legend(render_buffer, legend_dict, position=(10, 10), square_size=60, padding=15):
+    #* the previous overlay_legend: the whole frame goes float -> uint8 -> float
+    if not legend_dict:
+        return render_buffer
+    img = Image.fromarray((render_buffer * 255).astype(np.uint8))
+    draw = ImageDraw.Draw(img)
+    try:
+        font = ImageFont.truetype("./assets/font/Helvetica.ttf", 50)
+    except IOError:
+        font = ImageFont.load_default()
+    x, y = position
+    for label, rgb in legend_dict.items():
+        draw.rectangle([x, y, x + square_size, y + square_size], fill=tuple(rgb))
+        draw.text((x + square_size + padding, y), label, fill=(0, 0, 0), font=font)
+        y += square_size + padding
+    return np.array(img).astype(np.float32) / 255.0
+
+
+def previous_readback(render_pkg, mode, size, resize_fn, legend_dict):
+    #* GUI.get_buffer + overlay_legend, then GUI.get_rgba_buffer
+    output = mode_to_rgb(render_pkg, mode, size, resize_fn)
+    output = output.permute(1, 2, 0).contiguous().detach().cpu().numpy()
+    render_buffer = full_frame_legend(output, legend_dict)
+    output = mode_to_rgb(render_pkg, mode, size, resize_fn)
+    output = output.permute(1, 2, 0).contiguous().detach().cpu().numpy()
+    alpha = render_pkg["opacity"].permute(1, 2, 0).detach().cpu().numpy().astype(output.dtype)
+    return render_buffer, np.concatenate([output, alpha], axis=-1)
+
+
+def host_times(fn, frames, device):
+    fn()  # warm up
+    out = np.empty(frames)
+    for i in range(frames):
+        if device.type == "cuda":
+            torch.cuda.synchronize()
+        tic = time.perf_counter()
+        fn()
+        out[i] = time.perf_counter() - tic
+    return out * 1e3
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="GUI frame readback: two readbacks + full-frame legend vs. FrameReadback")
+    parser.add_argument("--resolution", type=int, nargs=2, default=[800, 800], help="H W")
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--legend", type=int, default=3, help="number of legend entries (0: no legend)")
+    parser.add_argument("--mode", type=str, default="normal", choices=["phong", "normal", "diffuse_term"])
+    args = parser.parse_args()
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    H, W = args.resolution
+    #* opacity-premultiplied like the rasterizer output (normals in [-1, 1]), so the display stays in [0, 1]
+    opacity = torch.rand(1, H, W, device=device)
+    values = torch.rand(3, H, W, device=device)
+    values = opacity * (2 * values - 1 if args.mode == "normal" else values)
+    render_pkg = {args.mode: values, "opacity": opacity}
+    legend_dict = {f"object {i}": [255 * (i % 2), 128, 255 * ((i + 1) % 2)] for i in range(args.legend)}
+    resize_fn = torchvision.transforms.Resize((H, W), antialias=True)
+    readback = FrameReadback(H, W, device=device)
+
+    ref_display, ref_rgba = previous_readback(render_pkg, args.mode, (H, W), resize_fn, legend_dict)
+    display, rgba = readback.read(render_pkg, args.mode, resize_fn, legend_dict)
+    #* the previous path truncates to uint8 and PIL blends the text edges in uint8: up to 2/255 apart
+    assert np.allclose(ref_rgba, rgba, atol=1e-6) and np.abs(ref_display - display).max() <= 2 / 255 + 1e-6
+
+    print(f"{H}x{W} on {device}, mode {args.mode}, {args.legend} legend entries")
+    for name, fn in [("previous (2 readbacks + full-frame legend)",
+                      lambda: previous_readback(render_pkg, args.mode, (H, W), resize_fn, legend_dict)),
+                     ("FrameReadback (1 pinned RGBA readback)",
+                      lambda: readback.read(render_pkg, args.mode, resize_fn, legend_dict))]:
+        t = host_times(fn, args.frames, device)
+        print(f"{name:44s} median {np.median(t):7.2f} ms | p99 {np.percentile(t, 99):7.2f} ms")
+    if legend_dict:
+        frame = np.ascontiguousarray(rgba[..., :3])
+        for name, fn in [("legend: full-frame PIL round trip", lambda: full_frame_legend(frame, legend_dict)),
+                         ("legend: cached sprite, in place", lambda: overlay_legend(frame, legend_dict, inplace=True))]:
+            t = host_times(fn, args.frames, device)
+            print(f"{name:44s} median {np.median(t):7.2f} ms | p99 {np.percentile(t, 99):7.2f} ms")
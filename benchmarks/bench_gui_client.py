@@ -0,0 +1,126 @@
+"""
+Per-call latency of the LLM_agent -> GUI control paths, against a headless stand-in of the GUI state
+(same status layout and batch validation as NLI.GUI, no rendering):
+one-shot socket (LLM_agent.get_status / send_commands: a new TCP connection per call),
+persistent socket (LLM_agent.GUIClient) and in-process binding (LLM_agent.InProcessGUIClient).
+
+usage: python benchmarks/bench_gui_client.py --calls 2000 --num_TFs 8
+"""
+import os
+import sys
+import time
+import shlex
+import socket
+import threading
+from argparse import ArgumentParser
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.gui_utils import FrameScheduler
+from utils.command_server import serve_connection, validate_batch
+from LLM_agent import get_status, send_commands, GUIClient, InProcessGUIClient
+
+COMMAND_BATCH = ["set_opacity 0 1", "set_color 0 255 0 0", "legend add \"pencil\" 255 0 0", "set_fov 40",
+                 "set_light ambient 1.5"]
+
+
+class HeadlessGUI:
+    """Stand-in for NLI.GUI: the command/status state without DearPyGui and the renderer."""
+    menu_map = {"phong": "Phong", "normal": "Normal", "diffuse_term": "Diffuse", "specular_term": "Specular",
+                "ambient_term": "Ambient"}
+
+    def __init__(self, num_TFs):
+        self.TFnums = num_TFs
+        self.scheduler = FrameScheduler()
+        self.opacity_factors = [1.0] * num_TFs
+        self.palette_colors = [[0.5, 0.5, 0.5] for _ in range(num_TFs)]
+        self.fovy = 29
+        self.light = {"angle": 0.0, "elevation": 0.0, "ambient": 1.0, "diffuse": 1.0, "specular": 1.0, "shininess": 1.0}
+        self.legend_dict = {}
+
+    def get_status(self):
+        return {"mode": "phong", "field_of_view": self.fovy, "background_color": [1.0, 1.0, 1.0],
+                "opacity_factors": list(self.opacity_factors), "palette_colors": [list(c) for c in self.palette_colors],
+                "light": dict(self.light), "freeze_view": False, "legend": dict(self.legend_dict)}
+
+    def process_message(self, message, conn):
+        parts = shlex.split(message)
+        self.scheduler.command_applied()
+        if parts[0] == "get_status":
+            return self.get_status()
+        if parts[0] == "set_opacity":
+            self.opacity_factors[int(parts[1])] = float(parts[2])
+        elif parts[0] == "set_color":
+            self.palette_colors[int(parts[1])] = [int(c) / 255 for c in parts[2:5]]
+        elif parts[0] == "set_fov":
+            self.fovy = int(parts[1])
+        elif parts[0] == "set_light":
+            self.light[parts[1]] = float(parts[2])
+        elif parts[0] == "legend" and parts[1] == "add":
+            self.legend_dict[parts[2]] = [int(c) for c in parts[3:6]]
+        self.scheduler.mark_dirty()
+
+    def apply_command_batch(self, commands):
+        errors = validate_batch(commands, num_TFs=self.TFnums, modes=self.menu_map)
+        if errors:
+            return {"ok": False, "errors": errors}
+        with self.scheduler.batch():
+            results = [self.process_message(command, None) for command in commands]
+        return {"ok": True, "results": results}
+
+
+def start_server(gui, host="127.0.0.1"):
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind((host, 0))
+    server.listen(128)
+
+    def handle_client_connection(conn):
+        with conn:
+            serve_connection(conn, gui.apply_command_batch, lambda message: gui.process_message(message, conn))
+
+    def server_thread():
+        while True:
+            conn, _ = server.accept()
+            threading.Thread(target=handle_client_connection, args=(conn,), daemon=True).start()
+
+    threading.Thread(target=server_thread, daemon=True).start()
+    return server.getsockname()[1]
+
+
+def latencies(fn, calls):
+    fn()  # warm up / connect
+    out = np.empty(calls)
+    for i in range(calls):
+        tic = time.perf_counter()
+        fn()
+        out[i] = time.perf_counter() - tic
+    return out * 1e6
+
+
+def report(name, values):
+    print(f"{name:38s} median {np.median(values):8.1f} us | p99 {np.percentile(values, 99):8.1f} us")
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="socket vs. persistent vs. in-process GUI control latency")
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--num_TFs", type=int, default=8)
+    args = parser.parse_args()
+
+    gui = HeadlessGUI(args.num_TFs)
+    port = start_server(gui)
+    persistent = GUIClient(port=port)
+    in_process = InProcessGUIClient(gui)
+
+    report("get_status   one-shot socket", latencies(lambda: get_status(port=port), args.calls))
+    report("get_status   persistent socket", latencies(persistent.get_status, args.calls))
+    report("get_status   in-process", latencies(in_process.get_status, args.calls))
+    report(f"{len(COMMAND_BATCH)}-command batch one-shot socket",
+           latencies(lambda: send_commands(COMMAND_BATCH, port=port), args.calls))
+    report(f"{len(COMMAND_BATCH)}-command batch persistent socket",
+           latencies(lambda: persistent.send_commands(COMMAND_BATCH), args.calls))
+    report(f"{len(COMMAND_BATCH)}-command batch in-process",
+           latencies(lambda: in_process.send_commands(COMMAND_BATCH), args.calls))
+    persistent.close()
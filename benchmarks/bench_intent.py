@@ -0,0 +1,122 @@
+"""
+Accuracy and latency of the local intent fast path (utils.intent_utils.LocalIntentParser) on a labelled test set:
+every case is a request and the exact commands it must resolve to, or null when it must fall back to the LLM.
+Reports exact-match accuracy, coverage (simple requests resolved locally), false resolutions (requests that should
+have gone to the LLM) and the parse latency with a cold and a warm CLIP text cache.
+The TF embeddings are the CLIP text embeddings of the TF labels of the test set, or the image embeddings of a
+dataset with --image_path (then the test set labels must name its TFs and the best frames are read from the dataset).
+--calibrate sweeps min_similarity x margin and picks the setting with the highest coverage and no wrong or false
+resolution, the values for NLI.py --intent_min_similarity / --intent_margin.
+
+usage: python benchmarks/bench_intent.py --test_set benchmarks/intent_test_set.json
+       python benchmarks/bench_intent.py --image_path path/to/TF_dir --min_similarity 0.2 --margin 0.02
+       python benchmarks/bench_intent.py --image_path path/to/TF_dir --test_set my_dataset_test_set.json --calibrate
+"""
+import os
+import sys
+import json
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+import torch
+from open_clip import create_model_and_transforms, tokenize
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from LLM_agent import TextEmbeddingService, load_best_frames
+from utils.intent_utils import LocalIntentParser
+from bench_open_vocab import load_tf_embeddings
+
+MIN_SIMILARITIES = [0.15, 0.175, 0.2, 0.225, 0.25, 0.275, 0.3, 0.325, 0.35]
+MARGINS = [0.0, 0.01, 0.02, 0.03, 0.05, 0.08]
+
+
+def label_embeddings(clip_model, labels):
+    #* stand-in for the image embeddings of the TFs: the CLIP text embedding of their label
+    with torch.no_grad():
+        embeddings = clip_model.encode_text(tokenize(list(labels.values()))).float().cpu().numpy()
+    return dict(zip(labels.keys(), embeddings))
+
+
+def run(parser, cases, status, text_embeddings, best_frames):
+    results, times = [], []
+    for case in cases:
+        tic = time.perf_counter()
+        intent = parser.parse(case["query"], dict(status, **case.get("status", {})), text_embeddings, best_frames)
+        times.append((time.perf_counter() - tic) * 1e3)
+        results.append(None if intent is None else intent[0])
+    return results, np.array(times)
+
+
+def evaluate(cases, results):
+    simple = [i for i, case in enumerate(cases) if case["expected"] is not None]
+    llm = [i for i, case in enumerate(cases) if case["expected"] is None]
+    resolved = [i for i in simple if results[i] is not None]
+    return {"simple": simple, "llm": llm,
+            "correct": [i for i, case in enumerate(cases) if results[i] == case["expected"]],
+            "resolved": resolved,
+            "wrong": [i for i in resolved if results[i] != cases[i]["expected"]],
+            "false_resolutions": [i for i in llm if results[i] is not None]}
+
+
+def calibrate(cases, status, text_embeddings, best_frames):
+    rows = []
+    print(f"{'min_similarity':>14s} {'margin':>7s} {'accuracy':>9s} {'coverage':>9s} {'wrong':>6s} {'false':>6s}")
+    for min_similarity in MIN_SIMILARITIES:
+        for margin in MARGINS:
+            results, _ = run(LocalIntentParser(min_similarity, margin), cases, status, text_embeddings, best_frames)
+            e = evaluate(cases, results)
+            coverage = len(e["resolved"]) / max(len(e["simple"]), 1)
+            rows.append((min_similarity, margin, coverage, len(e["wrong"]) + len(e["false_resolutions"])))
+            print(f"{min_similarity:14.3f} {margin:7.3f} {len(e['correct']) / len(cases):9.1%} {coverage:9.1%} "
+                  f"{len(e['wrong']):6d} {len(e['false_resolutions']):6d}")
+    safe = [row for row in rows if row[3] == 0]
+    if not safe:
+        print("no setting without wrong or false resolutions: keep the fast path off (--no_intent_fast_path)")
+        return
+    #* highest coverage, then the most conservative thresholds
+    min_similarity, margin, coverage, _ = max(safe, key=lambda row: (row[2], row[0], row[1]))
+    print(f"calibrated: --intent_min_similarity {min_similarity:g} --intent_margin {margin:g} (coverage {coverage:.1%})")
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="accuracy and latency of the local intent fast path")
+    parser.add_argument("--test_set", type=str, default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "intent_test_set.json"))
+    parser.add_argument("--image_path", type=str, default=None)
+    parser.add_argument("--embedding_name", type=str, default="image_filtered_embedding_entropy.npy")
+    parser.add_argument("--min_similarity", type=float, default=0.2)
+    parser.add_argument("--margin", type=float, default=0.02)
+    parser.add_argument("--calibrate", action="store_true", help="sweep min_similarity x margin instead of one setting")
+    args = parser.parse_args()
+
+    with open(args.test_set, "r") as f:
+        test_set = json.load(f)
+    cases, status = test_set["cases"], test_set["status"]
+    clip_model, _, _ = create_model_and_transforms("ViT-B-32", pretrained="openai")
+    clip_model.eval()
+    if args.image_path is not None:
+        tf_embeddings = load_tf_embeddings(args.image_path, args.embedding_name)
+        best_frames = lambda tf_name: load_best_frames(args.image_path, tf_name)
+    else:
+        tf_embeddings = label_embeddings(clip_model, test_set["tfs"])
+        best_frames = lambda tf_name: test_set["best_frames"][tf_name]
+    text_embeddings = TextEmbeddingService(clip_model, tf_embeddings)
+    if args.calibrate:
+        print(f"{len(cases)} cases, {len(tf_embeddings)} TFs")
+        calibrate(cases, status, text_embeddings, best_frames)
+        sys.exit(0)
+    intent_parser = LocalIntentParser(min_similarity=args.min_similarity, margin=args.margin)
+
+    results, cold = run(intent_parser, cases, status, text_embeddings, best_frames)
+    _, warm = run(intent_parser, cases, status, text_embeddings, best_frames)
+    e = evaluate(cases, results)
+
+    print(f"{len(cases)} cases: {len(e['simple'])} simple, {len(e['llm'])} for the LLM, {len(tf_embeddings)} TFs")
+    print(f"accuracy           {len(e['correct']) / len(cases):6.1%}  (exact commands, or fallback when expected)")
+    print(f"coverage           {len(e['resolved']) / max(len(e['simple']), 1):6.1%}  (simple requests resolved locally)")
+    print(f"wrong resolutions  {len(e['wrong']):6d}  (resolved to other commands than expected)")
+    print(f"false resolutions  {len(e['false_resolutions']):6d}  (resolved although the LLM is needed)")
+    for name, t in [("parse, cold CLIP cache", cold), ("parse, warm CLIP cache", warm)]:
+        print(f"{name:24s} median {np.median(t):7.3f} ms | p95 {np.percentile(t, 95):7.3f} ms | max {t.max():7.3f} ms")
+    for i in e["wrong"] + e["false_resolutions"] + [i for i in e["simple"] if results[i] is None]:
+        print(f"  {cases[i]['query']!r}: got {results[i]}, expected {cases[i]['expected']}")
@@ -0,0 +1,142 @@
+"""
+Latency of the command LLM answer against a local mock of the OpenAI chat completions API (server-sent events,
+one token every --token_ms): the blocking call (LLM_agent.call_llm, commands applied once the whole answer is parsed)
+vs. the streamed call (LLM_agent.stream_llm + ResponseStreamParser, the command batch applied as soon as Part1 is
+complete). Reports time to the command batch, to the first explanation text and to the end.
+
+usage: python benchmarks/bench_llm_stream.py --token_ms 20 --runs 5
+"""
+import os
+import sys
+import json
+import time
+import threading
+from argparse import ArgumentParser
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import numpy as np
+from openai import OpenAI
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from LLM_agent import call_llm, stream_llm, parse_llm_response, ResponseStreamParser
+
+ANSWER = """Part1:
+set_opacity 0 1
+set_opacity 1 0.2
+set_color 0 255 0 0
+legend add "skull" 255 0 0
+set_light ambient 1.5
+Part2:
+"I made the skull fully opaque and colored it red so that it stands out."
+"The skin is now mostly transparent, and the ambient light is stronger to show the inner structures."
+ITERATE: NO
+"""
+
+
+def tokenize(text):
+    #* ~4 characters per token, split on spaces like a BPE tokenizer mostly does
+    tokens, current = [], ""
+    for char in text:
+        current += char
+        if char in " \n" or len(current) >= 4:
+            tokens.append(current)
+            current = ""
+    return tokens + ([current] if current else [])
+
+
+def make_handler(answer, token_delay):
+    tokens = tokenize(answer)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            base = {"id": "chatcmpl-mock", "created": int(time.time()), "model": request["model"]}
+            if not request.get("stream"):
+                time.sleep(token_delay * len(tokens))
+                body = json.dumps(dict(base, object="chat.completion", choices=[
+                    {"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": answer}}],
+                    usage={"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)})).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            for i, token in enumerate(tokens + [None]):
+                delta = {"content": token} if token is not None else {}
+                if i == 0:
+                    delta["role"] = "assistant"
+                chunk = dict(base, object="chat.completion.chunk", choices=[
+                    {"index": 0, "delta": delta, "finish_reason": None if token is not None else "stop"}])
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+                if token is not None:
+                    time.sleep(token_delay)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+            self.close_connection = True
+
+    return Handler
+
+
+def blocking_run(client, model):
+    tic = time.perf_counter()
+    commands, explanations, _ = parse_llm_response(call_llm([{"role": "user", "content": "bench"}], client, system="", model=model))
+    done = time.perf_counter() - tic
+    #* every command and every sentence becomes available at once
+    return {"commands batch": done, "first explanation": done, "end": done,
+            "commands": len(commands), "explanations": len(explanations)}
+
+
+def streamed_run(client, model):
+    times = {}
+    parser = ResponseStreamParser()
+    tic = time.perf_counter()
+
+    def dispatch(events):
+        now = time.perf_counter() - tic
+        for event in events:
+            if event[0] == "commands":
+                times["commands batch"] = now
+            elif event[0] == "explanation":
+                times.setdefault("first explanation", now)
+
+    for delta in stream_llm([{"role": "user", "content": "bench"}], client, system="", model=model):
+        dispatch(parser.feed(delta))
+    dispatch(parser.close())
+    times["end"] = time.perf_counter() - tic
+    times["commands"], times["explanations"] = len(parser.commands), len(parser.explanations)
+    return times
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="Blocking vs. streamed command LLM answer against a mock OpenAI-compatible server")
+    parser.add_argument("--token_ms", type=float, default=20, help="delay between two streamed tokens")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=0, help="port of the mock server (0: any free port)")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(ANSWER, args.token_ms / 1e3))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = OpenAI(base_url=f"http://127.0.0.1:{server.server_address[1]}/v1", api_key="mock")
+    model = "mock-gpt"
+
+    reference = parse_llm_response(ANSWER)
+    print(f"{len(tokenize(ANSWER))} tokens, {args.token_ms:g} ms/token, {len(reference[0])} commands, {len(reference[1])} explanations")
+    for name, run in [("blocking (call_llm)", blocking_run), ("streamed (stream_llm)", streamed_run)]:
+        results = [run(client, model) for _ in range(args.runs)]
+        assert all(r["commands"] == len(reference[0]) and r["explanations"] == len(reference[1]) for r in results)
+        print(name)
+        for key in ["commands batch", "first explanation", "end"]:
+            t = np.array([r[key] for r in results]) * 1e3
+            print(f"  {key:20s} median {np.median(t):8.1f} ms | max {t.max():8.1f} ms")
+    server.shutdown()
@@ -0,0 +1,110 @@
+"""
+Loader benchmark of quantised phong checkpoints: the plyfile path of GaussianModel.my_load_ply / _parse_codebook
+(one numpy array and one device transfer per attribute) vs. the memory-mapped native container
+(utils.io_utils.load_native_gaussians, one transfer). Both include the codebook decode to float tensors.
+
+usage: python benchmarks/bench_native_load.py --num_gaussians 1000000,5000000
+       python benchmarks/bench_native_load.py --ply path/to/point_cloud.ply
+"""
+import os
+import sys
+import time
+import tempfile
+from argparse import ArgumentParser
+
+import numpy as np
+import torch
+from plyfile import PlyData, PlyElement
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.io_utils import fill_structured_array, convert_ply_to_native, load_native_gaussians, NATIVE_ID_COLUMNS
+from bench_ply_save import ATTRIBUTES, synthetic_attributes
+
+CODEBOOK_KEYS = ["opacity", "scaling", "rotation_re", "rotation_im", "normal", "offset_color",
+                 "diffuse_factor", "shininess", "ambient_factor", "specular_factor"]
+PLY_PREFIX = {"scaling": "scale", "rotation": "rot"}
+
+
+def write_synthetic_ply(path, num_gaussians, rng):
+    dtype_full = [(attribute, 'int16') if attribute in ['x', 'y', 'z'] else (attribute, 'u1') for attribute in ATTRIBUTES]
+    elements = fill_structured_array(np.empty(num_gaussians, dtype=dtype_full),
+                                     synthetic_attributes(num_gaussians, True, True, rng))
+    codebooks = fill_structured_array(np.empty(256, dtype=[(k, 'int16') for k in CODEBOOK_KEYS]),
+                                      [rng.standard_normal((256, 1)).astype(np.float16).view(np.int16)
+                                       for _ in CODEBOOK_KEYS])
+    PlyData([PlyElement.describe(elements, 'gaussians'),
+             PlyElement.describe(codebooks, 'codebook_centers')]).write(path)
+
+
+def decode(ids, codebook):
+    """Same indexing as GaussianModel._decode_codebook_ids."""
+    out = {}
+    for name, _ in NATIVE_ID_COLUMNS:
+        if name == "rotation":
+            out[name] = torch.cat((codebook["rotation_re"][ids[name][:, 0:1].long()],
+                                   codebook["rotation_im"][ids[name][:, 1:].long()]), dim=1)
+        else:
+            out[name] = codebook[name][ids[name].long()]
+    return out
+
+
+def load_ply(path, device):
+    plydata = PlyData.read(path)
+    vertex_group, codebook_centers = plydata.elements[0], plydata.elements[-1]
+    codebook = {k: torch.from_numpy(np.asarray(codebook_centers[k], dtype='int16')).to(device).view(torch.float16).float()
+                for k in CODEBOOK_KEYS}
+    xyz = np.stack([np.asarray(vertex_group[k], dtype='int16') for k in ["x", "y", "z"]], axis=1)
+    xyz = torch.from_numpy(xyz).to(device).view(torch.float16).float()
+    ids = {}
+    for name, count in NATIVE_ID_COLUMNS:
+        names = [name] if count == 1 else [f"{PLY_PREFIX.get(name, name)}_{i}" for i in range(count)]
+        ids[name] = torch.from_numpy(np.stack([np.asarray(vertex_group[n], dtype='u1') for n in names], axis=1)).to(device)
+    return xyz, decode(ids, codebook)
+
+
+def load_native(path, device):
+    header, columns = load_native_gaussians(path, device=device)
+    codebook = columns["codebook"].float()
+    codebook = {key: codebook[:, i] for i, key in enumerate(header["codebook_keys"])}
+    return columns["xyz"].float(), decode(columns, codebook)
+
+
+def timed(fn, *args):
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+    tic = time.perf_counter()
+    out = fn(*args)
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+    return out, time.perf_counter() - tic
+
+
+def bench(ply_path, device):
+    native_path, t_convert = timed(convert_ply_to_native, ply_path, os.path.splitext(ply_path)[0] + "_bench.gsn")
+    (xyz_ply, attrs_ply), t_ply = timed(load_ply, ply_path, device)
+    (xyz_native, attrs_native), t_native = timed(load_native, native_path, device)
+    assert torch.equal(xyz_ply, xyz_native)
+    assert all(torch.equal(attrs_ply[k], attrs_native[k]) for k in attrs_ply)
+    print(f"{ply_path}: {xyz_ply.shape[0]} Gaussians on {device} | my_load_ply path {t_ply:6.3f} s | "
+          f"native {t_native:6.3f} s ({t_ply / t_native:5.1f}x) | "
+          f"size {os.path.getsize(ply_path) / 2**20:.1f} MB -> {os.path.getsize(native_path) / 2**20:.1f} MB "
+          f"(conversion {t_convert:.2f} s)")
+    os.remove(native_path)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="my_load_ply vs. native container loading")
+    parser.add_argument("--num_gaussians", type=str, default="1000000,5000000")
+    parser.add_argument("--ply", nargs='*', default=[], help="existing quantised half-float checkpoints")
+    parser.add_argument("--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu")
+    args = parser.parse_args()
+
+    for ply_path in args.ply:
+        bench(ply_path, args.device)
+    if not args.ply:
+        rng = np.random.default_rng(0)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for num_gaussians in [int(x) for x in args.num_gaussians.split(",")]:
+                ply_path = os.path.join(tmp_dir, f"point_cloud_{num_gaussians}.ply")
+                write_synthetic_ply(ply_path, num_gaussians, rng)
+                bench(ply_path, args.device)
@@ -0,0 +1,85 @@
+"""
+Timing of the open-vocabulary stage of LLM_agent.process_user_query on CPU, over the refinement iterations of one
+query: the former per-description embed_text + find_best_tfs loop vs. LLM_agent.TextEmbeddingService
+(one batched encode_text, LRU text cache, one matrix product for all TFs).
+
+usage: python benchmarks/bench_open_vocab.py --image_path path/to/TF_dir --embedding_name image_filtered_embedding_entropy.npy
+       python benchmarks/bench_open_vocab.py --num_TFs 8,64   (random TF embeddings)
+"""
+import os
+import sys
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+import torch
+from open_clip import create_model_and_transforms
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from LLM_agent import embed_text, find_best_tfs, TextEmbeddingService
+
+DESCRIPTIONS = ["a swim bladder", "the pectoral fin of the carp", "claws of the lobster", "a pencil",
+                "the skull", "the teeth"]
+
+
+def load_tf_embeddings(image_path, embedding_name):
+    tf_embeddings = {}
+    for folder_name in sorted(os.listdir(image_path)):
+        embedding_path = os.path.join(image_path, folder_name, embedding_name)
+        if folder_name.startswith("TF") and os.path.exists(embedding_path):
+            tf_embeddings[folder_name] = np.load(embedding_path)
+    return tf_embeddings
+
+
+def loop_path(clip_model, tf_embeddings, descriptions, iterations):
+    #* the previous implementation: every description is encoded again at every refinement iteration
+    for _ in range(iterations):
+        results = [find_best_tfs(embed_text(description, clip_model), description, tf_embeddings, threshold=0.01)
+                   for description in descriptions]
+    return results
+
+
+def service_path(clip_model, tf_embeddings, descriptions, iterations):
+    service = TextEmbeddingService(clip_model, tf_embeddings)
+    for _ in range(iterations):
+        service.embed_texts(descriptions)
+        results = service.find_best_tfs(descriptions, threshold=0.01)
+    return results
+
+
+def timed(fn, *args):
+    tic = time.perf_counter()
+    out = fn(*args)
+    return out, (time.perf_counter() - tic) * 1e3
+
+
+def bench(clip_model, tf_embeddings, descriptions, iterations):
+    ref, t_loop = timed(loop_path, clip_model, tf_embeddings, descriptions, iterations)
+    out, t_service = timed(service_path, clip_model, tf_embeddings, descriptions, iterations)
+    for ref_tfs, out_tfs in zip(ref, out):
+        assert ref_tfs[0][0] == out_tfs[0][0] and np.isclose(ref_tfs[0][1], out_tfs[0][1], atol=1e-5)
+    print(f"{len(tf_embeddings):4d} TFs, {len(descriptions)} descriptions x {iterations} iterations: "
+          f"loop {t_loop:8.1f} ms | service {t_service:8.1f} ms | speedup {t_loop / t_service:5.1f}x")
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="open-vocabulary stage: per-description loop vs. TextEmbeddingService")
+    parser.add_argument("--image_path", type=str, default=None, help="directory with the TFxx folders")
+    parser.add_argument("--embedding_name", type=str, default="image_filtered_embedding_entropy.npy")
+    parser.add_argument("--num_TFs", type=str, default="8,64", help="random TF embeddings, without --image_path")
+    parser.add_argument("--num_descriptions", type=int, default=3)
+    parser.add_argument("--iterations", type=int, default=5, help="refinement iterations of one query")
+    args = parser.parse_args()
+
+    torch.set_num_threads(os.cpu_count() or 1)
+    clip_model, _, _ = create_model_and_transforms("ViT-B-32", pretrained="openai")
+    clip_model.eval()
+    descriptions = DESCRIPTIONS[:args.num_descriptions]
+    if args.image_path is not None:
+        bench(clip_model, load_tf_embeddings(args.image_path, args.embedding_name), descriptions, args.iterations)
+    else:
+        rng = np.random.default_rng(0)
+        dim = clip_model.text_projection.shape[1]
+        for num_TF in [int(x) for x in args.num_TFs.split(",")]:
+            tf_embeddings = {f"TF{i:02d}": rng.standard_normal(dim).astype(np.float32) for i in range(num_TF)}
+            bench(clip_model, tf_embeddings, descriptions, args.iterations)
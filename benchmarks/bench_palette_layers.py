@@ -0,0 +1,113 @@
+"""
+Screen-space palette edits of gaussian_renderer/render_inverse.py: checks that rasterize_screen_space splits feature
+tensors wider than the 33 channels of the CUDA rasterizer into chunks and blends them like a single pass, and that
+render_palette_layers renders the layers of more than 30 TFs, with a stand-in rasterizer (blends every channel with
+fixed per-Gaussian weights, so no CUDA device is needed). Then times composite_palette_layers, the per-edit cost of a
+palette-only change, per number of TFs.
+
+usage: python benchmarks/bench_palette_layers.py --resolution 800 800 --num_TFs 2,7,32,64
+"""
+import os
+import sys
+import time
+from argparse import ArgumentParser
+from types import SimpleNamespace
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from gaussian_renderer import render_inverse
+from gaussian_renderer.render_inverse import (MAX_FEATURE_CHANNELS, rasterize_screen_space, render_palette_layers,
+                                              composite_palette_layers)
+
+
+class BlendRasterizer:
+    """Blends every feature channel with a fixed per-Gaussian weight, records the channels of each call."""
+    def __init__(self, weights):
+        self.weights = weights # [N, H, W]
+        self.channels = []
+
+    def __call__(self, means3D, means2D, colors_precomp, opacities, scales, rotations, cov3D_precomp, features):
+        assert features.shape[-1] <= MAX_FEATURE_CHANNELS, f"{features.shape[-1]} feature channels"
+        self.channels.append(features.shape[-1])
+        feature = torch.einsum("nc,nhw->chw", features, self.weights)
+        opacity = self.weights.sum(0, keepdim=True)
+        H, W = self.weights.shape[1:]
+        return None, None, None, opacity, None, feature, None, torch.zeros(3, H, W), None
+
+
+def blend_inputs(N, num_TF):
+    return {"means3D": torch.randn(N, 3), "opacity": torch.rand(N, 1), "scales": torch.rand(N, 3),
+            "rotations": torch.randn(N, 4), "cov3D_precomp": None, "normal": F.normalize(torch.randn(N, 3), dim=-1),
+            "offset_color": torch.rand(N, 3), "tf_ids": torch.arange(N) % num_TF,
+            "diffuse_factor": torch.rand(N, 1), "shininess": torch.rand(N, 1), "ambient_factor": torch.rand(N, 1),
+            "specular_factor": torch.rand(N, 1)}
+
+
+def check_feature_split(H=4, W=5, N=16):
+    rasterizer = BlendRasterizer(torch.rand(N, H, W) / N)
+    features = torch.rand(N, 3 + 70)
+    rendered_feature, _, _ = rasterize_screen_space(rasterizer, blend_inputs(N, 70), features)
+    assert rasterizer.channels == [33, 33, 7], rasterizer.channels
+    assert torch.allclose(rendered_feature, torch.einsum("nc,nhw->chw", features, rasterizer.weights), atol=1e-6)
+    print(f"rasterize_screen_space: 73 channels in passes of {rasterizer.channels}, same blend as a single pass")
+
+
+def check_palette_layers(H=4, W=5, N=64):
+    num_TF = MAX_FEATURE_CHANNELS # 3 + num_TF channels do not fit one rasterization
+    rasterizer = BlendRasterizer(torch.rand(N, H, W) / N)
+    inputs = blend_inputs(N, num_TF)
+    patched = {"build_rasterizer": lambda *args, **kwargs: rasterizer,
+               "screen_space_inputs": lambda *args, **kwargs: inputs,
+               "apply_light_transform": lambda light, *factors: factors}
+    saved = {name: getattr(render_inverse, name) for name in patched}
+    for name, fn in patched.items():
+        setattr(render_inverse, name, fn)
+    try:
+        light = SimpleNamespace(get_light_dir=lambda: None)
+        camera = SimpleNamespace(camera_center=torch.zeros(3))
+        layers = render_palette_layers(camera, None, None, torch.zeros(3),
+                                       dict_params={"light_transform": light, "palette_colors": [None] * num_TF})
+    finally:
+        for name, fn in saved.items():
+            setattr(render_inverse, name, fn)
+    assert len(rasterizer.channels) == 2, rasterizer.channels
+    assert layers["base"].shape == (3, H, W) and layers["coeffs"].shape == (num_TF, H, W)
+    print(f"render_palette_layers: {num_TF} TFs in passes of {rasterizer.channels}")
+
+
+def time_composite(H, W, num_TF, device, repeats):
+    layers = {"base": torch.rand(3, H, W, device=device), "coeffs": torch.rand(num_TF, H, W, device=device),
+              "opacity": torch.rand(1, H, W, device=device)}
+    palettes = [SimpleNamespace(palette_color=torch.rand(3, device=device)) for _ in range(num_TF)]
+    bg_color = torch.ones(3, device=device)
+    times = []
+    for _ in range(repeats + 1):
+        if device == "cuda":
+            torch.cuda.synchronize()
+        tic = time.perf_counter()
+        composite_palette_layers(layers, palettes, bg_color)
+        if device == "cuda":
+            torch.cuda.synchronize()
+        times.append((time.perf_counter() - tic) * 1e3)
+    return np.array(times[1:]) # the first call warms up
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="screen-space palette layers: feature split checks and composite timing")
+    parser.add_argument("--resolution", type=int, nargs=2, default=[800, 800])
+    parser.add_argument("--num_TFs", type=str, default="2,7,32,64")
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    check_feature_split()
+    check_palette_layers()
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    H, W = args.resolution
+    for num_TF in [int(n) for n in args.num_TFs.split(",")]:
+        t = time_composite(H, W, num_TF, device, args.repeats)
+        print(f"composite {W}x{H}, {num_TF:3d} TFs ({device}): median {np.median(t):7.3f} ms | max {t.max():7.3f} ms")
@@ -0,0 +1,78 @@
+"""
+Benchmark of the element fill + write of GaussianModel.my_save_ply for synthetic Phong Gaussians:
+the former per-Gaussian tuple fill (elements[:] = list(map(tuple, attributes))) vs. the column-wise
+fill of utils.io_utils.fill_structured_array. Also checks that both files are byte-identical.
+
+usage: python benchmarks/bench_ply_save.py --num_gaussians 1000000,5000000 [--quantised] [--half_float]
+"""
+import os
+import sys
+import time
+import hashlib
+import tempfile
+from argparse import ArgumentParser
+
+import numpy as np
+from plyfile import PlyData, PlyElement
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.io_utils import fill_structured_array
+
+# same order as GaussianModel.construct_list_of_attributes() for phong models
+ATTRIBUTES = ['x', 'y', 'z', 'opacity', 'normal_0', 'normal_1', 'normal_2', 'scale_0', 'scale_1', 'scale_2',
+              'rot_0', 'rot_1', 'rot_2', 'rot_3', 'offset_color_0', 'offset_color_1', 'offset_color_2',
+              'diffuse_factor', 'shininess', 'ambient_factor', 'specular_factor']
+# xyz, opacity, normal, scaling, rotation, offset_color, diffuse_factor, shininess, ambient_factor, specular_factor
+CHANNELS = [3, 1, 3, 3, 4, 3, 1, 1, 1, 1]
+
+
+def synthetic_attributes(num_gaussians, quantised, half_float, rng):
+    xyz = rng.standard_normal((num_gaussians, 3), dtype=np.float32)
+    if half_float:
+        xyz = xyz.astype(np.float16).view(np.int16)
+    if quantised:
+        rest = [rng.integers(0, 256, (num_gaussians, c), dtype=np.uint8) for c in CHANNELS[1:]]
+    else:
+        rest = [rng.standard_normal((num_gaussians, c), dtype=np.float32) for c in CHANNELS[1:]]
+    return [xyz] + rest
+
+
+def write(path, attributes, quantised, half_float, legacy):
+    float_type = 'int16' if half_float else 'f4'
+    attribute_type = 'u1' if quantised else float_type
+    dtype_full = [(attribute, float_type) if attribute in ['x', 'y', 'z'] else (attribute, attribute_type)
+                  for attribute in ATTRIBUTES]
+    elements = np.empty(attributes[0].shape[0], dtype=dtype_full)
+    tic = time.perf_counter()
+    if legacy:
+        elements[:] = list(map(tuple, np.concatenate(attributes, axis=1)))
+    else:
+        fill_structured_array(elements, attributes)
+    t_fill = time.perf_counter() - tic
+    PlyData([PlyElement.describe(elements, 'gaussians')]).write(path)
+    return t_fill, time.perf_counter() - tic
+
+
+def md5(path):
+    with open(path, 'rb') as f:
+        return hashlib.md5(f.read()).hexdigest()
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="my_save_ply tuple fill vs. column fill")
+    parser.add_argument("--num_gaussians", type=str, default="1000000,5000000")
+    parser.add_argument("--quantised", action="store_true")
+    parser.add_argument("--half_float", action="store_true")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for num_gaussians in [int(x) for x in args.num_gaussians.split(",")]:
+            attributes = synthetic_attributes(num_gaussians, args.quantised, args.half_float, rng)
+            legacy_path = os.path.join(tmp_dir, "legacy.ply")
+            column_path = os.path.join(tmp_dir, "column.ply")
+            legacy_fill, legacy_total = write(legacy_path, attributes, args.quantised, args.half_float, legacy=True)
+            column_fill, column_total = write(column_path, attributes, args.quantised, args.half_float, legacy=False)
+            assert md5(legacy_path) == md5(column_path), "the column fill changed the file"
+            print(f"{num_gaussians:>9d} Gaussians: tuple fill {legacy_fill:7.2f} s (save {legacy_total:7.2f} s) | "
+                  f"column fill {column_fill:7.3f} s (save {column_total:7.2f} s) | identical files")
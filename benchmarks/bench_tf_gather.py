@@ -0,0 +1,78 @@
+"""
+Micro-benchmark of the per-TF palette color / opacity factor application in
+rendering_equation_BlinnPhong_python: the former Python slice loop over the TFs
+vs. a single gather with the per-Gaussian TF index.
+
+usage: python benchmarks/bench_tf_gather.py --num_gaussians 1000000 --num_TFs 2,7,32
+"""
+import os
+import sys
+import time
+from argparse import ArgumentParser
+from types import SimpleNamespace
+
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.tf_utils import build_tf_ids, stack_palette_colors, stack_opacity_factors, gather_per_tf
+
+
+def loop_path(palette_color_transforms, opacity_transforms, opacity, offset_color, num_GSs_TFs):
+    #* the previous implementation in gaussian_renderer/render_inverse.py
+    diffuse_color = torch.zeros_like(offset_color)
+    start_GS = 0
+    for i in range(len(num_GSs_TFs)):
+        end_GS = num_GSs_TFs[i] + start_GS
+        diffuse_segment = offset_color[start_GS:end_GS, :, :].clone().detach().requires_grad_(True)
+        diffuse_segment = diffuse_segment + palette_color_transforms[i].palette_color.clamp(0, 1)
+        diffuse_color[start_GS:end_GS, :, :] = diffuse_segment
+        opacity_segment = opacity[start_GS:end_GS, :].clone().detach().requires_grad_(True)
+        opacity_segment = opacity_segment * opacity_transforms[i].opacity_factor
+        opacity[start_GS:end_GS, :] = opacity_segment
+        start_GS = end_GS
+    return diffuse_color, opacity
+
+
+def gather_path(palette_color_transforms, opacity_transforms, opacity, offset_color, tf_ids):
+    palette_colors = stack_palette_colors(palette_color_transforms)
+    diffuse_color = offset_color.detach() + gather_per_tf(palette_colors, tf_ids).unsqueeze(-2)
+    opacity_factors = stack_opacity_factors(opacity_transforms)
+    opacity = opacity.detach() * gather_per_tf(opacity_factors, tf_ids).unsqueeze(-1)
+    return diffuse_color, opacity
+
+
+def timeit(fn, repeats):
+    fn()  # warm up
+    tic = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - tic) / repeats * 1e3
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="TF slice loop vs. TF index gather")
+    parser.add_argument("--num_gaussians", type=int, default=1000000)
+    parser.add_argument("--num_TFs", type=str, default="2,7,32")
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    torch.set_grad_enabled(False)
+    for num_TF in [int(x) for x in args.num_TFs.split(",")]:
+        # random split of the Gaussians into num_TF components
+        cuts = torch.sort(torch.randint(0, args.num_gaussians, (num_TF - 1,))).values.tolist()
+        num_GSs_TFs = [b - a for a, b in zip([0] + cuts, cuts + [args.num_gaussians])]
+        palettes = [SimpleNamespace(palette_color=torch.rand(3)) for _ in range(num_TF)]
+        opacities = [SimpleNamespace(opacity_factor=torch.rand(1)) for _ in range(num_TF)]
+        offset_color = torch.rand(args.num_gaussians, 1, 3)
+        opacity = torch.rand(args.num_gaussians, 1)
+        tf_ids = build_tf_ids(num_GSs_TFs, device="cpu")
+
+        ref = loop_path(palettes, opacities, opacity.clone(), offset_color, num_GSs_TFs)
+        out = gather_path(palettes, opacities, opacity.clone(), offset_color, tf_ids)
+        assert torch.allclose(ref[0], out[0]) and torch.allclose(ref[1], out[1])
+
+        t_loop = timeit(lambda: loop_path(palettes, opacities, opacity.clone(), offset_color, num_GSs_TFs), args.repeats)
+        t_gather = timeit(lambda: gather_path(palettes, opacities, opacity.clone(), offset_color, tf_ids), args.repeats)
+        print(f"{num_TF:3d} TFs, {args.num_gaussians} Gaussians: loop {t_loop:8.2f} ms | gather {t_gather:8.2f} ms "
+              f"| speedup {t_loop / t_gather:5.2f}x")
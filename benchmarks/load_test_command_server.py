@@ -0,0 +1,125 @@
+"""
+Load test of utils.command_server.AsyncCommandServer against the headless GUI stand-in of bench_gui_client.py.
+Hundreds of asyncio clients send command batches over persistent connections while a render thread draws
+frames through the FrameScheduler. Checks that
+- batches are applied by one writer at a time (no overlapping process_message calls),
+- no frame sees a partially applied batch (every batch sets all TF opacities to the same value),
+- excess clients get an explicit "server busy" reply instead of a thread.
+
+usage: python benchmarks/load_test_command_server.py --clients 500 --batches 20 --max_clients 64
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import threading
+from argparse import ArgumentParser
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.command_server import AsyncCommandServer
+from bench_gui_client import HeadlessGUI
+
+
+class CheckedHeadlessGUI(HeadlessGUI):
+    def __init__(self, num_TFs):
+        super().__init__(num_TFs)
+        self.writer_guard = threading.Lock()
+        self.overlaps = 0
+        self.torn_frames = 0
+
+    def process_message(self, message, conn):
+        if not self.writer_guard.acquire(blocking=False):
+            self.overlaps += 1
+            return super().process_message(message, conn)
+        try:
+            return super().process_message(message, conn)
+        finally:
+            self.writer_guard.release()
+
+    def render(self, kinds):
+        if len(set(self.opacity_factors)) > 1:
+            self.torn_frames += 1
+        time.sleep(0.001)  # stand-in for the rasterization
+
+
+def render_loop(gui, stop):
+    while not stop.is_set():
+        if not gui.scheduler.flush(gui.render):
+            time.sleep(0.001)
+
+
+async def client(port, num_TFs, batches, rng, latencies, counters):
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    except OSError:
+        counters["connect_errors"] += 1
+        return
+    try:
+        for i in range(batches):
+            value = round(rng.random(), 3)
+            commands = [f"set_opacity {tf} {value}" for tf in range(num_TFs)] + ["get_status"]
+            tic = time.perf_counter()
+            writer.write((json.dumps({"id": i, "commands": commands}) + "\n").encode("utf-8"))
+            await writer.drain()
+            line = await reader.readline()
+            if not line:
+                counters["closed"] += 1
+                return
+            reply = json.loads(line)
+            if reply.get("busy"):
+                counters["busy"] += 1
+                if reply.get("closed"):
+                    return
+                await asyncio.sleep(0.01 * rng.random())
+                continue
+            latencies.append(time.perf_counter() - tic)
+            counters["ok" if reply["ok"] else "rejected"] += 1
+    except ConnectionError:
+        counters["closed"] += 1
+    finally:
+        writer.close()
+
+
+async def run_clients(port, args):
+    latencies = []
+    counters = {"ok": 0, "rejected": 0, "busy": 0, "closed": 0, "connect_errors": 0}
+    rng = random.Random(0)
+    await asyncio.gather(*[client(port, args.num_TFs, args.batches, random.Random(rng.random()), latencies, counters)
+                           for _ in range(args.clients)])
+    return np.array(latencies) * 1e3, counters
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="AsyncCommandServer load test")
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--batches", type=int, default=20, help="batches per client")
+    parser.add_argument("--num_TFs", type=int, default=8)
+    parser.add_argument("--max_clients", type=int, default=64)
+    parser.add_argument("--max_pending", type=int, default=256)
+    args = parser.parse_args()
+
+    gui = CheckedHeadlessGUI(args.num_TFs)
+    server = AsyncCommandServer(gui.apply_command_batch, gui.process_message, port=0,
+                                max_clients=args.max_clients, max_pending=args.max_pending).start()
+    stop = threading.Event()
+    renderer = threading.Thread(target=render_loop, args=(gui, stop), daemon=True)
+    renderer.start()
+
+    tic = time.perf_counter()
+    latencies, counters = asyncio.run(run_clients(server.port, args))
+    elapsed = time.perf_counter() - tic
+    stop.set()
+    renderer.join()
+    server.stop()
+
+    print(f"{args.clients} clients x {args.batches} batches in {elapsed:.2f} s "
+          f"({counters['ok'] / elapsed:.0f} applied batches/s, {gui.scheduler.renders_run} frames)")
+    print(f"replies: {counters} | server: {dict(server.stats)}")
+    if len(latencies):
+        print(f"batch latency: median {np.median(latencies):.2f} ms | p99 {np.percentile(latencies, 99):.2f} ms")
+    print(f"overlapping writers: {gui.overlaps} | torn frames: {gui.torn_frames}")
+    assert gui.overlaps == 0 and gui.torn_frames == 0
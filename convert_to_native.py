@@ -0,0 +1,32 @@
+import os
+import glob
+from argparse import ArgumentParser
+from utils.io_utils import convert_ply_to_native
+from utils.system_utils import searchForMaxIteration
+
+#* Converts quantised point_cloud.ply checkpoints into the native memory-mappable container (point_cloud.gsn),
+#* which GaussianModel.load_quantised_checkpoint picks up automatically.
+#* usage: python convert_to_native.py -so ./output/dataset  (all TF*/neilf/point_cloud checkpoints)
+#*        python convert_to_native.py --ply path/to/point_cloud.ply
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="Convert quantised ply checkpoints to the native container")
+    parser.add_argument('-so', '--source_dir', default=None, help="the source ckpts dir (with TF* folders)")
+    parser.add_argument('--ply', nargs='*', default=[], help="ply checkpoints to convert")
+    parser.add_argument('--stylize_name', type=str, default=None, help="also convert this stylized model")
+    args = parser.parse_args()
+
+    ply_paths = list(args.ply)
+    if args.source_dir is not None:
+        for TF_folder in sorted(glob.glob(f"{args.source_dir}/TF*")):
+            for name in ["point_cloud", args.stylize_name]:
+                ckpt_dir = os.path.join(TF_folder, "neilf", name) if name else None
+                if ckpt_dir is None or not os.path.isdir(ckpt_dir):
+                    continue
+                max_iters = searchForMaxIteration(ckpt_dir)
+                ply_paths.append(os.path.join(ckpt_dir, f"iteration_{max_iters}", "point_cloud.ply"))
+
+    for ply_path in ply_paths:
+        native_path = convert_ply_to_native(ply_path)
+        print(f"{ply_path} ({os.path.getsize(ply_path) / 2**20:.1f} MB) -> "
+              f"{native_path} ({os.path.getsize(native_path) / 2**20:.1f} MB)")
@@ -1,6 +1,7 @@
 from gaussian_renderer.render import render
 from gaussian_renderer.neilf import render_neilf
-from gaussian_renderer.render_inverse import render_neilf_inverse
+from gaussian_renderer.render_inverse import render_neilf_inverse, render_palette_layers, composite_palette_layers, \
+    render_gbuffer, shade_gbuffer
 
 
 render_fn_dict = {
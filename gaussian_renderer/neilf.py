@@ -10,6 +10,7 @@ from utils.sh_utils import eval_sh, eval_sh_coef
 from utils.loss_utils import ssim, bilateral_smooth_loss, contentrate_loss, sparsity_loss
 from utils.image_utils import psnr
 from utils.graphics_utils import fibonacci_sphere_sampling
+from utils.tf_utils import stack_palette_colors, stack_opacity_factors, gather_per_tf, select_visible
 from .diff_rasterization import GaussianRasterizationSettings, GaussianRasterizer, RenderEquation, \
     RenderEquation_complex
 
@@ -57,7 +58,6 @@ def render_view(viewpoint_camera: Camera, pc: GaussianModel, pipe, bg_color: tor
 
     means3D = pc.get_xyz
     means2D = screenspace_points
-    opacity = pc.get_opacity
 
     # If precomputed 3d covariance is provided, use it. If not, then it will be computed from
     # scaling / rotation by the rasterizer.
@@ -66,9 +66,6 @@ def render_view(viewpoint_camera: Camera, pc: GaussianModel, pipe, bg_color: tor
     cov3D_precomp = None
     if pipe.compute_cov3D_python:
         cov3D_precomp = pc.get_covariance(scaling_modifier)
-    else:
-        scales = pc.get_scaling
-        rotations = pc.get_rotation
 
     # If precomputed colors are provided, use them. Otherwise, if it is desired to precompute colors
     # from SHs in Python, do it. If not, then SH -> RGB conversion will be done by rasterizer.
@@ -88,13 +85,19 @@ def render_view(viewpoint_camera: Camera, pc: GaussianModel, pipe, bg_color: tor
 
     # palette_color = pc.get_palette_color
     # palette_color = palette_color_transform.palette_color
-    offset_color = pc.get_offset_color
-    diffuse_factor = pc.get_diffuse_factor
-    shininess = pc.get_shininess
-    ambient_factor = pc.get_ambient_factor
-    specular_factor = pc.get_specular_factor 
-    normal = pc.get_normal
     num_GSs_TF = pc.get_num_GSs_TF
+    tf_ids = pc.get_tf_ids
+
+    #* drop whole TFs whose opacity factor is 0 before decoding, shading and rasterization
+    #* (not while training, the opacity factors are optimized there)
+    visible_idx = None if is_training else pc.get_visible_indices(opacity_transforms)
+    means3D, means2D, cov3D_precomp, shs, colors_precomp, tf_ids = select_visible(
+        visible_idx, means3D, means2D, cov3D_precomp, shs, colors_precomp, tf_ids)
+    opacity, = pc.get_visible(visible_idx, "opacity")
+    if not pipe.compute_cov3D_python:
+        scales, rotations = pc.get_visible(visible_idx, "scaling", "rotation")
+    offset_color, diffuse_factor, shininess, ambient_factor, specular_factor, normal = pc.get_visible(
+        visible_idx, "offset_color", "diffuse_factor", "shininess", "ambient_factor", "specular_factor", "normal")
 
     viewdirs = F.normalize(viewpoint_camera.camera_center - means3D, dim=-1)
 
@@ -108,7 +111,7 @@ def render_view(viewpoint_camera: Camera, pc: GaussianModel, pipe, bg_color: tor
 
      
     brdf_color, extra_results, opacity = rendering_equation_BlinnPhong_python(
-        palette_color_transforms, opacity_transforms, opacity, offset_color, diffuse_factor, shininess, ambient_factor, specular_factor, normal, viewdirs, incidents_dirs, num_GSs_TF)
+        palette_color_transforms, opacity_transforms, opacity, offset_color, diffuse_factor, shininess, ambient_factor, specular_factor, normal, viewdirs, incidents_dirs, num_GSs_TF, tf_ids)
 
 
     if is_training:
@@ -169,6 +172,10 @@ def render_view(viewpoint_camera: Camera, pc: GaussianModel, pipe, bg_color: tor
                              "specular_term": rendered_specular_term,
                              })
 
+    if visible_idx is not None:
+        #* scatter the radii of the culled scene back to all Gaussians
+        radii = torch.zeros(pc.get_gaussian_nums, dtype=radii.dtype, device=radii.device).index_copy_(0, visible_idx, radii)
+
     phong = rendered_phong
     rendered_phong = phong + (1 - rendered_opacity) * bg_color[:, None, None]
 
@@ -350,7 +357,7 @@ def sample_incident_rays(normals, is_training=False, sample_num=24):
     return incident_dirs, incident_areas  # [N, S, 3], [N, S, 1]
 
 def rendering_equation_BlinnPhong_python(palette_color_transforms, opacity_transforms, opacity, offset_color, diffuse_factor, shininess, ambient_factor, specular_factor, normals, viewdirs,
-                                         incidents_dirs, num_GSs_TFs):
+                                         incidents_dirs, num_GSs_TFs, tf_ids):
     guassian_nums = offset_color.shape[0]
     # ic(palette_color.shape)
     offset_color = offset_color.unsqueeze(-2).contiguous()
@@ -361,30 +368,20 @@ def rendering_equation_BlinnPhong_python(palette_color_transforms, opacity_trans
     normals = normals.unsqueeze(-2).contiguous()
     viewdirs = viewdirs.unsqueeze(-2).contiguous()
     incident_dirs = incidents_dirs.unsqueeze(-2).contiguous()
-    diffuse_color = torch.zeros_like(offset_color)
     
     offset_color_norm = (offset_color**2).sum(dim=-1).sum(dim=-1, keepdim=True)
     
     
     #* inverse rendering
-
-    palette_colors = []
-    opacity_factors = []
-    for i in range(len(palette_color_transforms)):
-        palette_colors.append(palette_color_transforms[i].palette_color.clamp(0,1))
-        if opacity_transforms is not None:
-            opacity_factors.append(opacity_transforms[i].opacity_factor)
+    palette_colors = stack_palette_colors(palette_color_transforms).detach() # [num_TF, 3]
     
     if len(num_GSs_TFs) > 1: # for multi GS rendering
-        start_GS = 0
-        for i in range(len(num_GSs_TFs)):
-            end_GS = num_GSs_TFs[i] + start_GS
-            diffuse_color[start_GS:end_GS,:,:] = offset_color[start_GS:end_GS,:,:] + palette_color_transforms[i].palette_color.clamp(0,1).detach()
-            if opacity_transforms is not None:
-                opacity[start_GS:end_GS,:] = opacity[start_GS:end_GS,:] * opacity_factors[i]
-            start_GS = end_GS
+        #* one gather with the per-Gaussian TF index instead of a slice loop over the TFs
+        diffuse_color = offset_color + gather_per_tf(palette_colors, tf_ids).unsqueeze(-2)
+        if opacity_transforms is not None:
+            opacity = opacity * gather_per_tf(stack_opacity_factors(opacity_transforms), tf_ids).unsqueeze(-1)
     else: # for individual GS optimization
-        diffuse_color = offset_color+palette_color_transforms[0].palette_color.clamp(0,1).detach()
+        diffuse_color = offset_color+palette_colors[0]
     
     #* light_intesity = kd, offset_color = offset_color
     #* diffuse color 
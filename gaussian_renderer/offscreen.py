@@ -0,0 +1,95 @@
+import contextlib
+import dataclasses
+from dataclasses import dataclass
+from typing import Tuple
+
+import numpy as np
+import torch
+
+from scene.palette_color import LearningPaletteColor
+from scene.opacity_trans import LearningOpacityTransform
+from scene.light_trans import LearningLightTransform
+from utils.camera_utils import Camera
+from utils.gui_utils import mode_to_rgb
+
+LIGHT_FIELDS = ["theta", "phi", "specular_multi", "specular_offset", "light_intensity_multi", "light_intensity_offset",
+                "ambient_multi", "ambient_offset", "shininess_multi", "shininess_offset"]
+
+
+def _as_float(value):
+    return value.item() if isinstance(value, torch.Tensor) else float(value)
+
+
+@dataclass(frozen=True)
+class RenderSnapshot:
+    """
+    Immutable copy of everything a frame depends on besides the scene: camera, palettes, opacities, light, mode.
+    Rendering a snapshot (render_offscreen) builds its own transforms, so it never touches the render_kwargs
+    of the interactive view and can run while the GUI keeps rendering.
+    """
+    w2c: Tuple[float, ...]  # 4x4 world-to-camera, row-major
+    fovy: float  # radians
+    H: int
+    W: int
+    mode: str
+    bg_color: Tuple[float, float, float]
+    palette_colors: Tuple[Tuple[float, float, float], ...]
+    opacity_factors: Tuple[float, ...]
+    light: Tuple[float, ...]  # LIGHT_FIELDS
+    head_light: bool
+
+    @classmethod
+    def capture(cls, cam, render_kwargs, mode, H, W):
+        """Snapshot of an ArcBallCamera and the render_kwargs of the GUI (hold the GUI state lock while capturing)."""
+        dict_params = render_kwargs["dict_params"]
+        light_transform = dict_params["light_transform"]
+        return cls(w2c=tuple(np.asarray(cam.view, dtype=np.float64).ravel().tolist()),
+                   fovy=cam.fovy * np.pi / 180, H=H, W=W, mode=mode,
+                   bg_color=tuple(render_kwargs["bg_color"].tolist()),
+                   palette_colors=tuple(tuple(color.palette_color.detach().reshape(3).tolist())
+                                        for color in dict_params["palette_colors"]),
+                   opacity_factors=tuple(_as_float(opacity.opacity_factor) for opacity in dict_params["opacity_factors"]),
+                   light=tuple(_as_float(getattr(light_transform, field)) for field in LIGHT_FIELDS),
+                   head_light=bool(light_transform.useHeadLight))
+
+    def replace(self, **changes):
+        return dataclasses.replace(self, **changes)
+
+    def with_opacities(self, opacities):
+        """Copy with the opacity factors of {TF index: value} replaced."""
+        return self.replace(opacity_factors=tuple(opacities.get(i, value) for i, value in enumerate(self.opacity_factors)))
+
+    def camera(self):
+        w2c = np.asarray(self.w2c).reshape(4, 4)
+        return Camera(colmap_id=0, R=w2c[:3, :3].T, T=-w2c[:3, 3],
+                      FoVx=self.fovy * self.W / self.H, FoVy=self.fovy, fx=None, fy=None, cx=None, cy=None,
+                      image=torch.zeros(3, self.H, self.W), image_name=None, uid=0)
+
+    def dict_params(self):
+        light_transform = LearningLightTransform(useHeadLight=self.head_light)
+        for field, value in zip(LIGHT_FIELDS, self.light):
+            setattr(light_transform, field, value)
+        return {
+            "palette_colors": [LearningPaletteColor(torch.tensor(color)) for color in self.palette_colors],
+            "opacity_factors": [LearningOpacityTransform(opacity_factor=value) for value in self.opacity_factors],
+            "light_transform": light_transform,
+        }
+
+
+@torch.no_grad()
+def render_offscreen(snapshot: RenderSnapshot, render_fn, pc, pipe, stream=None):
+    """
+    Renders a snapshot with its own camera and transforms; only the scene (pc, pipe) is shared, read-only.
+    Returns {"rgb": [3, H, W] display colors of snapshot.mode, "opacity": [1, H, W], "rgba": [H, W, 4]} on the GPU.
+    Pass a torch.cuda.Stream to overlap with the interactive render loop.
+    """
+    bg_color = torch.tensor(snapshot.bg_color, dtype=torch.float32, device="cuda")
+    with torch.cuda.stream(stream) if stream is not None else contextlib.nullcontext():
+        render_pkg = render_fn(viewpoint_camera=snapshot.camera(), pc=pc, pipe=pipe, bg_color=bg_color,
+                               is_training=False, dict_params=snapshot.dict_params())
+        rgb = mode_to_rgb(render_pkg, snapshot.mode, (snapshot.H, snapshot.W), resize_fn=None)
+        opacity = render_pkg["opacity"]
+        rgba = torch.cat([rgb, opacity], dim=0).permute(1, 2, 0).contiguous()
+    if stream is not None:
+        stream.synchronize()
+    return {"rgb": rgb, "opacity": opacity, "rgba": rgba}
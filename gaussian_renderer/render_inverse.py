@@ -9,33 +9,18 @@ from utils.sh_utils import eval_sh, eval_sh_coef
 from utils.loss_utils import ssim, bilateral_smooth_loss, contentrate_loss, sparsity_loss
 from utils.image_utils import psnr
 from utils.graphics_utils import fibonacci_sphere_sampling
+from utils.tf_utils import stack_palette_colors, stack_opacity_factors, gather_per_tf, select_visible
 from .diff_rasterization import GaussianRasterizationSettings, GaussianRasterizer, RenderEquation, \
     RenderEquation_complex
 
 def safe_normalize(x, eps=1e-20):
     return x / torch.sqrt(torch.clamp(torch.sum(x * x, -1, keepdim=True), min=eps))
 
-def render_view(viewpoint_camera: Camera, pc: GaussianModel, pipe, bg_color: torch.Tensor,
-                scaling_modifier=1.0, override_color=None, is_training=False, dict_params=None):
-    palette_color_transforms = dict_params.get("palette_colors")
-    opacity_transforms = dict_params.get("opacity_factors")
-    light_transform = dict_params.get("light_transform")
-
-    # Create zero tensor. We will use it to make pytorch return gradients of the 2D (screen-space) means
-    screenspace_points = torch.zeros_like(pc.get_xyz, dtype=pc.get_xyz.dtype, requires_grad=True, device="cuda") + 0
-    try:
-        screenspace_points.retain_grad()
-    except:
-        pass
-    # ic(viewpoint_camera)
-    # exit()
-    
-    # Set up rasterization configuration
+def build_rasterizer(viewpoint_camera: Camera, pc: GaussianModel, pipe, bg_color: torch.Tensor, scaling_modifier=1.0):
+    """Set up the rasterization configuration of a view."""
     tanfovx = math.tan(viewpoint_camera.FoVx * 0.5)
     tanfovy = math.tan(viewpoint_camera.FoVy * 0.5)
     intrinsic = viewpoint_camera.intrinsics
-    # ic(viewpoint_camera.image_height, viewpoint_camera.image_width)
-    # exit()
     raster_settings = GaussianRasterizationSettings(
         image_height=int(viewpoint_camera.image_height),
         image_width=int(viewpoint_camera.image_width),
@@ -55,11 +40,27 @@ def render_view(viewpoint_camera: Camera, pc: GaussianModel, pipe, bg_color: tor
         debug=pipe.debug
     )
 
-    rasterizer = GaussianRasterizer(raster_settings=raster_settings)
+    return GaussianRasterizer(raster_settings=raster_settings)
+
+def render_view(viewpoint_camera: Camera, pc: GaussianModel, pipe, bg_color: torch.Tensor,
+                scaling_modifier=1.0, override_color=None, is_training=False, dict_params=None):
+    palette_color_transforms = dict_params.get("palette_colors")
+    opacity_transforms = dict_params.get("opacity_factors")
+    light_transform = dict_params.get("light_transform")
+
+    # Create zero tensor. We will use it to make pytorch return gradients of the 2D (screen-space) means
+    screenspace_points = torch.zeros_like(pc.get_xyz, dtype=pc.get_xyz.dtype, requires_grad=True, device="cuda") + 0
+    try:
+        screenspace_points.retain_grad()
+    except:
+        pass
+    # ic(viewpoint_camera)
+    # exit()
+    
+    rasterizer = build_rasterizer(viewpoint_camera, pc, pipe, bg_color, scaling_modifier)
 
     means3D = pc.get_xyz
     means2D = screenspace_points
-    opacity = pc.get_opacity
 
     # If precomputed 3d covariance is provided, use it. If not, then it will be computed from
     # scaling / rotation by the rasterizer.
@@ -68,9 +69,6 @@ def render_view(viewpoint_camera: Camera, pc: GaussianModel, pipe, bg_color: tor
     cov3D_precomp = None
     if pipe.compute_cov3D_python:
         cov3D_precomp = pc.get_covariance(scaling_modifier)
-    else:
-        scales = pc.get_scaling
-        rotations = pc.get_rotation
 
     # If precomputed colors are provided, use them. Otherwise, if it is desired to precompute colors
     # from SHs in Python, do it. If not, then SH -> RGB conversion will be done by rasterizer.
@@ -87,14 +85,21 @@ def render_view(viewpoint_camera: Camera, pc: GaussianModel, pipe, bg_color: tor
             shs = pc.get_shs
     else:
         colors_precomp = override_color
-    #* remove all grad about GSs
-    offset_color = pc.get_offset_color.detach()
-    diffuse_factor = pc.get_diffuse_factor.detach()
-    shininess = pc.get_shininess.detach()
-    ambient_factor = pc.get_ambient_factor.detach()
-    specular_factor = pc.get_specular_factor.detach()
-    normal = pc.get_normal.detach()
     num_GSs_TF = pc.get_num_GSs_TF
+    tf_ids = pc.get_tf_ids
+
+    #* drop whole TFs whose opacity factor is 0 before decoding, shading and rasterization
+    #* (not while training, the opacity factors are optimized there)
+    visible_idx = None if is_training else pc.get_visible_indices(opacity_transforms)
+    means3D, means2D, cov3D_precomp, shs, colors_precomp, tf_ids = select_visible(
+        visible_idx, means3D, means2D, cov3D_precomp, shs, colors_precomp, tf_ids)
+    opacity, = pc.get_visible(visible_idx, "opacity")
+    if not pipe.compute_cov3D_python:
+        scales, rotations = pc.get_visible(visible_idx, "scaling", "rotation")
+    #* remove all grad about GSs
+    offset_color, diffuse_factor, shininess, ambient_factor, specular_factor, normal = [
+        attribute.detach() for attribute in pc.get_visible(
+            visible_idx, "offset_color", "diffuse_factor", "shininess", "ambient_factor", "specular_factor", "normal")]
     means3D = torch.nan_to_num(means3D) #note: there are a small number of nan in the means3D (69/1744811), remove this for training
     viewdirs = F.normalize(viewpoint_camera.camera_center - means3D, dim=-1)
 
@@ -105,7 +110,7 @@ def render_view(viewpoint_camera: Camera, pc: GaussianModel, pipe, bg_color: tor
         incidents_dirs = F.normalize(light_pos, dim=-1).contiguous() #* orbital light with directional lighting
      
     brdf_color, extra_results, opacity = rendering_equation_BlinnPhong_python(
-        palette_color_transforms, opacity_transforms, light_transform, opacity, offset_color, diffuse_factor, shininess, ambient_factor, specular_factor, normal, viewdirs, incidents_dirs, num_GSs_TF)
+        palette_color_transforms, opacity_transforms, light_transform, opacity, offset_color, diffuse_factor, shininess, ambient_factor, specular_factor, normal, viewdirs, incidents_dirs, num_GSs_TF, tf_ids)
 
 
     if is_training:
@@ -171,6 +176,10 @@ def render_view(viewpoint_camera: Camera, pc: GaussianModel, pipe, bg_color: tor
                              "ambient_term": rendered_ambient_term,
                              })
 
+    if visible_idx is not None:
+        #* scatter the radii of the culled scene back to all Gaussians
+        radii = torch.zeros(pc.get_gaussian_nums, dtype=radii.dtype, device=radii.device).index_copy_(0, visible_idx, radii)
+
     phong = rendered_phong
     rendered_phong = phong + (1 - rendered_opacity) * bg_color[:, None, None]
     # rendered_normal = rendered_normal + (1 - rendered_opacity) * bg_color[:, None, None]
@@ -238,46 +247,215 @@ def render_neilf_inverse(viewpoint_camera: Camera, pc: GaussianModel, pipe, bg_c
 
     return results
 
-def rendering_equation_BlinnPhong_python(palette_color_transforms, opacity_transforms, light_transform, opacity, offset_color, diffuse_factor, shininess, ambient_factor, specular_factor, normals, viewdirs,
-                                         incidents_dirs, num_GSs_TFs):
-    
+def screen_space_inputs(pc: GaussianModel, pipe, dict_params, scaling_modifier=1.0):
+    """
+    Per-Gaussian inputs of the screen-space render paths (no gradients, zero-opacity TFs culled),
+    with the opacity factors already applied.
+    """
+    opacity_transforms = dict_params.get("opacity_factors")
+    visible_idx = pc.get_visible_indices(opacity_transforms)
+    inputs = dict(zip(["means3D", "tf_ids"], select_visible(visible_idx, torch.nan_to_num(pc.get_xyz), pc.get_tf_ids)))
+    names = ["opacity", "offset_color", "diffuse_factor", "shininess", "ambient_factor", "specular_factor", "normal"]
+    inputs.update(zip(names, pc.get_visible(visible_idx, *names)))
+    if opacity_transforms is not None:
+        inputs["opacity"] = inputs["opacity"] * gather_per_tf(stack_opacity_factors(opacity_transforms), inputs["tf_ids"]).unsqueeze(-1)
+    inputs["scales"], inputs["rotations"], inputs["cov3D_precomp"] = None, None, None
+    if pipe.compute_cov3D_python:
+        inputs["cov3D_precomp"], = select_visible(visible_idx, pc.get_covariance(scaling_modifier))
+    else:
+        inputs["scales"], inputs["rotations"] = pc.get_visible(visible_idx, "scaling", "rotation")
+    return inputs
+
+#* renderCUDA blends the features of a pixel in a fixed register array (float F[33] in cuda_rasterizer/forward.cu)
+MAX_FEATURE_CHANNELS = 33
+
+def rasterize_screen_space(rasterizer, inputs, features):
+    """
+    Rasterizes the per-Gaussian features of screen_space_inputs(), returns (feature, opacity, surface_xyz) images.
+    Features wider than MAX_FEATURE_CHANNELS are rasterized in chunks of at most MAX_FEATURE_CHANNELS channels.
+    """
+    means3D = inputs["means3D"]
+    rendered_features = []
+    for chunk in features.split(MAX_FEATURE_CHANNELS, dim=-1):
+        (_, _, _, rendered_opacity, _, rendered_feature, _, rendered_surface_xyz, _) = rasterizer(
+            means3D=means3D,
+            means2D=torch.zeros_like(means3D),
+            colors_precomp=torch.zeros_like(means3D),
+            opacities=inputs["opacity"],
+            scales=inputs["scales"],
+            rotations=inputs["rotations"],
+            cov3D_precomp=inputs["cov3D_precomp"],
+            features=chunk.contiguous(),
+        )
+        rendered_features.append(rendered_feature)
+    return torch.cat(rendered_features, dim=0), rendered_opacity, rendered_surface_xyz
+
+@torch.no_grad()
+def render_palette_layers(viewpoint_camera: Camera, pc: GaussianModel, pipe, bg_color: torch.Tensor,
+                          scaling_modifier=1.0, is_training=False, dict_params=None):
+    """
+    Renders the per-TF layers of the Blinn-Phong image for screen-space color edits.
+    The color is linear in the palette colors and the blending weights do not depend on the color, so for a
+    fixed camera, light and opacity: phong = base + sum_t palette_color_t * coeffs_t, with
+        base   [3, H, W]:      blended (ambient + diffuse_intensity) * offset_color + specular_intensity
+        coeffs [num_TF, H, W]: blended (ambient + diffuse_intensity) of the Gaussians of TF t
+    Unlike render_view the per-Gaussian color is not clamped to [0, 1] before blending,
+    so over-saturated Gaussians can be slightly brighter (see composite_palette_layers).
+    With more than MAX_FEATURE_CHANNELS - 3 TFs the layers take several rasterizations.
+    """
+    light_transform = dict_params.get("light_transform")
+    num_TF = len(dict_params.get("palette_colors"))
+    rasterizer = build_rasterizer(viewpoint_camera, pc, pipe, bg_color, scaling_modifier)
+    inputs = screen_space_inputs(pc, pipe, dict_params, scaling_modifier)
+
+    viewdirs = F.normalize(viewpoint_camera.camera_center - inputs["means3D"], dim=-1)
+    light_pos = light_transform.get_light_dir()
+    incident_dirs = viewdirs if light_pos is None else F.normalize(light_pos, dim=-1)
+    diffuse_factor, shininess, ambient_factor, specular_factor = apply_light_transform(
+        light_transform, inputs["diffuse_factor"], inputs["shininess"], inputs["ambient_factor"], inputs["specular_factor"])
+    diffuse_intensity, specular_intensity = blinn_phong_intensities(diffuse_factor, shininess, specular_factor,
+                                                                    inputs["normal"], viewdirs, incident_dirs)
+    shading = ambient_factor + diffuse_intensity # [N, 1]
+    base = shading * inputs["offset_color"] + specular_intensity # [N, 3]
+    coeffs = shading * F.one_hot(inputs["tf_ids"].long(), num_TF).float() # [N, num_TF]
+
+    rendered_feature, rendered_opacity, _ = rasterize_screen_space(rasterizer, inputs, torch.cat([base, coeffs], dim=-1))
+    rendered_base, rendered_coeffs = rendered_feature.split([3, num_TF], dim=0)
+    return {"base": rendered_base, "coeffs": rendered_coeffs, "opacity": rendered_opacity}
+
+@torch.no_grad()
+def composite_palette_layers(layers, palette_color_transforms, bg_color: torch.Tensor):
+    """
+    Screen-space weighted sum of the layers of render_palette_layers() with the current palette colors,
+    no rasterization involved. Returns the same image keys as render_view for the phong mode.
+    """
+    palette_colors = stack_palette_colors(palette_color_transforms) # [num_TF, 3]
+    opacity = layers["opacity"]
+    phong = layers["base"] + torch.einsum("tc,thw->chw", palette_colors, layers["coeffs"])
+    #* the blended per-Gaussian colors were in [0, 1], so the blend is bounded by the accumulated opacity
+    phong = torch.minimum(phong.clamp_min(0.), opacity)
+    return {"phong": phong + (1 - opacity) * bg_color[:, None, None],
+            "opacity": opacity}
+
+@torch.no_grad()
+def render_gbuffer(viewpoint_camera: Camera, pc: GaussianModel, pipe, bg_color: torch.Tensor,
+                   scaling_modifier=1.0, is_training=False, dict_params=None):
+    """
+    Rasterizes the G-buffer of a view for deferred shading (fixed camera, palette and opacity):
+    palette-weighted base color, normal, world position and the raw material factors,
+    all normalized by the accumulated opacity. Light edits are then evaluated per pixel by shade_gbuffer().
+    """
+    palette_color_transforms = dict_params.get("palette_colors")
+    rasterizer = build_rasterizer(viewpoint_camera, pc, pipe, bg_color, scaling_modifier)
+    inputs = screen_space_inputs(pc, pipe, dict_params, scaling_modifier)
+
+    base_color = inputs["offset_color"] + gather_per_tf(stack_palette_colors(palette_color_transforms), inputs["tf_ids"])
+    features = torch.cat([base_color, inputs["normal"], inputs["means3D"], inputs["diffuse_factor"], inputs["shininess"],
+                          inputs["ambient_factor"], inputs["specular_factor"]], dim=-1)
+    rendered_feature, rendered_opacity, _ = rasterize_screen_space(rasterizer, inputs, features)
+    rendered_feature = rendered_feature / rendered_opacity.clamp_min(1e-6)
+    base_color, normal, xyz, diffuse_factor, shininess, ambient_factor, specular_factor = \
+        rendered_feature.split([3, 3, 3, 1, 1, 1, 1], dim=0)
+    return {"base_color": base_color,
+            "normal": F.normalize(normal, dim=0),
+            "xyz": xyz,
+            "diffuse_factor": diffuse_factor,
+            "shininess": shininess,
+            "ambient_factor": ambient_factor,
+            "specular_factor": specular_factor,
+            "opacity": rendered_opacity,
+            "camera_center": viewpoint_camera.camera_center}
+
+@torch.no_grad()
+def shade_gbuffer(gbuffer, light_transform, bg_color: torch.Tensor):
+    """
+    Deferred Blinn-Phong shading of a G-buffer from render_gbuffer() with the current light transform,
+    no rasterization involved. Returns the same image keys as render_view (without the factor images).
+    """
+    def pixels(x): # [C, H, W] -> [H*W, C]
+        return x.flatten(1).T
+
+    _, H, W = gbuffer["opacity"].shape
+    xyz = pixels(gbuffer["xyz"])
+    normals = pixels(gbuffer["normal"])
+    viewdirs = F.normalize(gbuffer["camera_center"] - xyz, dim=-1)
+    light_pos = light_transform.get_light_dir()
+    incident_dirs = viewdirs if light_pos is None else F.normalize(light_pos, dim=-1)
+    diffuse_factor, shininess, ambient_factor, specular_factor = apply_light_transform(
+        light_transform, pixels(gbuffer["diffuse_factor"]), pixels(gbuffer["shininess"]),
+        pixels(gbuffer["ambient_factor"]), pixels(gbuffer["specular_factor"]))
+    diffuse_intensity, specular_intensity = blinn_phong_intensities(diffuse_factor, shininess, specular_factor,
+                                                                    normals, viewdirs, incident_dirs)
+    #* same terms as rendering_equation_BlinnPhong_python, per pixel
+    diffuse_color = (ambient_factor + diffuse_intensity) * pixels(gbuffer["base_color"])
+    diffuse_term = diffuse_intensity * diffuse_color
+    ambient_term = torch.clamp(ambient_factor * diffuse_color, 0., 1.)
+    specular_term = torch.clamp(specular_intensity.repeat(1, 3), 0., 1.)
+    phong = torch.clamp(diffuse_color + specular_intensity, 0., 1.)
+
+    opacity = gbuffer["opacity"]
+    def image(x): # [H*W, C] -> [C, H, W], premultiplied by the opacity like the rasterized images
+        return x.T.reshape(-1, H, W) * opacity
+
+    return {"phong": image(phong) + (1 - opacity) * bg_color[:, None, None],
+            "normal": gbuffer["normal"] * opacity,
+            "diffuse_term": image(diffuse_term),
+            "specular_term": image(specular_term),
+            "ambient_term": image(ambient_term),
+            "opacity": opacity}
+
+def apply_light_transform(light_transform, diffuse_factor, shininess, ambient_factor, specular_factor):
+    """Applies the multipliers/offsets of the light transform to the material factors."""
     spcular_multi, diffuse_factor_multi, ambient_multi, shininess_multi,\
         specular_offset, diffuse_factor_offset, ambient_offset, shininess_offset= light_transform.get_light_transform()
+    diffuse_factor = diffuse_factor*diffuse_factor_multi+diffuse_factor_offset # ambient white light intensity
+    shininess = shininess*shininess_multi+shininess_offset # specular white light intensity
+    ambient_factor = ambient_factor*ambient_multi+ambient_offset # ambient white light intensity
+    specular_factor = specular_factor*spcular_multi+specular_offset # specular white light intensity
+    return diffuse_factor, shininess, ambient_factor, specular_factor
+
+def blinn_phong_intensities(diffuse_factor, shininess, specular_factor, normals, viewdirs, incident_dirs):
+    """
+    The palette independent part of the Blinn-Phong model:
+    color = (ambient + diffuse_intensity) * (offset_color + palette_color) + specular_intensity
+    """
+    cos_l = (normals*incident_dirs).sum(dim=-1, keepdim=True)
+    diffuse_intensity = diffuse_factor*torch.abs(cos_l)
+    h = F.normalize(incident_dirs + viewdirs, dim=-1) # bisector h
+    cos_h = (normals*h).sum(dim=-1, keepdim=True)
+    specular_intensity = specular_factor*diffuse_factor*torch.where(cos_l != 0, (torch.abs(cos_h)).pow(shininess), 0.0)
+    # specular_intensity = 2*(specular_factor+1.0)*torch.where(cos_l != 0, (torch.abs(cos_h)).pow(5*(shininess+1)), 0.0) # supernova
+    # specular_intensity = 2*(specular_factor+1)*torch.where(cos_l != 0, (torch.abs(cos_h)).pow(5*(shininess+1)), 0.0) # fivejet
+    return diffuse_intensity, specular_intensity
 
+def rendering_equation_BlinnPhong_python(palette_color_transforms, opacity_transforms, light_transform, opacity, offset_color, diffuse_factor, shininess, ambient_factor, specular_factor, normals, viewdirs,
+                                         incidents_dirs, num_GSs_TFs, tf_ids):
     
     guassian_nums = offset_color.shape[0]
     # ic(palette_color.shape)
     offset_color = offset_color.unsqueeze(-2).contiguous()
-    diffuse_factor = diffuse_factor.unsqueeze(-2).contiguous()*diffuse_factor_multi+diffuse_factor_offset # ambient white light intensity
-    shininess = shininess.unsqueeze(-2).contiguous()*shininess_multi+shininess_offset # specular white light intensity
-    ambient_factor = ambient_factor.unsqueeze(-2).contiguous()*ambient_multi+ambient_offset # ambient white light intensity
-    specular_factor = specular_factor.unsqueeze(-2).contiguous()*spcular_multi+specular_offset # specular white light intensity
+    diffuse_factor, shininess, ambient_factor, specular_factor = apply_light_transform(
+        light_transform, diffuse_factor.unsqueeze(-2).contiguous(), shininess.unsqueeze(-2).contiguous(),
+        ambient_factor.unsqueeze(-2).contiguous(), specular_factor.unsqueeze(-2).contiguous())
     normals = normals.unsqueeze(-2).contiguous()
     viewdirs = viewdirs.unsqueeze(-2).contiguous()
     incident_dirs = incidents_dirs.unsqueeze(-2).contiguous()
-    diffuse_color = torch.zeros_like(offset_color)
 
     offset_color_norm = (offset_color**2).sum(dim=-1).sum(dim=-1, keepdim=True)
     
     
     #* inverse rendering
-    start_GS = 0
-    for i in range(len(num_GSs_TFs)):
-        end_GS = num_GSs_TFs[i] + start_GS
-        diffuse_segment = offset_color[start_GS:end_GS,:,:].clone().detach().requires_grad_(True)
-        diffuse_segment = diffuse_segment + palette_color_transforms[i].palette_color.clamp(0,1)
-        diffuse_color[start_GS:end_GS,:,:] = diffuse_segment
-        # offset_color[start_GS:end_GS,:,:] = offset_color[start_GS:end_GS,:,:]+palette_color_transforms[i].palette_color.clamp(0,1)
-        if opacity_transforms is not None:
-            opacity_segment = opacity[start_GS:end_GS,:].clone().detach().requires_grad_(True)
-            opacity_segment = opacity_segment * opacity_transforms[i].opacity_factor
-            opacity[start_GS:end_GS,:] = opacity_segment
-        start_GS = end_GS
+    #* one gather with the per-Gaussian TF index instead of a slice loop over the TFs,
+    #* gradients only flow into the palette colors and opacity factors
+    palette_colors = stack_palette_colors(palette_color_transforms) # [num_TF, 3]
+    diffuse_color = offset_color.detach() + gather_per_tf(palette_colors, tf_ids).unsqueeze(-2)
+    if opacity_transforms is not None:
+        opacity_factors = stack_opacity_factors(opacity_transforms) # [num_TF]
+        opacity = opacity.detach() * gather_per_tf(opacity_factors, tf_ids).unsqueeze(-1)
 
+    diffuse_intensity, specular_intensity = blinn_phong_intensities(diffuse_factor, shininess, specular_factor,
+                                                                    normals, viewdirs, incident_dirs)
     #* diffuse color 
-    cos_l = (normals*incident_dirs).sum(dim=-1, keepdim=True)
-    
-    diffuse_intensity = diffuse_factor*torch.abs(cos_l)
     # ic(torch.isnan(offset_color).sum(), torch.isnan(ambient_factor).sum(), torch.isnan(diffuse_intensity).sum())
     diffuse_color = (ambient_factor+diffuse_intensity).repeat(1, 1, 3)*diffuse_color
     
@@ -285,12 +463,6 @@ def rendering_equation_BlinnPhong_python(palette_color_transforms, opacity_trans
     ambient_term = torch.clamp(ambient_factor.repeat(1, 1, 3)*diffuse_color,0.,1.)
     
     #* specular color
-    h = F.normalize(incident_dirs + viewdirs, dim=-1) # bisector h
-    cos_h = (normals*h).sum(dim=-1, keepdim=True)
-    specular_intensity = specular_factor*diffuse_factor*torch.where(cos_l != 0, (torch.abs(cos_h)).pow(shininess), 0.0)
-    # specular_intensity = 2*(specular_factor+1.0)*torch.where(cos_l != 0, (torch.abs(cos_h)).pow(5*(shininess+1)), 0.0) # supernova
-    # specular_intensity = 2*(specular_factor+1)*torch.where(cos_l != 0, (torch.abs(cos_h)).pow(5*(shininess+1)), 0.0) # fivejet
-
     specular_color = specular_intensity.repeat(1, 1, 3)
     
 
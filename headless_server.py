@@ -0,0 +1,176 @@
+"""
+Headless render server: the scene state and the socket command vocabulary of NLI.py (set_opacity, set_color,
+set_light, set_view, legend, get_status, ...) with only the renderer, i.e. without DearPyGui, audio, CLIP,
+InstructPix2Pix or LLM clients. Frames are rendered on demand and returned over the socket with get_frame [png|raw].
+
+usage: python headless_server.py -so <TFs ckpt dir> --image_path <TFs image dir> -m <model_path> --port 65433
+"""
+import os
+import json
+import shlex
+import datetime
+import numpy as np
+import torch
+import torchvision
+import cv2
+from argparse import ArgumentParser
+from arguments import ModelParams, PipelineParams
+from gaussian_renderer import render_fn_dict
+from utils.general_utils import safe_state
+from utils.graphics_utils import focal2fov, fov2focal
+from utils.gui_utils import FrameScheduler, ArcBallCamera, initial_c2w, encode_frame
+from utils.frame_utils import FrameReadback, FrameCache, render_state_key
+from utils.command_server import AsyncCommandServer
+from utils.scene_utils import SceneState, load_scene
+
+#* commands of NLI.py that need the models left out of the headless server
+UNSUPPORTED_COMMANDS = ["stylize"]
+
+class HeadlessRenderer(SceneState):
+    """Scene state and command handling of NLI.GUI, without any widget: the replies are the only output."""
+    def __init__(self, H, W, fovy, c2w, center, render_fn, render_kwargs, TFnums, image_path=None,
+                 frame_cache_bytes=256 * 2**20):
+        self.imgW = W
+        self.imgH = H
+        self.TFnums = TFnums
+        self.render_fn = render_fn
+        self.render_kwargs = render_kwargs
+        self.img_path = image_path
+        self.original_palette_colors = [self.render_kwargs["dict_params"]["palette_colors"][TFidx].palette_color for TFidx in range(TFnums)]
+        self.cam = ArcBallCamera(self.imgW, self.imgH, fovy=fovy * 180 / np.pi, rot=c2w[:3, :3],
+                                 translate=c2w[:3, 3] - center, center=center)
+        self.resize_fn = torchvision.transforms.Resize((self.imgH, self.imgW), antialias=True)
+        self.readback = FrameReadback(self.imgH, self.imgW)
+        self.frame_cache = FrameCache(frame_cache_bytes)
+        self.downsample = 1
+
+        self.light_elevation = 0
+        self.light_angle = 180
+        self.useHeadlight = True
+        self.mode = "phong"
+        self.legend_dict = {}
+        self.freeze_view = False
+        self.render_buffer = None
+        self.save_rgba_buffer = None
+        self.render_time = 0
+
+        self.scheduler = FrameScheduler()
+        self.initialize_visualization()
+
+    @torch.no_grad()
+    def step(self, kinds=frozenset()):
+        key = None
+        if self.frame_cache.max_bytes > 0:
+            key = render_state_key(self.cam, self.render_kwargs, self.mode, self.downsample)
+            cached_rgba = self.frame_cache.get(key)
+            if cached_rgba is not None:
+                self.render_buffer, self.save_rgba_buffer = self.readback.load(cached_rgba, self.legend_dict)
+                return "cached"
+        start, end = torch.cuda.Event(enable_timing=True), torch.cuda.Event(enable_timing=True)
+        start.record()
+        render_pkg = self.render_fn(viewpoint_camera=self.custom_cam, **self.render_kwargs)
+        end.record()
+        self.render_buffer, self.save_rgba_buffer = self.readback.read(render_pkg, self.mode, self.resize_fn, self.legend_dict)
+        self.render_time = start.elapsed_time(end)
+        if key is not None:
+            self.frame_cache.put(key, self.save_rgba_buffer)
+        return "full"
+
+    def flush_render(self):
+        """Renders once if any command changed the render state since the last frame."""
+        return self.scheduler.flush(self.step)
+
+    def get_render_stats(self):
+        stats = self.scheduler.stats()
+        stats["last_render_ms"] = self.render_time
+        stats["frame_cache"] = self.frame_cache.stats()
+        return stats
+
+    def process_message(self, message, conn):
+        """Applies one text command of the NLI.py vocabulary (validated by utils.command_server.validate_command)."""
+        self.scheduler.command_applied()
+        if self.apply_scene_command(message):
+            return None
+        parts = shlex.split(message)
+        name = parts[0]
+        if name == "get_status":
+            result = self.get_status()
+        elif name == "get_render_stats":
+            result = self.get_render_stats()
+        elif name == "get_frame":
+            self.flush_render()
+            result = encode_frame(self.render_buffer, self.save_rgba_buffer[..., 3:], parts[1] if len(parts) > 1 else "png")
+        elif name == "save_image":
+            self.flush_render()
+            os.makedirs("./screenshots/user0", exist_ok=True)
+            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            cv2.imwrite(f'./screenshots/user0/rendered_img_{timestamp}.png',
+                        (self.save_rgba_buffer * 255).astype(np.uint8)[..., [2, 1, 0, 3]])
+            return None
+        else:
+            raise ValueError(f"Unknown command: {message}")
+
+        if conn is not None:
+            label = {"get_status": "Current Status", "get_render_stats": "Render Stats", "get_frame": "Frame"}[name]
+            conn.sendall(f"{label}: {json.dumps(result)}\n".encode("utf-8"))
+        return result
+
+    def apply_command_batch(self, commands):
+        """Same contract as NLI.GUI.apply_command_batch: all commands of the batch are applied, or none."""
+        errors = self.validate_commands(commands)
+        if not errors:
+            errors = [{"index": i, "command": command, "error": "not available in the headless server"}
+                      for i, command in enumerate(commands) if command.split()[0] in UNSUPPORTED_COMMANDS]
+        if errors:
+            return {"ok": False, "errors": errors}
+        with self.scheduler.batch():
+            results = [self.process_message(command, None) for command in commands]
+        return {"ok": True, "results": results}
+
+    def process_legacy_message(self, message, conn):
+        try:
+            errors = self.validate_commands([message])
+            if errors or message.split()[0] in UNSUPPORTED_COMMANDS:
+                print(f"Rejected command: {message} {errors}")
+                return
+            with self.scheduler.batch():
+                self.process_message(message, conn)
+        except Exception as e:
+            print(f"Failed to process '{message}': {e}")
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="Headless render server")
+    model = ModelParams(parser)
+    pipeline = PipelineParams(parser)
+    parser.add_argument('-vo', '--view_config', default=None, required=False, help="the config root")
+    parser.add_argument('--image_path', type=str, default=None, help="the original training image dir (initial view, set_view)")
+    parser.add_argument('-so', '--source_dir', default=None, required=True, help="the source ckpts dir")
+    parser.add_argument('-t', '--type', choices=['inverse','phong'], default='inverse')
+    parser.add_argument("--quiet", action="store_true")
+    parser.add_argument("--stylize_name",type=str, default=None, help="the edit name of the stylized model you want to load")
+    parser.add_argument("--codebook_resident", action="store_true",
+                        help="keep the uint8 codebook ids on the GPU and decode them per frame (less GPU memory)")
+    parser.add_argument("--resolution", type=int, nargs=2, default=[800, 800], help="H W of the rendered frames")
+    parser.add_argument("--frame_cache_mb", type=float, default=256,
+                        help="byte budget (MB) of the cache of finished frames keyed by camera and scene state, 0 to disable")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=65432)
+    parser.add_argument("--max_clients", type=int, default=64)
+    args = parser.parse_args()
+
+    safe_state(args.quiet)
+    dataset = model.extract(args)
+    pipe = pipeline.extract(args)
+
+    render_kwargs, TFs_names = load_scene(dataset, pipe, args.source_dir, args.stylize_name, args.codebook_resident)
+
+    H, W = args.resolution
+    fovx = 30 * np.pi / 180
+    fovy = focal2fov(fov2focal(fovx, W), H)
+    renderer = HeadlessRenderer(H, W, fovy, c2w=initial_c2w(args.view_config), center=np.zeros(3),
+                                render_fn=render_fn_dict[args.type], render_kwargs=render_kwargs,
+                                TFnums=len(TFs_names), image_path=args.image_path,
+                                frame_cache_bytes=int(args.frame_cache_mb * 2**20))
+    server = AsyncCommandServer(renderer.apply_command_batch, renderer.process_legacy_message,
+                                host=args.host, port=args.port, max_clients=args.max_clients).start()
+    server.thread.join()
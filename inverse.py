@@ -106,18 +106,14 @@ def load_ckpts_paths(source_dir):
     return ckpts_transforms
 
 def scene_composition(scene_dict: dict, dataset: ModelParams):
-    gaussians_list = []
+    paths, transforms = [], []
     for scene in scene_dict:
-        gaussians = GaussianModel(dataset.sh_degree, render_type="phong")
         print("Compose scene from GS path:", scene_dict[scene]["path"])
-        gaussians.my_load_ply(scene_dict[scene]["path"], quantised=True, half_float=True)
-        
-        torch_transform = torch.tensor(scene_dict[scene]["transform"], device="cuda").reshape(4, 4)
-        gaussians.set_transform(transform=torch_transform)
-
-        gaussians_list.append(gaussians)
+        paths.append(scene_dict[scene]["path"])
+        transforms.append(torch.tensor(scene_dict[scene]["transform"], device="cuda").reshape(4, 4))
 
-    gaussians_composite = GaussianModel.create_from_gaussians(gaussians_list, dataset)
+    #* TF files are parsed in parallel and decoded into one preallocated composite (TF order kept)
+    gaussians_composite = GaussianModel.load_composition(paths, transforms, dataset.sh_degree)
     n = gaussians_composite.get_xyz.shape[0]
     print(f"Totally {n} points loaded.")
 
@@ -6,7 +6,7 @@ ic.configureOutput(includeContext=True) # type: ignore
 import json
 import os
 import cv2
-from gaussian_renderer import render_fn_dict
+from gaussian_renderer import render_fn_dict, render_gbuffer, shade_gbuffer
 import numpy as np
 import torch
 from scene import GaussianModel
@@ -55,18 +55,14 @@ def load_ckpts_paths(source_dir, validTFs=[]):
     return ckpts_transforms
 
 def scene_composition(scene_dict: dict, dataset: ModelParams):
-    gaussians_list = []
+    paths, transforms = [], []
     for scene in scene_dict:
-        gaussians = GaussianModel(dataset.sh_degree, render_type="phong")
         print("Compose scene from GS path:", scene_dict[scene]["path"])
-        gaussians.my_load_ply(scene_dict[scene]["path"], quantised=True, half_float=True)
-        
-        torch_transform = torch.tensor(scene_dict[scene]["transform"], device="cuda").reshape(4, 4)
-        gaussians.set_transform(transform=torch_transform)
-
-        gaussians_list.append(gaussians)
+        paths.append(scene_dict[scene]["path"])
+        transforms.append(torch.tensor(scene_dict[scene]["transform"], device="cuda").reshape(4, 4))
 
-    gaussians_composite = GaussianModel.create_from_gaussians(gaussians_list, dataset)
+    #* TF files are parsed in parallel and decoded into one preallocated composite (TF order kept)
+    gaussians_composite = GaussianModel.load_composition(paths, transforms, dataset.sh_degree)
     n = gaussians_composite.get_xyz.shape[0]
     print(f"Totally {n} points loaded.")
 
@@ -124,6 +120,10 @@ if __name__ == '__main__':
     parser.add_argument('--validTFs', default="", help="validTFs for composing")
     parser.add_argument('--evaluation', action='store_false', help="If True, eval mode.")
     parser.add_argument('--EvalTime', action='store_true', help="If True, eval time, not save images.")
+    parser.add_argument('--light_sweep', type=str, default=None,
+                        help="Batch mode 'start,stop,step' of light azimuth angles (degrees): "
+                             "every view is rasterized once into a G-buffer and shaded for all angles.")
+    parser.add_argument('--light_sweep_elevation', type=float, default=0, help="Light elevation of the sweep (degrees).")
     args = parser.parse_args()
     dataset = model.extract(args)
     pipe = pipeline.extract(args)
@@ -224,6 +224,39 @@ if __name__ == '__main__':
     fovx = 30 * np.pi / 180
     fovy = focal2fov(fov2focal(fovx, W), H)
 
+    if args.light_sweep is not None:
+        #* batch relighting: one G-buffer per view, deferred shading for every light angle
+        start, stop, step = [float(x) for x in args.light_sweep.split(",")]
+        light_angles = np.arange(start, stop, step)
+        sweep_dir = os.path.join(capture_dir, "light_sweep")
+        os.makedirs(sweep_dir, exist_ok=True)
+        light_transform = render_kwargs["dict_params"]["light_transform"]
+        light_transform.useHeadLight = False
+
+        progress_bar = tqdm(view_dict["frames"], desc="Rendering light sweep")
+        time_log = []
+        for idx, cam_info in enumerate(progress_bar):
+            c2w = np.array(cam_info['transform_matrix'], dtype=np.float32).reshape(4, 4)
+            c2w[:3, 1:3] *= -1
+            w2c = np.linalg.inv(c2w)
+            custom_cam = Camera(colmap_id=0, R=w2c[:3, :3].T, T=w2c[:3, 3],
+                                FoVx=fovx, FoVy=fovy, fx=None, fy=None, cx=None, cy=None,
+                                image=torch.zeros(3, H, W), image_name=None, uid=0)
+            tic = time_ns()
+            gbuffer = render_gbuffer(viewpoint_camera=custom_cam, **render_kwargs)
+            for light_angle in light_angles:
+                light_transform.set_light_theta_phi(light_angle, args.light_sweep_elevation)
+                render_pkg = shade_gbuffer(gbuffer, light_transform, background)
+                if not args.EvalTime:
+                    save_image(render_pkg["phong"], f"{sweep_dir}/frame_{int(idx):04d}_light_{int(light_angle):04d}.png")
+            torch.cuda.synchronize()
+            toc = time_ns()
+            time_log.append((toc - tic)/1e9/len(light_angles))
+        time_log = np.array(time_log)
+        print(f"Averaged Rendering time per light angle: {time_log.mean()*1e3} ms")
+        print(f"FPS: {1/time_log.mean()}")
+        exit()
+
     progress_bar = tqdm(view_dict["frames"], desc="Rendering")
     time_log = []
     for idx, cam_info in enumerate(progress_bar):
@@ -47,20 +47,16 @@ def load_ckpts_paths(source_dir):
     ckpts_transforms['0'] = one_TF_json
     return ckpts_transforms
 
-def scene_composition(scene_dict: dict, dataset: ModelParams):
-    gaussians_list = []
+def scene_composition(scene_dict: dict, dataset: ModelParams, codebook_resident=False):
+    paths, transforms = [], []
     for scene in scene_dict:
-        gaussians = GaussianModel(dataset.sh_degree, render_type="phong")
         print("Compose scene from GS path:", scene_dict[scene]["path"])
-        gaussians.my_load_ply(scene_dict[scene]["path"], quantised=True, half_float=True)
-        # gaussians.my_load_ply(scene_dict[scene]["path"], quantised=False, half_float=False)
-        
-        torch_transform = torch.tensor(scene_dict[scene]["transform"], device="cuda").reshape(4, 4)
-        gaussians.set_transform(transform=torch_transform)
-
-        gaussians_list.append(gaussians)
+        paths.append(scene_dict[scene]["path"])
+        transforms.append(torch.tensor(scene_dict[scene]["transform"], device="cuda").reshape(4, 4))
 
-    gaussians_composite = GaussianModel.create_from_gaussians(gaussians_list, dataset)
+    #* TF files are parsed in parallel and decoded into one preallocated composite (TF order kept)
+    gaussians_composite = GaussianModel.load_composition(paths, transforms, dataset.sh_degree,
+                                                         codebook_resident=codebook_resident)
     n = gaussians_composite.get_xyz.shape[0]
     print(f"Totally {n} points loaded.")
 
@@ -116,6 +112,7 @@ if __name__ == '__main__':
     parser.add_argument('--useHeadlight', action='store_true', help="If True, use head light.")
     parser.add_argument('--evaluation', action='store_false', help="If True, eval mode.")
     parser.add_argument('--EvalTime', action='store_true', help="If True, eval time, not save images.")
+    parser.add_argument('--codebook_resident', action='store_true', help="If True, keep the codebook ids on the GPU and decode per frame.")
     args = parser.parse_args()
     dataset = model.extract(args)
     pipe = pipeline.extract(args)
@@ -143,7 +140,7 @@ if __name__ == '__main__':
         
     light_transform = LearningLightTransform(theta=180, phi=0)
     # load gaussians
-    gaussians_composite = scene_composition(scene_dict, dataset)
+    gaussians_composite = scene_composition(scene_dict, dataset, args.codebook_resident)
 
     # rendering
     capture_dir = args.output
@@ -8,7 +8,10 @@ from utils.general_utils import strip_symmetric, build_scaling_rotation
 from utils.general_utils import inverse_sigmoid, get_expon_lr_func, build_rotation
 from utils.general_utils import rotation_to_quaternion, quaternion_multiply, pcast_i16_to_f32
 from utils.sh_utils import RGB2SH, eval_sh
+from utils.tf_utils import build_tf_ids, build_visible_indices, stack_opacity_factors, select_visible
 from utils.system_utils import mkdir_p
+from utils.io_utils import fill_structured_array, load_native_gaussians, native_path_of, read_quantised_host
+from utils.io_utils import NATIVE_ID_COLUMNS
 from plyfile import PlyData, PlyElement
 from simple_knn._C import distCUDA2
 from arguments import OptimizationParams
@@ -16,6 +19,7 @@ from tqdm import tqdm
 from einops import rearrange, reduce, repeat
 from diff_gaussian_rasterization._C import kmeans_cuda
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 class Codebook():
     def __init__(self, ids, centers):
         self.ids = ids
@@ -99,22 +103,50 @@ class GaussianModel:
 
         #*for composing
         self._num_GSs_TF = [-1]
+        self._tf_ids = None
+        self._visible_key = None
+        self._visible_idx = None
+        #* codebook-resident inference mode (see use_codebook_resident)
+        self._resident = None
         
     def set_num_GSs_TF(self, num_GSs_TF):
         self._num_GSs_TF = num_GSs_TF
+        self._tf_ids = build_tf_ids(num_GSs_TF, device=self._xyz.device) #* per-Gaussian TF index, built once
+        self._visible_key = None
+        self._visible_idx = None
+
+    @torch.no_grad()
+    def get_visible_indices(self, opacity_transforms):
+        """
+        Indices of the Gaussians whose TF has a non-zero opacity factor, or None when every TF is visible.
+        The index set is cached and only rebuilt when the set of visible TFs changes.
+        """
+        num_GSs_TF = self._num_GSs_TF
+        if opacity_transforms is None or len(num_GSs_TF) <= 1 or len(num_GSs_TF) != len(opacity_transforms):
+            return None
+        visible = tuple((stack_opacity_factors(opacity_transforms) != 0).tolist()) # one sync for all TFs
+        if all(visible):
+            return None
+        if visible != self._visible_key:
+            self._visible_idx = build_visible_indices(num_GSs_TF, visible, device=self._xyz.device)
+            self._visible_key = visible
+        return self._visible_idx
+
+    def get_visible(self, visible_idx, *names):
+        """
+        (get_<name> for name in names) of the Gaussians visible_idx (get_visible_indices, None for all).
+        A codebook-resident model gathers the ids of those Gaussians only, hidden TFs are never decoded.
+        """
+        if self._resident is None:
+            return select_visible(visible_idx, *[getattr(self, f"get_{name}") for name in names])
+        return tuple(self._decode_resident(name, visible_idx) for name in names)
         
     @torch.no_grad()
     def set_transform(self, rotation=None, center=None, scale=None, offset=None, transform=None):
+        assert self._resident is None, "set_transform before use_codebook_resident / pass the transforms to load_composition"
         if transform is not None:
-            scale = transform[:3, :3].norm(dim=-1)
-
-            self._scaling.data = self.scaling_inverse_activation(self.get_scaling * scale)
-            xyz_homo = torch.cat([self._xyz.data, torch.ones_like(self._xyz[:, :1])], dim=-1)
-            self._xyz.data = (xyz_homo @ transform.T)[:, :3]
-            rotation = transform[:3, :3] / scale[:, None]
-            self._normal.data = self._normal.data @ rotation.T
-            rotation_q = rotation_to_quaternion(rotation[None])
-            self._rotation.data = quaternion_multiply(rotation_q, self._rotation.data)
+            self._xyz.data, self._normal.data, self._scaling.data, self._rotation.data = self._apply_transform(
+                transform, self._xyz.data, self._normal.data, self._scaling.data, self._rotation.data)
             return
 
         if center is not None:
@@ -132,6 +164,19 @@ class GaussianModel:
     
     
 
+    def _apply_transform(self, transform, xyz, normal, scaling, rotation):
+        """Applies a 4x4 similarity transform to raw (not activated) position, normal, scaling and rotation tensors."""
+        scale = transform[:3, :3].norm(dim=-1)
+
+        scaling = self.scaling_inverse_activation(self.scaling_activation(scaling) * scale)
+        xyz_homo = torch.cat([xyz, torch.ones_like(xyz[:, :1])], dim=-1)
+        xyz = (xyz_homo @ transform.T)[:, :3]
+        rotation_matrix = transform[:3, :3] / scale[:, None]
+        normal = normal @ rotation_matrix.T
+        rotation_q = rotation_to_quaternion(rotation_matrix[None])
+        rotation = quaternion_multiply(rotation_q, rotation)
+        return xyz, normal, scaling, rotation
+
     def capture(self):
         captured_list = [
             self.active_sh_degree,
@@ -199,35 +244,54 @@ class GaussianModel:
     def get_num_GSs_TF(self):
         return self._num_GSs_TF
 
+    @property
+    def get_tf_ids(self):
+        if self._tf_ids is None or self._tf_ids.shape[0] != self.get_gaussian_nums:
+            #* individual (not composed) model: all Gaussians belong to TF 0
+            self._tf_ids = torch.zeros(self.get_gaussian_nums, dtype=torch.uint8, device=self._xyz.device)
+        return self._tf_ids
+
     @property
     def get_gaussian_nums(self):
         return self._xyz.shape[0]
     
     @property
     def get_scaling(self):
+        if self._resident is not None:
+            return self._decode_resident('scaling')
         return self.scaling_activation(self._scaling)
     
     @property
     def get_rotation(self):
+        if self._resident is not None:
+            return self._decode_resident('rotation')
         return self.rotation_activation(self._rotation)
     
     @property
     def get_diffuse_factor(self):
+        if self._resident is not None:
+            return self._decode_resident('diffuse_factor')
         # return self.diffuse_factor_activation(self._diffuse_factor)
         return self._diffuse_factor
 
     @property
     def get_shininess(self):
+        if self._resident is not None:
+            return self._decode_resident('shininess')
         return self.shininess_activation(self._shininess)*50 # for high specular part
         # return self._shininess
     
     @property
     def get_ambient_factor(self):
+        if self._resident is not None:
+            return self._decode_resident('ambient_factor')
         # return self.ambient_activation(self._ambient_factor)
         return self._ambient_factor
     
     @property
     def get_specular_factor(self):
+        if self._resident is not None:
+            return self._decode_resident('specular_factor')
         return self.specular_factor_activation(self._specular_factor)*5 # for high specular part
         # return self._specular_factor # original
     
@@ -237,6 +301,8 @@ class GaussianModel:
 
     @property
     def get_normal(self):
+        if self._resident is not None:
+            return self._decode_resident('normal')
         return self.normal_activation(self._normal)
 
     @property
@@ -250,6 +316,8 @@ class GaussianModel:
     
     @property
     def get_opacity(self):
+        if self._resident is not None:
+            return self._decode_resident('opacity')
         return self.opacity_activation(self._opacity)
     
     @property
@@ -258,6 +326,8 @@ class GaussianModel:
 
     @property
     def get_offset_color(self):
+        if self._resident is not None:
+            return self._decode_resident('offset_color')
         return self.offset_color_activation(self._offset_color)
         # return self._offset_color
     
@@ -320,6 +390,48 @@ class GaussianModel:
         # exit()
         return gaussians
 
+    @classmethod
+    @torch.no_grad()
+    def load_composition(cls, paths, transforms, sh_degree, num_workers=None, codebook_resident=False):
+        """
+        Loads the quantised checkpoints of the TFs of a composed scene (same result as load_quantised_checkpoint +
+        set_transform per TF followed by create_from_gaussians). The files are parsed in a thread pool into
+        pinned host buffers, then decoded in TF order straight into preallocated composite tensors.
+        With codebook_resident, only xyz is decoded; the uint8 ids and the codebooks stay on the GPU (see _decode_resident).
+        """
+        assert len(paths) > 0 and len(paths) == len(transforms)
+        num_workers = num_workers or min(len(paths), os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=num_workers) as pool:
+            host_list = list(pool.map(read_quantised_host, paths)) # map keeps the TF order
+
+        gaussians = GaussianModel(sh_degree=sh_degree, render_type="phong")
+        num_GSs_TF = [host['num_gaussians'] for host in host_list]
+        if codebook_resident:
+            gaussians._load_composition_resident(host_list, transforms)
+            return gaussians
+        channels = OrderedDict([('xyz', 3), ('normal', 3), ('opacity', 1), ('scaling', 3), ('rotation', 4),
+                                ('offset_color', 3), ('diffuse_factor', 1), ('shininess', 1), ('ambient_factor', 1),
+                                ('specular_factor', 1)])
+        composite = {name: torch.empty((sum(num_GSs_TF), c), dtype=torch.float, device="cuda")
+                     for name, c in channels.items()}
+        start = 0
+        for host, transform in zip(host_list, transforms):
+            end = start + host['num_gaussians']
+            columns = {name: column.to("cuda", non_blocking=True) for name, column in host['columns'].items()}
+            codebook = columns['codebook'].float()
+            codebook_centers_torch = OrderedDict((key, codebook[:, i]) for i, key in enumerate(host['codebook_keys']))
+            attribues_dict = cls._decode_codebook_ids(columns, codebook_centers_torch, host['num_gaussians'])
+            attribues_dict['xyz'], attribues_dict['normal'], attribues_dict['scaling'], attribues_dict['rotation'] = \
+                gaussians._apply_transform(transform, columns['xyz'].float(), attribues_dict['normal'],
+                                           attribues_dict['scaling'], attribues_dict['rotation'])
+            for name in channels:
+                composite[name][start:end] = attribues_dict[name]
+            start = end
+
+        gaussians._set_phong_attributes(composite)
+        gaussians.set_num_GSs_TF(num_GSs_TF) # set the number of GSs in each TF, used for editing control
+        return gaussians
+
     def create_from_ckpt(self, checkpoint_path, restore_optimizer=False,refresh_color=False,is_editing=False):
         (model_args, first_iter) = torch.load(checkpoint_path)
 
@@ -524,7 +636,7 @@ class GaussianModel:
                 for i in range(len(centers_numpy_list)):
                     centers_numpy_list[i] = np.cast[np.float16](centers_numpy_list[i]).view(dtype=np.int16)
                 
-            codebooks[:] = list(map(tuple, np.concatenate([ar for ar in centers_numpy_list], axis=1)))
+            fill_structured_array(codebooks, centers_numpy_list)
                 
         else:
             normal = self._normal #* quantised normal
@@ -568,8 +680,9 @@ class GaussianModel:
         elements = np.empty(gaussian_nums, dtype=dtype_full)
         #!Note: the order need to be aligned with the order of construct_list_of_attributes
         # attributes = np.concatenate((xyz, normal, opacities, scaling, rotation, offset_color, diffuse_factor, shininess, ambient_factor, specular_factor), axis=1)
-        attributes = np.concatenate((xyz, opacities, normal, scaling, rotation, offset_color, diffuse_factor, shininess, ambient_factor, specular_factor), axis=1)
-        elements[:] = list(map(tuple, attributes))
+        #* filled column by column, same bytes as elements[:] = list(map(tuple, np.concatenate(attributes, axis=1)))
+        attributes = [xyz, opacities, normal, scaling, rotation, offset_color, diffuse_factor, shininess, ambient_factor, specular_factor]
+        fill_structured_array(elements, attributes)
         elements_list.append(PlyElement.describe(elements, f'gaussians'))
             
         if quantised:
@@ -577,6 +690,42 @@ class GaussianModel:
         PlyData(elements_list).write(path)
     
     
+    @staticmethod
+    def _decode_codebook_ids(ids, codebook_centers_torch, num_primitives):
+        """Indexes the codebook centers with the uint8 ids of a quantised checkpoint."""
+        opacity, scaling, normal, rotation = ids['opacity'], ids['scaling'], ids['normal'], ids['rotation']
+        offset_color, diffuse_factor, shininess = ids['offset_color'], ids['diffuse_factor'], ids['shininess']
+        ambient_factor, specular_factor = ids['ambient_factor'], ids['specular_factor']
+        # This is needed as we might have padded the features_rest tensor with zeros before        
+        # The gather operation indexes a 256x15 tensor with a (P*3)features_rest index tensor,
+        # in a column-wise fashion
+        # Basically this is equivalent to indexing a single codebook with a P*3 index
+        # features_rest times inside a loop
+        opacity = codebook_centers_torch['opacity'][opacity.long()]
+        scaling = codebook_centers_torch['scaling'][scaling.view(num_primitives*3).long()].view(num_primitives, 3)
+        normal = codebook_centers_torch['normal'][normal.view(num_primitives*3).long()].view(num_primitives, 3) #* quantised normal
+        # Index the real and imaginary part separately
+        rotation = torch.cat((
+            codebook_centers_torch['rotation_re'][rotation[:, 0:1].long()],
+            codebook_centers_torch['rotation_im'][rotation[:, 1:].reshape(num_primitives*3).long()].view(num_primitives,3)
+            ), dim=1)
+        offset_color = codebook_centers_torch['offset_color'][offset_color.view(num_primitives*3).long()].view(num_primitives, 3)
+        diffuse_factor = codebook_centers_torch['diffuse_factor'][diffuse_factor.long()]
+        shininess = codebook_centers_torch['shininess'][shininess.long()]
+        ambient_factor = codebook_centers_torch['ambient_factor'][ambient_factor.long()]
+        specular_factor = codebook_centers_torch['specular_factor'][specular_factor.long()]
+
+        return {'normal': normal,
+                'opacity': opacity,
+                'scaling': scaling,
+                'rotation': rotation,
+                'offset_color': offset_color,
+                'diffuse_factor': diffuse_factor,
+                'shininess': shininess,
+                'ambient_factor': ambient_factor,
+                'specular_factor': specular_factor,
+        }
+
     #todo: this is new
     def _parse_codebook(self,vertex_group,
                             float_type,
@@ -632,25 +781,18 @@ class GaussianModel:
 
         # If quantisation has been used, it is needed to index the centers
         if quantised:
-            # This is needed as we might have padded the features_rest tensor with zeros before        
-            # The gather operation indexes a 256x15 tensor with a (P*3)features_rest index tensor,
-            # in a column-wise fashion
-            # Basically this is equivalent to indexing a single codebook with a P*3 index
-            # features_rest times inside a loop
-            opacity = codebook_centers_torch['opacity'][opacity.long()]
-            scaling = codebook_centers_torch['scaling'][scaling.view(num_primitives*3).long()].view(num_primitives, 3)
-            normal = codebook_centers_torch['normal'][normal.view(num_primitives*3).long()].view(num_primitives, 3) #* quantised normal
-            # Index the real and imaginary part separately
-            rotation = torch.cat((
-                codebook_centers_torch['rotation_re'][rotation[:, 0:1].long()],
-                codebook_centers_torch['rotation_im'][rotation[:, 1:].reshape(num_primitives*3).long()].view(num_primitives,3)
-                ), dim=1)
-            offset_color = codebook_centers_torch['offset_color'][offset_color.view(num_primitives*3).long()].view(num_primitives, 3)
-            diffuse_factor = codebook_centers_torch['diffuse_factor'][diffuse_factor.long()]
-            shininess = codebook_centers_torch['shininess'][shininess.long()]
-            ambient_factor = codebook_centers_torch['ambient_factor'][ambient_factor.long()]
-            specular_factor = codebook_centers_torch['specular_factor'][specular_factor.long()]
-            
+            attribues_dict = self._decode_codebook_ids({'opacity': opacity,
+                                                        'scaling': scaling,
+                                                        'normal': normal,
+                                                        'rotation': rotation,
+                                                        'offset_color': offset_color,
+                                                        'diffuse_factor': diffuse_factor,
+                                                        'shininess': shininess,
+                                                        'ambient_factor': ambient_factor,
+                                                        'specular_factor': specular_factor},
+                                                       codebook_centers_torch, num_primitives)
+            attribues_dict['xyz'] = xyz
+            return attribues_dict
 
         return {'xyz': xyz,
                 'normal': normal,
@@ -768,17 +910,30 @@ class GaussianModel:
         # ic(torch.allclose(normal, normal_save))
         # exit()
         
+        self._set_phong_attributes({'xyz': xyz,
+                                    'normal': normal,
+                                    'opacity': opacity,
+                                    'scaling': scaling,
+                                    'rotation': rotation,
+                                    'offset_color': offset_color,
+                                    'diffuse_factor': diffuse_factor,
+                                    'shininess': shininess,
+                                    'ambient_factor': ambient_factor,
+                                    'specular_factor': specular_factor})
+
+    def _set_phong_attributes(self, attribues_dict):
+        xyz = attribues_dict['xyz']
         self._xyz = nn.Parameter(xyz.requires_grad_(True))
-        self._normal = nn.Parameter(normal.requires_grad_(True)) #* quantised normal
+        self._normal = nn.Parameter(attribues_dict['normal'].requires_grad_(True)) #* quantised normal
         
-        self._opacity = nn.Parameter(opacity.requires_grad_(True))
-        self._scaling = nn.Parameter(scaling.requires_grad_(True))
-        self._rotation = nn.Parameter(rotation.requires_grad_(True))
-        self._offset_color = nn.Parameter(offset_color.requires_grad_(True))
-        self._diffuse_factor = nn.Parameter(diffuse_factor.requires_grad_(True))
-        self._shininess = nn.Parameter(shininess.requires_grad_(True))
-        self._ambient_factor = nn.Parameter(ambient_factor.requires_grad_(True))
-        self._specular_factor = nn.Parameter(specular_factor.requires_grad_(True))
+        self._opacity = nn.Parameter(attribues_dict['opacity'].requires_grad_(True))
+        self._scaling = nn.Parameter(attribues_dict['scaling'].requires_grad_(True))
+        self._rotation = nn.Parameter(attribues_dict['rotation'].requires_grad_(True))
+        self._offset_color = nn.Parameter(attribues_dict['offset_color'].requires_grad_(True))
+        self._diffuse_factor = nn.Parameter(attribues_dict['diffuse_factor'].requires_grad_(True))
+        self._shininess = nn.Parameter(attribues_dict['shininess'].requires_grad_(True))
+        self._ambient_factor = nn.Parameter(attribues_dict['ambient_factor'].requires_grad_(True))
+        self._specular_factor = nn.Parameter(attribues_dict['specular_factor'].requires_grad_(True))
         
         #* dummy load initial value
         self._shs_dc = nn.Parameter(torch.zeros(
@@ -786,6 +941,141 @@ class GaussianModel:
         self._shs_rest = nn.Parameter(torch.zeros(
         (xyz.shape[0], (self.active_sh_degree+1)**2-1, 3), dtype=torch.float, device="cuda").contiguous().requires_grad_(True))
         self.active_sh_degree = self.max_sh_degree
+
+    def _activate_codebook(self, key, centers):
+        """Applies the getter activation of an attribute to its codebook centers (once per entry, not per Gaussian)."""
+        if key == 'opacity':
+            return self.opacity_activation(centers)
+        if key == 'scaling':
+            return self.scaling_activation(centers)
+        if key == 'offset_color':
+            return self.offset_color_activation(centers)
+        if key == 'shininess':
+            return self.shininess_activation(centers)*50
+        if key == 'specular_factor':
+            return self.specular_factor_activation(centers)*5
+        return centers #* normal and rotation are normalized per Gaussian, diffuse/ambient are not activated
+
+    def _set_resident_attributes(self, xyz, ids, tables, codebook_size, tf_transforms=None):
+        """
+        Codebook-resident inference mode: keeps the uint8 ids [N, C] and the activated codebooks of all TFs
+        (stacked, [num_TF*codebook_size]) instead of the decoded float attributes. tf_transforms holds the
+        per-TF rotation / quaternion / scale of the composition, or None if no TF is rotated or scaled.
+        """
+        self._xyz = nn.Parameter(xyz.requires_grad_(False))
+        for name in ['_normal', '_opacity', '_scaling', '_rotation', '_offset_color', '_diffuse_factor',
+                     '_shininess', '_ambient_factor', '_specular_factor']:
+            setattr(self, name, torch.empty(0, device=xyz.device))
+        self._resident = {'ids': ids, 'tables': tables, 'codebook_size': codebook_size, 'transforms': tf_transforms}
+
+        #* dummy load initial value
+        self._shs_dc = nn.Parameter(torch.zeros(
+        (xyz.shape[0], 1, 3), dtype=torch.float, device="cuda").contiguous().requires_grad_(False))
+        self._shs_rest = nn.Parameter(torch.zeros(
+        (xyz.shape[0], (self.active_sh_degree+1)**2-1, 3), dtype=torch.float, device="cuda").contiguous().requires_grad_(False))
+        self.active_sh_degree = self.max_sh_degree
+
+    def _decode_resident(self, name, index=None):
+        """
+        Decodes one attribute of a codebook-resident model: a single gather of the uint8 ids into the TF's codebook,
+        for the Gaussians index only if given.
+        """
+        resident = self._resident
+        ids, tables = resident['ids'][name], resident['tables']
+        tf_ids = self.get_tf_ids
+        if index is not None:
+            ids, tf_ids = ids.index_select(0, index), tf_ids.index_select(0, index)
+        tf_ids = tf_ids.long()
+        offset = (tf_ids*resident['codebook_size'])[:, None]
+        tf_transforms = resident['transforms']
+        if name == 'rotation':
+            rotation = torch.cat((tables['rotation_re'][ids[:, 0:1].long() + offset],
+                                  tables['rotation_im'][ids[:, 1:].long() + offset]), dim=1)
+            if tf_transforms is not None:
+                rotation = quaternion_multiply(tf_transforms['rotation_q'][tf_ids], rotation)
+            return self.rotation_activation(rotation)
+        if name == 'normal':
+            normal = tables['normal'][ids.long() + offset]
+            if tf_transforms is not None:
+                normal = torch.einsum('nij,nj->ni', tf_transforms['rotation'][tf_ids], normal)
+            return self.normal_activation(normal)
+        values = tables[name][ids.long() + offset]
+        if name == 'scaling' and tf_transforms is not None:
+            values = values * tf_transforms['scale'][tf_ids]
+        return values
+
+    def _load_composition_resident(self, host_list, transforms):
+        """codebook_resident path of load_composition: the per-TF transforms are applied to xyz only and kept per TF."""
+        num_GSs_TF = [host['num_gaussians'] for host in host_list]
+        codebook_size = host_list[0]['columns']['codebook'].shape[0]
+        xyz = torch.empty((sum(num_GSs_TF), 3), dtype=torch.float, device="cuda")
+        ids = {name: torch.empty((sum(num_GSs_TF), c), dtype=torch.uint8, device="cuda") for name, c in NATIVE_ID_COLUMNS}
+        tables = OrderedDict()
+        scales, rotations = [], []
+        start = 0
+        for host, transform in zip(host_list, transforms):
+            assert host['columns']['codebook'].shape[0] == codebook_size
+            end = start + host['num_gaussians']
+            columns = {name: column.to("cuda", non_blocking=True) for name, column in host['columns'].items()}
+            codebook = columns['codebook'].float()
+            for i, key in enumerate(host['codebook_keys']):
+                tables.setdefault(key, []).append(self._activate_codebook(key, codebook[:, i]))
+            for name, _ in NATIVE_ID_COLUMNS:
+                ids[name][start:end] = columns[name].view(end - start, -1)
+            xyz_tf = columns['xyz'].float()
+            xyz[start:end] = (torch.cat([xyz_tf, torch.ones_like(xyz_tf[:, :1])], dim=-1) @ transform.T)[:, :3]
+            scale = transform[:3, :3].norm(dim=-1)
+            scales.append(scale)
+            rotations.append(transform[:3, :3] / scale[:, None])
+            start = end
+
+        tables = OrderedDict((key, torch.cat(values)) for key, values in tables.items())
+        tf_transforms = None
+        rotations, scales = torch.stack(rotations), torch.stack(scales)
+        if not (torch.allclose(rotations, torch.eye(3, device=rotations.device).expand_as(rotations))
+                and torch.allclose(scales, torch.ones_like(scales))):
+            tf_transforms = {'rotation': rotations, 'rotation_q': rotation_to_quaternion(rotations), 'scale': scales}
+        self._set_resident_attributes(xyz, ids, tables, codebook_size, tf_transforms)
+        self.set_num_GSs_TF(num_GSs_TF) # set the number of GSs in each TF, used for editing control
+
+    @torch.no_grad()
+    def use_codebook_resident(self, codebook_dict=None):
+        """
+        Switches a clustered model (produce_clusters / a loaded codebook.pt) to the codebook-resident inference mode.
+        The float attributes are released; xyz stays per Gaussian.
+        """
+        codebook_dict = codebook_dict or self._codebook_dict
+        assert codebook_dict is not None, "produce_clusters first"
+        codebook_size = codebook_dict['opacity'].centers.shape[0]
+        ids = {name: codebook_dict[name].ids.reshape(self.get_gaussian_nums, c)
+               for name, c in NATIVE_ID_COLUMNS if name != 'rotation'}
+        ids['rotation'] = torch.cat((codebook_dict['rotation_re'].ids.reshape(-1, 1),
+                                     codebook_dict['rotation_im'].ids.reshape(-1, 3)), dim=1)
+        #* the centers are stored before activation (see generate_codebook)
+        tables = OrderedDict((key, self._activate_codebook(key, codebook.centers.flatten().float()))
+                             for key, codebook in codebook_dict.items())
+        self._set_resident_attributes(self._xyz.detach(), ids, tables, codebook_size)
+
+    def my_load_native(self, path):
+        """
+        Loads a quantised phong checkpoint of the native container (see utils/io_utils.py, convert_to_native.py):
+        the file is memory-mapped and moved to the GPU as one buffer, the columns are views into it.
+        """
+        header, columns = load_native_gaussians(path, device="cuda")
+        codebook = columns['codebook'].float()
+        codebook_centers_torch = OrderedDict((key, codebook[:, i]) for i, key in enumerate(header['codebook_keys']))
+        attribues_dict = self._decode_codebook_ids(columns, codebook_centers_torch, header['num_gaussians'])
+        attribues_dict['xyz'] = columns['xyz'].float()
+        self._set_phong_attributes(attribues_dict)
+
+    def load_quantised_checkpoint(self, path):
+        """Loads a quantised half-float point_cloud.ply, from its native container if it was converted."""
+        native_path = native_path_of(path)
+        #* skip stale containers (the ply was saved again after the conversion)
+        if os.path.exists(native_path) and os.path.getmtime(native_path) >= os.path.getmtime(path):
+            self.my_load_native(native_path)
+        else:
+            self.my_load_ply(path, quantised=True, half_float=True)
     
     def load_ply(self, path): #* for read compact save file
         plydata = PlyData.read(path)
@@ -1292,8 +1582,7 @@ class GaussianModel:
         dtype_full = [(attribute, 'f4') for attribute in self.construct_list_of_attributes()]
 
         elements = np.empty(xyz.shape[0], dtype=dtype_full)
-        attributes = np.concatenate(attributes_list, axis=1)
-        elements[:] = list(map(tuple, attributes))
+        fill_structured_array(elements, attributes_list)
         el = PlyElement.describe(elements, 'vertex')
         PlyData([el]).write(path)
         
@@ -0,0 +1,333 @@
+import json
+import shlex
+import asyncio
+import threading
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+#* Framing of the GUI socket protocol.
+#* A JSON message is one line: {"id": ..., "commands": ["set_opacity 0 1", "set_color 0 255 0 0", ...]}
+#* and gets exactly one reply line: {"id": ..., "ok": true, "results": [...]} or {"id": ..., "ok": false, "errors": [...]}.
+#* The commands of a batch are validated first and applied only if all of them are valid.
+#* Anything not starting with "{" is a legacy text command (one per line, or one per recv without newline).
+
+MAX_MESSAGE_SIZE = 16 * 2**20
+
+LIGHT_PARAMS = ["angle", "elevation", "ambient", "diffuse", "specular", "shininess"]
+FRAME_FORMATS = ["png", "raw"]
+NO_ARG_COMMANDS = ["get_status", "get_render_stats", "reset_view", "save_image", "reset_color_opacity", "start_tour"]
+
+
+def encode_message(message):
+    return (json.dumps(message) + "\n").encode("utf-8")
+
+
+def _check_int(value, name, low=None, high=None):
+    try:
+        value = int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer, got '{value}'")
+    if (low is not None and value < low) or (high is not None and value > high):
+        raise ValueError(f"{name} must be in [{low}, {high}], got {value}")
+    return value
+
+
+def _check_float(value, name):
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a number, got '{value}'")
+
+
+def _check_arity(parts, count, usage):
+    if len(parts) != count:
+        raise ValueError(f"expected: {usage}")
+
+
+def validate_command(message, num_TFs=None, modes=None, train_views=True):
+    """
+    Raises ValueError if the text command would be rejected or fail in GUI.process_message.
+    train_views: whether the training views of set_view are available (the renderer has an --image_path).
+    """
+    parts = shlex.split(message)
+    if len(parts) == 0:
+        raise ValueError("empty command")
+    name = parts[0]
+    max_tf = None if num_TFs is None else num_TFs - 1
+    if name in NO_ARG_COMMANDS:
+        _check_arity(parts, 1, name)
+    elif name == "get_frame":
+        if len(parts) > 2 or (len(parts) == 2 and parts[1] not in FRAME_FORMATS):
+            raise ValueError(f"expected: get_frame [{'|'.join(FRAME_FORMATS)}]")
+    elif name == "set_opacity":
+        _check_arity(parts, 3, "set_opacity <tf_index> <value>")
+        _check_int(parts[1], "tf_index", 0, max_tf)
+        _check_float(parts[2], "value")
+    elif name == "set_color":
+        _check_arity(parts, 5, "set_color <tf_index> <r> <g> <b>")
+        _check_int(parts[1], "tf_index", 0, max_tf)
+        for c in parts[2:]:
+            _check_int(c, "color", 0, 255)
+    elif name == "set_light":
+        _check_arity(parts, 3, "set_light <param> <value>")
+        if parts[1] == "headlight":
+            if parts[2].lower() not in ["true", "false"]:
+                raise ValueError("set_light headlight expects true or false")
+        elif parts[1] in LIGHT_PARAMS:
+            _check_float(parts[2], parts[1])
+        else:
+            raise ValueError(f"unknown light param '{parts[1]}'")
+    elif name == "set_mode":
+        _check_arity(parts, 2, "set_mode <mode>")
+        if modes is not None and parts[1] not in modes:
+            raise ValueError(f"unknown mode '{parts[1]}', available modes: {list(modes)}")
+    elif name == "set_fov":
+        _check_arity(parts, 2, "set_fov <value>")
+        _check_int(parts[1], "fov", 1, 120)
+    elif name == "set_background":
+        _check_arity(parts, 4, "set_background <r> <g> <b>")
+        for c in parts[1:]:
+            _check_int(c, "color", 0, 255)
+    elif name == "set_view":
+        if not train_views:
+            raise ValueError("set_view needs the training views, the renderer was started without --image_path")
+        _check_arity(parts, 3, "set_view <tf_index> <frame_number>")
+        _check_int(parts[1], "tf_index", 0, max_tf)
+        _check_int(parts[2], "frame_number", 0)
+    elif name == "stylize":
+        _check_arity(parts, 3, "stylize <tf_index(s)|whole> <prompt>")
+        if parts[1] != "whole":
+            for tf_index in parts[1].split("&"):
+                _check_int(tf_index, "tf_index", 0, max_tf)
+    elif name == "legend" and len(parts) > 1 and parts[1] == "add":
+        _check_arity(parts, 6, "legend add <label> <r> <g> <b>")
+        for c in parts[3:]:
+            _check_int(c, "color", 0, 255)
+    elif name == "legend" and len(parts) > 1 and parts[1] == "delete":
+        _check_arity(parts, 3, "legend delete <label>")
+    else:
+        raise ValueError(f"unknown command '{name}'")
+
+
+def validate_batch(commands, num_TFs=None, modes=None, train_views=True):
+    """Returns the list of errors of a command batch ([] if every command is valid)."""
+    if not isinstance(commands, list) or not all(isinstance(c, str) for c in commands):
+        return [{"index": None, "command": None, "error": "'commands' must be a list of strings"}]
+    errors = []
+    for i, command in enumerate(commands):
+        try:
+            validate_command(command, num_TFs, modes, train_views)
+        except ValueError as e:
+            errors.append({"index": i, "command": command, "error": str(e)})
+    return errors
+
+
+def handle_json_message(line, apply_batch):
+    """Decodes one JSON line and applies its batch, returns the reply dict."""
+    try:
+        request = json.loads(line)
+    except json.JSONDecodeError as e:
+        return error_reply(f"invalid JSON: {e}")
+    if not isinstance(request, dict):
+        return error_reply("expected a JSON object")
+    commands = request.get("commands")
+    if commands is None and "command" in request:
+        commands = [request["command"]]
+    reply = apply_batch(commands)
+    reply["id"] = request.get("id")
+    return reply
+
+
+class MessageFramer:
+    """Splits the received bytes of one connection into JSON lines and legacy text commands."""
+    def __init__(self):
+        self.buffer = b""
+
+    def feed(self, data):
+        """Returns the complete messages as ("json", line) / ("text", command); raises ValueError on oversized messages."""
+        self.buffer += data
+        messages = []
+        while self.buffer:
+            line, sep, rest = self.buffer.partition(b"\n")
+            if self.buffer.lstrip().startswith(b"{"):
+                #* framed JSON: wait for the full line
+                if not sep:
+                    if len(self.buffer) > MAX_MESSAGE_SIZE:
+                        raise ValueError("message too large")
+                    break
+                messages.append(("json", line.decode("utf-8")))
+            else:
+                #* legacy text: a line, or the whole chunk if the old client sent no newline
+                message = line.decode("utf-8").strip()
+                if message:
+                    messages.append(("text", message))
+            self.buffer = rest
+        return messages
+
+
+def error_reply(error, request_id=None, **extra):
+    reply = {"id": request_id, "ok": False, "errors": [{"index": None, "command": None, "error": error}]}
+    reply.update(extra)
+    return reply
+
+
+def serve_connection(conn, apply_batch, apply_legacy, bufsize=65536):
+    """
+    Reads the messages of one client connection until it is closed.
+    apply_batch(commands) -> reply dict for JSON batches (sent back as one line),
+    apply_legacy(message) for text commands (which reply themselves, e.g. get_status).
+    """
+    framer = MessageFramer()
+    while True:
+        data = conn.recv(bufsize)
+        if not data:
+            break
+        try:
+            messages = framer.feed(data)
+        except ValueError as e:
+            conn.sendall(encode_message(error_reply(str(e))))
+            return
+        for kind, message in messages:
+            if kind == "json":
+                conn.sendall(encode_message(handle_json_message(message, apply_batch)))
+            else:
+                apply_legacy(message)
+
+
+class ReplyBuffer:
+    """Collects what a legacy command handler sends (conn.sendall), for the asyncio server to write back."""
+    def __init__(self):
+        self.data = b""
+
+    def sendall(self, data):
+        self.data += data
+
+
+class AsyncCommandServer:
+    """
+    asyncio server of the GUI socket protocol, running its event loop in one background thread.
+    - at most max_clients connections are served at once, further clients get a "server busy" reply and are closed
+      (backpressure instead of one more thread per connection);
+    - every batch / legacy command goes through one bounded queue consumed by a single writer thread, so the GUI
+      state is only ever changed by one command at a time, in arrival order. A full queue is answered with "server busy".
+    apply_batch(commands) -> reply dict, apply_legacy(message, conn) writes its reply (if any) with conn.sendall.
+    """
+    def __init__(self, apply_batch, apply_legacy, host="127.0.0.1", port=65432, max_clients=64, max_pending=256):
+        self.apply_batch = apply_batch
+        self.apply_legacy = apply_legacy
+        self.host = host
+        self.port = port
+        self.max_clients = max_clients
+        self.max_pending = max_pending
+        self.active_clients = 0
+        self.stats = collections.Counter()
+        self.loop = None
+        self.thread = None
+        self._ready = threading.Event()
+
+    def start(self):
+        """Starts the server thread and returns once it is listening (self.port holds the bound port)."""
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self):
+        if self.loop is not None:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result()
+            self.thread.join()
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self._serve())
+        finally:
+            self.loop.close()
+
+    async def _serve(self):
+        self.queue = asyncio.Queue(maxsize=self.max_pending)
+        self.writer_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gui_command_writer")
+        self.writer_task = asyncio.ensure_future(self._writer())
+        self.server = await asyncio.start_server(self._handle_client, self.host, self.port, backlog=self.max_clients * 4)
+        self.port = self.server.sockets[0].getsockname()[1]
+        print(f"Socket server listening on {self.host}:{self.port}")
+        self._ready.set()
+        try:
+            await self.server.serve_forever()
+        except asyncio.CancelledError:
+            pass
+
+    async def _shutdown(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.writer_task.cancel()
+        self.writer_pool.shutdown(wait=True)
+
+    async def _writer(self):
+        #* the single writer: commands are applied one at a time in the writer thread
+        while True:
+            fn, future = await self.queue.get()
+            try:
+                result = await self.loop.run_in_executor(self.writer_pool, fn)
+                future.set_result(result)
+            except Exception as e:
+                future.set_exception(e)
+
+    async def _submit(self, fn):
+        """Queues fn for the writer; returns (True, result), or (False, None) if the queue is full."""
+        future = self.loop.create_future()
+        try:
+            self.queue.put_nowait((fn, future))
+        except asyncio.QueueFull:
+            self.stats["queue_full"] += 1
+            return False, None
+        return True, await future
+
+    async def _handle_client(self, reader, writer):
+        if self.active_clients >= self.max_clients:
+            self.stats["rejected_clients"] += 1
+            writer.write(encode_message(error_reply("server busy: too many clients", busy=True, closed=True)))
+            await writer.drain()
+            writer.close()
+            return
+        self.active_clients += 1
+        self.stats["clients"] += 1
+        framer = MessageFramer()
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                try:
+                    messages = framer.feed(data)
+                except ValueError as e:
+                    writer.write(encode_message(error_reply(str(e))))
+                    break
+                for kind, message in messages:
+                    writer.write(await self._process(kind, message))
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.active_clients -= 1
+            writer.close()
+
+    async def _process(self, kind, message):
+        if kind == "json":
+            try:
+                accepted, reply = await self._submit(lambda: handle_json_message(message, self.apply_batch))
+            except Exception as e:
+                return encode_message(error_reply(f"{type(e).__name__}: {e}"))
+            if not accepted:
+                return encode_message(error_reply("server busy: command queue full", busy=True))
+            self.stats["batches"] += 1
+            return encode_message(reply)
+        conn = ReplyBuffer()
+        try:
+            accepted, _ = await self._submit(lambda: self.apply_legacy(message, conn))
+        except Exception as e:
+            print(f"Failed to process '{message}': {e}")
+            return b""
+        self.stats["legacy_commands" if accepted else "dropped_legacy_commands"] += 1
+        return conn.data
@@ -0,0 +1,199 @@
+import io
+import time
+import base64
+import hashlib
+import threading
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+from PIL import Image
+
+from utils.gui_utils import mode_to_rgb, overlay_legend
+
+
+class FrameReadback:
+    """
+    One GPU -> CPU readback per frame. The display RGB of the render mode and the opacity are packed into a
+    reused RGBA tensor on the render device and copied into a reused pinned host buffer in one transfer.
+    Both frame buffers of the GUI are views of preallocated memory:
+    - rgba:    [H, W, 4] float32, the frame without legend (saved screenshots, stylization, get_frame);
+    - display: [H, W, 3] float32, the texture (rgb of the same frame, legend drawn in place).
+    They are overwritten by the next read(), copy them to keep a frame.
+    """
+    def __init__(self, H, W, device="cuda"):
+        self.H, self.W = H, W
+        self.device = torch.device(device)
+        pinned = self.device.type == "cuda"
+        self.device_rgba = torch.empty(H, W, 4, dtype=torch.float32, device=self.device)
+        self.host_rgba = torch.empty(H, W, 4, dtype=torch.float32, pin_memory=pinned)
+        self.rgba = self.host_rgba.numpy()
+        self.display = np.ones((H, W, 3), dtype=np.float32)
+
+    def read(self, render_results, mode, resize_fn, legend_dict=None):
+        """Returns (display, rgba) of one render, see the class docstring."""
+        if render_results is None or mode is None:
+            self.rgba[...] = 1
+        else:
+            rgb = mode_to_rgb(render_results, mode, (self.H, self.W), resize_fn)
+            opacity = render_results["opacity"]
+            if tuple(opacity.shape[1:]) != (self.H, self.W):
+                opacity = resize_fn(opacity)
+            self.device_rgba[..., :3].copy_(rgb.permute(1, 2, 0))
+            self.device_rgba[..., 3:].copy_(opacity.permute(1, 2, 0))
+            self.host_rgba.copy_(self.device_rgba, non_blocking=self.host_rgba.is_pinned())
+            if self.device.type == "cuda":
+                torch.cuda.current_stream(self.device).synchronize()
+        np.copyto(self.display, self.rgba[..., :3])
+        overlay_legend(self.display, legend_dict, inplace=True)
+        return self.display, self.rgba
+
+    def load(self, rgba, legend_dict=None):
+        """Same as read() for a finished RGBA frame, e.g. from the FrameCache."""
+        np.copyto(self.rgba, rgba)
+        np.copyto(self.display, self.rgba[..., :3])
+        overlay_legend(self.display, legend_dict, inplace=True)
+        return self.display, self.rgba
+
+
+def _quantize(values, decimals):
+    out = []
+    for value in values:
+        if isinstance(value, (list, tuple)) and len(value) and all(isinstance(v, torch.Tensor) for v in value):
+            value = torch.stack([v.detach().reshape(-1) for v in value])
+        if isinstance(value, torch.Tensor):
+            value = value.detach().cpu().numpy()
+        if isinstance(value, (list, tuple)):
+            value = [v.item() if isinstance(v, torch.Tensor) else v for v in value]
+        out.append(np.asarray(value, dtype=np.float64).ravel())
+    # + 0.0 folds -0.0 into 0.0
+    return np.round(np.concatenate(out), decimals) + 0.0
+
+
+def render_state_key(cam, render_kwargs, mode, downsample=1, decimals=4):
+    """
+    Hash of everything a finished frame (without legend) depends on: camera pose and fov, render mode, resolution,
+    background, palette colors, opacity factors and light, floats quantized to `decimals` digits.
+    """
+    dict_params = render_kwargs["dict_params"]
+    light = dict_params["light_transform"]
+    numbers = _quantize([cam.pose, cam.fovy, render_kwargs["bg_color"],
+                         [color.palette_color for color in dict_params["palette_colors"]],
+                         [opacity.opacity_factor for opacity in dict_params["opacity_factors"]],
+                         [light.theta, light.phi, float(light.useHeadLight)], list(light.get_light_transform())],
+                        decimals)
+    return hashlib.sha1(numbers.tobytes() + f"{mode}/{downsample}".encode("utf-8")).hexdigest()
+
+
+class FrameCache:
+    """LRU of finished RGBA frames keyed by render_state_key, bounded by a byte budget (max_bytes=0 disables it)."""
+    def __init__(self, max_bytes=256 * 2**20):
+        self.max_bytes = max_bytes
+        self.frames = collections.OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            frame = self.frames.get(key)
+            if frame is None:
+                self.misses += 1
+                return None
+            self.frames.move_to_end(key)
+            self.hits += 1
+            return frame
+
+    def put(self, key, rgba):
+        if rgba.nbytes > self.max_bytes:
+            return
+        frame = rgba.copy()
+        with self._lock:
+            if key in self.frames:
+                self.bytes -= self.frames.pop(key).nbytes
+            self.frames[key] = frame
+            self.bytes += frame.nbytes
+            while self.bytes > self.max_bytes:
+                _, evicted = self.frames.popitem(last=False)
+                self.bytes -= evicted.nbytes
+
+    def clear(self):
+        with self._lock:
+            self.frames.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "frames": len(self.frames),
+                    "bytes": self.bytes, "max_bytes": self.max_bytes}
+
+
+AGENT_IMAGE_FORMATS = {"jpeg": ("JPEG", "image/jpeg"), "webp": ("WEBP", "image/webp"), "png": ("PNG", "image/png")}
+
+
+class AgentImageEncoder:
+    """
+    The visualization image of the multimodal LLM request: downscaled so that its longer side is at most `size`
+    (0 keeps the full resolution), encoded as JPEG / WebP (at `quality`) or PNG, base64.
+    The encoded image is reused while the frame does not change (same `key`, else the same pixels).
+    submit() encodes on a worker thread, e.g. while the commands of an answer are applied and the explanation is read.
+    """
+    def __init__(self, size=512, image_format="jpeg", quality=85):
+        if image_format not in AGENT_IMAGE_FORMATS:
+            raise ValueError(f"unknown image format '{image_format}', available formats: {list(AGENT_IMAGE_FORMATS)}")
+        self.size = size
+        self.image_format = image_format
+        self.quality = quality
+        self.last_key = None
+        self.last = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="agent_image")
+
+    @property
+    def mime(self):
+        return AGENT_IMAGE_FORMATS[self.image_format][1]
+
+    @staticmethod
+    def to_uint8(image):
+        """float [H, W, C] in [0, 1] -> uint8 [H, W, C] (always a new array, the frame buffers are reused)."""
+        if image.dtype == np.uint8:
+            return image.copy()
+        return (np.clip(image, 0, 1) * 255).astype(np.uint8)
+
+    def encode(self, image, key=None):
+        """
+        image: float [H, W, 3 | 4] in [0, 1] or uint8; key: identity of the frame (e.g. render_state_key), if None
+        the pixels are hashed. Returns {"data": base64, "mime", "width", "height", "bytes", "seconds", "reused"}.
+        """
+        return self._encode(self.to_uint8(image), key)
+
+    def submit(self, image, key=None):
+        """encode() on the worker thread; the frame is copied here, so the caller may overwrite its buffer."""
+        return self._executor.submit(self._encode, self.to_uint8(image), key)
+
+    def _encode(self, frame, key):
+        tic = time.perf_counter()
+        key = hashlib.blake2b(frame.tobytes(), digest_size=16).hexdigest() + str(frame.shape) if key is None else key
+        with self._lock:
+            if key == self.last_key and self.last is not None:
+                return dict(self.last, seconds=time.perf_counter() - tic, reused=True)
+        pil_format, mime = AGENT_IMAGE_FORMATS[self.image_format]
+        if frame.shape[-1] == 4 and pil_format != "PNG":
+            frame = frame[..., :3]  # the display colors are already composited over the background
+        img = Image.fromarray(frame)
+        scale = self.size / max(img.size) if self.size else 1.0
+        if scale < 1.0:
+            img = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))), Image.BILINEAR)
+        buffer = io.BytesIO()
+        if pil_format == "PNG":
+            img.save(buffer, format=pil_format)
+        else:
+            img.save(buffer, format=pil_format, quality=self.quality)
+        data = buffer.getvalue()
+        encoded = {"data": base64.b64encode(data).decode("ascii"), "mime": mime, "width": img.width,
+                   "height": img.height, "bytes": len(data), "seconds": time.perf_counter() - tic, "reused": False}
+        with self._lock:
+            self.last_key, self.last = key, encoded
+        return encoded
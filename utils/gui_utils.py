@@ -0,0 +1,492 @@
+import io
+import os
+import ast
+import base64
+import glob
+import json
+import time
+import collections
+import contextlib
+import threading
+
+import numpy as np
+from scipy.spatial.transform import Rotation as R
+from pyquaternion import Quaternion
+from PIL import Image, ImageDraw, ImageFont
+
+
+class FrameScheduler:
+    """
+    Coalesces render requests of the GUI.
+    Commands only change the render state and mark it dirty, the render loop then
+    runs at most one render per display frame (or per flushed command batch),
+    no matter how many commands arrived in between.
+    Each dirty mark carries a kind ("full", or a cheaper screen-space edit such as "color"; "exact" asks for an
+    exact render of an unchanged state), the render function receives the set of kinds accumulated since the last frame.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._render_lock = threading.RLock()
+        self._dirty = False
+        self._kinds = set()
+        self.commands_applied = 0
+        self.renders_run = 0
+        self.render_paths = collections.Counter()
+
+    @property
+    def dirty(self):
+        return self._dirty
+
+    def mark_dirty(self, kind="full"):
+        with self._lock:
+            self._dirty = True
+            self._kinds.add(kind)
+
+    def clear(self):
+        with self._lock:
+            self._dirty = False
+            self._kinds = set()
+
+    def command_applied(self, count=1):
+        with self._lock:
+            self.commands_applied += count
+
+    def render(self, render_fn):
+        """
+        Runs render_fn(kinds) unconditionally (e.g. the very first frame, where kinds is empty).
+        render_fn may return the name of the render path it took, which is counted in stats().
+        """
+        with self._render_lock:
+            # clear before rendering so that commands arriving mid-render schedule another frame
+            with self._lock:
+                kinds = frozenset(self._kinds)
+                self._dirty = False
+                self._kinds = set()
+            path = render_fn(kinds)
+            with self._lock:
+                self.renders_run += 1
+                self.render_paths[path or "full"] += 1
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Holds back rendering while a command batch is applied, so no frame shows a partially applied batch.
+        Also the GUI state lock: every thread changing render state (socket writer, LLM, IP2P) enters it.
+        """
+        with self._render_lock:
+            yield
+
+    def flush(self, render_fn):
+        """Runs render_fn once if the state is dirty. Returns True if a render happened."""
+        with self._render_lock:
+            if not self._dirty:
+                return False
+            self.render(render_fn)
+            return True
+
+    def stats(self):
+        with self._lock:
+            return {"commands_applied": self.commands_applied,
+                    "renders_run": self.renders_run,
+                    "render_paths": dict(self.render_paths),
+                    "pending": self._dirty}
+
+
+class AdaptiveResolution:
+    """
+    Picks the downsample factor of the next frame from a frame-time target.
+    While the camera is being dragged (interact()), the level goes one step coarser whenever a frame exceeds
+    the frame budget and one step finer when the finer level is expected to fit (render time ~ pixel count).
+    Once input has been idle for idle_delay seconds, the next frame is rendered at full resolution (needs_refine()).
+    The level reached is kept for the next interaction.
+    """
+    def __init__(self, target_fps=30, levels=(1, 2, 4), idle_delay=0.15, enabled=True):
+        self.target_fps = target_fps
+        self.levels = sorted(set(levels) | {1})
+        self.idle_delay = idle_delay
+        self.enabled = enabled
+        self.level = 0
+        self.last_interaction = -np.inf
+        self.last_downsample = 1
+        self.last_frame_ms = 0.0
+
+    @property
+    def budget_ms(self):
+        return 1000 / self.target_fps
+
+    def interact(self):
+        self.last_interaction = time.perf_counter()
+
+    def end_interaction(self):
+        """Next frame at full resolution, e.g. before a screenshot."""
+        self.last_interaction = -np.inf
+
+    @property
+    def interacting(self):
+        return time.perf_counter() - self.last_interaction < self.idle_delay
+
+    def next_downsample(self):
+        if not self.enabled or not self.interacting:
+            return 1
+        return self.levels[self.level]
+
+    def frame_done(self, downsample, frame_ms):
+        """Feeds back the measured render time of a frame rendered at downsample."""
+        self.last_downsample = downsample
+        self.last_frame_ms = frame_ms
+        if not self.enabled:
+            return
+        if not self.interacting:
+            #* an idle full-resolution frame that is over budget: start the next interaction one level coarser
+            if downsample == 1 and frame_ms > self.budget_ms and self.level == 0 and len(self.levels) > 1:
+                self.level = 1
+            return
+        if frame_ms > self.budget_ms and self.level < len(self.levels) - 1:
+            self.level += 1
+        elif self.level > 0:
+            finer = self.levels[self.level - 1]
+            if frame_ms * (downsample / finer) ** 2 < self.budget_ms:
+                self.level -= 1
+
+    def needs_refine(self):
+        """True when the last frame was downsampled and input is idle: the full-resolution frame is due."""
+        return self.last_downsample != 1 and not self.interacting
+
+    def status(self):
+        return {"enabled": self.enabled,
+                "target_fps": self.target_fps,
+                "levels": self.levels,
+                "interaction_downsample": self.levels[self.level],
+                "last_downsample": self.last_downsample,
+                "last_frame_ms": self.last_frame_ms}
+
+
+def load_json_config(json_file):
+    if not os.path.exists(json_file):
+        return None
+
+    with open(json_file, 'r', encoding='UTF-8') as f:
+        load_dict = json.load(f)
+
+    return load_dict
+
+
+def read_initial_view(file_path):
+    """
+    Parses the initial_view.txt of a dataset (rotation matrix, "Radius:" and "Center:" lines).
+    Returns (rotation, radius, center), or None if the file format is incorrect.
+    """
+    with open(file_path, "r") as f:
+        lines = f.readlines()
+    # Find index for the "Radius:" line.
+    radius_index = None
+    for i, line in enumerate(lines):
+        if line.startswith("Radius:"):
+            radius_index = i
+            break
+    if radius_index is None or radius_index < 2:
+        return None
+    # Join the lines that contain the rotation matrix (from index 1 to radius_index).
+    rot_str = " ".join(line.strip() for line in lines[1:radius_index])
+    rot_obj = R.from_matrix(np.array(ast.literal_eval(rot_str)))
+
+    # Parse the radius.
+    radius_line = lines[radius_index].strip()  # e.g., "Radius: 3.305785123966942"
+    radius = float(radius_line.split("Radius:")[1].strip())
+
+    # Parse the center from the next line.
+    center_line = lines[radius_index+1].strip()  # e.g., "Center: [ 0.06522223, -0.02958885,  0.00098899]"
+    center = np.array(ast.literal_eval(center_line.split("Center:")[1].strip()))
+    return rot_obj, radius, center
+
+
+def read_train_view(image_path, tf_number, frame_number):
+    """Camera rotation and radius of a training frame of a TF (the views of set_view <tf_index> <frame_number>)."""
+    TFs_folders = sorted(glob.glob(f"{image_path}/TF*"))
+    view_config_file = f"{TFs_folders[tf_number]}/transforms_train.json"
+    view_dict = load_json_config(view_config_file)
+    all_views = view_dict["frames"]
+    c2w = np.array(all_views[frame_number]["transform_matrix"]).reshape(4, 4)
+    c2w /= 2
+    c2w[:3, 1:3] *= -1
+    # Extract rotation matrix (top-left 3x3) and translation vector (top 3 elements of last column)
+    rotation_matrix = c2w[:3, :3]
+    translation = c2w[:3, 3]
+
+    # Compute radius
+    radius = np.linalg.norm(translation)
+
+    # Convert rotation matrix to scipy Rotation object
+    return R.from_matrix(rotation_matrix), radius
+
+
+def initial_c2w(view_config=None):
+    """Start camera of the viewer: the first test view of view_config, or a fixed pose."""
+    if view_config is None:
+        return np.array([
+            [0.0, 0.0, -1.0, 2.0],
+            [1.0, 0.0, 0.0, 0.0],
+            [0.0, -1.0, 0.0, 0.0],
+            [0.0, 0.0, 0.0, 1.0]
+        ])
+    view_dict = load_json_config(f"{view_config}/transforms_test.json")
+    all_views = view_dict["frames"]
+    #todo: add view index
+    c2w = np.array(all_views[0]["transform_matrix"]).reshape(4, 4)
+    c2w /= 2
+    c2w[:3, 1:3] *= -1
+    return c2w
+
+
+def mode_to_rgb(render_results, mode, size, resize_fn):
+    """
+    Display image [3, H, W] (on the render device) of one render mode: depth / num_contrib normalization,
+    normals mapped to [0, 1], and the term modes composited on white.
+    """
+    output = render_results[mode]
+
+    if mode == "depth":
+        output = (output - output.min()) / (output.max() - output.min())
+    elif mode == "num_contrib":
+        output = output.clamp_max(1000) / 1000
+
+    if len(output.shape) == 2:
+        output = output[None]
+    if output.shape[0] == 1:
+        output = output.repeat(3, 1, 1)
+    if "normal" in mode:
+        opacity = render_results["opacity"]
+        output = output * 0.5 + 0.5 * opacity
+        output = output + (1 - opacity)
+    elif mode in ["diffuse_term", "specular_term", "ambient_term"]:
+        opacity = render_results["opacity"]
+        output = output + (1 - opacity)
+    if tuple(size) != tuple(output.shape[1:]):
+        output = resize_fn(output)
+    return output
+
+
+class LegendSprite:
+    """
+    The legend rasterized once per (legend content, layout, frame size) into a small premultiplied RGBA sprite,
+    then alpha-blended onto every frame with two numpy ops on the legend's bounding box.
+    """
+    font_path = "./assets/font/Helvetica.ttf"
+    font_size = 50 #22, 35, 50
+
+    def __init__(self, max_sprites=16):
+        self.max_sprites = max_sprites
+        self.sprites = collections.OrderedDict()
+        self.font = None
+        self._lock = threading.Lock()
+
+    def load_font(self):
+        # Try loading a TrueType font; if unavailable, use the default font.
+        if self.font is None:
+            try:
+                self.font = ImageFont.truetype(self.font_path, self.font_size)
+            except IOError:
+                self.font = ImageFont.load_default()
+        return self.font
+
+    def get(self, legend_dict, shape, position=(10, 10), square_size=60, padding=15):
+        """(y, x, premultiplied color [h, w, 3], alpha [h, w, 1]) of the legend, None if nothing is visible."""
+        key = (tuple((label, tuple(rgb)) for label, rgb in legend_dict.items()), tuple(shape[:2]),
+               tuple(position), square_size, padding)
+        with self._lock:
+            if key in self.sprites:
+                self.sprites.move_to_end(key)
+                return self.sprites[key]
+        sprite = self.rasterize(legend_dict, shape, position, square_size, padding)
+        with self._lock:
+            self.sprites[key] = sprite
+            if len(self.sprites) > self.max_sprites:
+                self.sprites.popitem(last=False)
+        return sprite
+
+    def rasterize(self, legend_dict, shape, position, square_size, padding):
+        x0, y0 = position
+        canvas_w = shape[1] - x0
+        canvas_h = min(shape[0], y0 + len(legend_dict) * (square_size + padding)) - y0
+        if canvas_w <= 0 or canvas_h <= 0:
+            return None
+        img = Image.new("RGBA", (canvas_w, canvas_h), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(img)
+        font = self.load_font()
+        y = 0
+        for label, rgb in legend_dict.items():
+            # Draw a filled rectangle (the colored square)
+            draw.rectangle([0, y, square_size, y + square_size], fill=tuple(rgb) + (255,))
+            # Draw the label text to the right of the square (text in black)
+            draw.text((square_size + padding, y), label, fill=(0, 0, 0, 255), font=font)
+            # Move y for the next legend item
+            y += square_size + padding
+        bbox = img.getbbox()
+        if bbox is None:
+            return None
+        sprite = np.asarray(img.crop(bbox), dtype=np.float32) / 255.0
+        alpha = np.ascontiguousarray(sprite[..., 3:])
+        color = np.ascontiguousarray(sprite[..., :3] * alpha)
+        return y0 + bbox[1], x0 + bbox[0], color, alpha
+
+    def blend(self, render_buffer, legend_dict, position=(10, 10), square_size=60, padding=15):
+        """Draws the legend into render_buffer (float [H, W, 3] in [0, 1]) in place."""
+        sprite = self.get(legend_dict, render_buffer.shape, position, square_size, padding)
+        if sprite is None:
+            return render_buffer
+        y, x, color, alpha = sprite
+        region = render_buffer[y:y + color.shape[0], x:x + color.shape[1]]
+        region *= 1 - alpha
+        region += color
+        return render_buffer
+
+
+legend_sprites = LegendSprite()
+
+
+def overlay_legend(render_buffer, legend_dict, position=(10, 10), square_size=60, padding=15, inplace=False):
+    #60, 15
+    #40, 10
+    #20, 5
+    """
+    Overlays a legend on the input image, from the cached sprite of legend_sprites.
+
+    Parameters:
+        render_buffer (np.ndarray): Image array with values in [0,1].
+        legend_dict (dict): Dictionary with keys as labels and values as [R, G, B] colors (0-255).
+        position (tuple): (x, y) position for the top-left corner of the legend.
+        square_size (int): Size of the color square.
+        padding (int): Padding between legend items.
+        inplace (bool): Draw into render_buffer instead of a copy of it.
+
+    Returns:
+        np.ndarray: The image with the legend overlay, normalized to [0,1].
+    """
+    # If legend_dict is empty, return the original render_buffer
+    if not legend_dict:
+        return render_buffer
+    if not inplace:
+        render_buffer = render_buffer.copy()
+    return legend_sprites.blend(render_buffer, legend_dict, position, square_size, padding)
+
+
+def encode_frame(rgb, alpha=None, frame_format="png"):
+    """
+    Encodes a display frame (float [H, W, 3] in [0, 1], optional alpha [H, W, 1]) for the socket protocol:
+    {"width", "height", "channels", "format": "png" | "raw", "data": base64}.
+    """
+    channels = [rgb] if alpha is None else [rgb, alpha]
+    frame = (np.clip(np.concatenate(channels, axis=-1), 0, 1) * 255).astype(np.uint8)
+    if frame_format == "png":
+        buffer = io.BytesIO()
+        Image.fromarray(frame).save(buffer, format="PNG")
+        data = buffer.getvalue()
+    else:
+        data = frame.tobytes()
+    return {"width": frame.shape[1], "height": frame.shape[0], "channels": frame.shape[2], "format": frame_format,
+            "data": base64.b64encode(data).decode("ascii")}
+
+
+def screen_to_arcball(p:np.ndarray):
+    dist = np.dot(p, p)
+    if dist < 1.:
+        return np.array([*p, np.sqrt(1.-dist)])
+    else:
+        return np.array([*normalize_vec(p), 0.])
+
+def normalize_vec(v: np.ndarray):
+    if v is None:
+        print("None")
+    norm = np.linalg.norm(v, axis=-1, keepdims=True)
+    if np.all(norm == np.zeros_like(norm)):
+        return np.zeros_like(v)
+    else:
+        return v/norm
+
+class ArcBallCamera:
+    def __init__(self, W, H, fovy=60, near=0.1, far=10, rot=None, translate=None, center=None):
+        self.W = W
+        self.H = H
+        if translate is None:
+            self.radius = 1
+            self.original_radius = 1
+        else:
+            self.radius = np.linalg.norm(translate)
+            self.original_radius = np.linalg.norm(translate)
+            
+        # self.radius *= 2
+        self.radius *= 2
+        self.fovy = fovy  # in degree
+        self.near = near
+        self.far = far
+
+        if center is None:
+            self.center = np.array([0, 0, 0], dtype=np.float32)  # look at this point
+        else:
+            self.center = center
+        
+        self.original_center = self.center
+
+        if rot is None:
+            self.rot = R.from_matrix(np.array([[1, 0, 0], [0, 1, 0], [0, 0, -1]]))  # looking back to z axis
+            self.original_rot = R.from_matrix(np.array([[1, 0, 0], [0, 1, 0], [0, 0, -1]]))
+        else:
+            self.rot = R.from_matrix(rot)
+            self.original_rot = R.from_matrix(rot)
+
+        # self.up = np.array([0, -1, 0], dtype=np.float32)  # need to be normalized!
+        self.up = -self.rot.as_matrix()[:3, 1]
+
+    # pose
+    @property
+    def pose(self):
+        # first move camera to radius
+        res = np.eye(4, dtype=np.float32)
+        res[2, 3] = self.radius
+        # rotate
+        rot = np.eye(4, dtype=np.float32)
+        rot[:3, :3] = self.rot.as_matrix()
+        res = rot @ res
+        # translate
+        res[:3, 3] -= self.center
+        return res
+
+    # view
+    @property
+    def view(self):
+        return np.linalg.inv(self.pose)
+
+    # intrinsics
+    @property
+    def intrinsics(self):
+        focal = self.H / (2 * np.tan(np.radians(self.fovy) / 2))
+        return np.array([focal, focal, self.W // 2, self.H // 2], dtype=np.float32)
+    
+    def reset_view(self):
+        self.rot = self.original_rot
+        self.radius = self.original_radius
+        self.radius *= 2
+        self.center = np.array([0, 0, 0], dtype=np.float32)
+
+    def set_view(self, rot, radius):
+        self.rot = rot
+        self.radius = radius
+        self.radius *= 2
+
+    def orbit(self, lastX, lastY, X, Y):
+        def vec_angle(v0: np.ndarray, v1: np.ndarray):
+            return np.arccos(np.clip(np.dot(v0, v1)/(np.linalg.norm(v0)*np.linalg.norm(v1)), -1., 1.))
+        ball_start = screen_to_arcball(np.array([lastX+1e-6, lastY+1e-6]))
+        ball_curr = screen_to_arcball(np.array([X, Y]))
+        rot_radians = vec_angle(ball_start, ball_curr)
+        rot_axis = normalize_vec(np.cross(ball_start, ball_curr))
+        q = Quaternion(axis=rot_axis, radians=rot_radians)
+        self.rot = self.rot * R.from_matrix(q.inverse.rotation_matrix)
+    
+    def scale(self, delta):
+        self.radius *= 1.1 ** (-delta)
+
+    def pan(self, dx, dy, dz=0):
+        # pan in camera coordinate system (careful on the sensitivity!)
+        self.center += 0.0005 * self.rot.as_matrix()[:3, :3] @ np.array([-dx, -dy, dz])
@@ -0,0 +1,273 @@
+import re
+import time
+
+from utils.command_server import validate_batch
+
+#* Local fast path of the agent: requests that map directly onto one or more GUI commands ("make the skull red",
+#* "hide TF2 and set the background to black", "set fov to 40") are resolved by a small grammar, objects by the CLIP
+#* TF matcher (LLM_agent.TextEmbeddingService). Whenever a clause does not match a rule, an object is ambiguous or
+#* a command would not validate, the request goes to the LLM instead.
+
+COLOR_RGB = {
+    "red": (255, 0, 0), "green": (0, 200, 0), "blue": (0, 0, 255), "yellow": (255, 255, 0), "orange": (255, 165, 0),
+    "purple": (128, 0, 128), "pink": (255, 105, 180), "white": (255, 255, 255), "black": (0, 0, 0),
+    "gray": (128, 128, 128), "grey": (128, 128, 128), "brown": (139, 69, 19), "cyan": (0, 255, 255),
+    "magenta": (255, 0, 255), "light blue": (173, 216, 230), "dark blue": (0, 0, 139), "light green": (144, 238, 144),
+    "dark green": (0, 100, 0), "dark red": (139, 0, 0), "gold": (255, 215, 0),
+}
+OPACITY_WORDS = {"transparent": 0.0, "invisible": 0.0, "hidden": 0.0, "opaque": 1.0, "visible": 1.0,
+                 "semi-transparent": 0.5, "semi transparent": 0.5, "semitransparent": 0.5, "half transparent": 0.5,
+                 "half-transparent": 0.5, "translucent": 0.5}
+MODES = {"phong": "phong", "normal": "normal", "normals": "normal", "diffuse": "diffuse_term",
+         "specular": "specular_term", "ambient": "ambient_term"}
+#* references the grammar cannot resolve without the conversation
+PRONOUNS = {"it", "them", "this", "that", "these", "those", "everything", "all", "all objects", "all the objects",
+            "other objects", "the rest", "others", "object", "objects"}
+#* words that make a phrase more than an object: a view ("the best view of the skull", "the skull from the left"),
+#* a restriction ("the skull only") or a relative change ("the skull more [transparent]") is left to the LLM
+NON_OBJECT_WORDS = {"view", "views", "angle", "side", "from", "left", "right", "top", "bottom", "front", "back",
+                    "behind", "above", "below", "inside", "closer", "close", "up", "only", "just", "alone", "except",
+                    "but", "other", "another", "more", "less", "most", "least", "best", "better", "bit", "little",
+                    "slightly", "very", "too", "much", "brighter", "darker", "lighter", "bigger", "smaller", "again",
+                    "with", "without", "than", "instead", "also"}
+MAX_OBJECT_WORDS = 4
+
+COLOR = "(" + "|".join(sorted(map(re.escape, COLOR_RGB), key=len, reverse=True)) + ")"
+OPACITY = "(" + "|".join(sorted(map(re.escape, OPACITY_WORDS), key=len, reverse=True)) + ")"
+NUMBER = r"(\d+(?:\.\d+)?)"
+#* an object phrase never spans a clause separator, "hide the skull and make the jaw red" is two clauses
+OBJ = r"(?:the )?((?:(?!\band\b|\bthen\b|[,;]).)+?)"
+SEPARATORS = re.compile(r"(\s*(?:[,;]\s*(?:and then\b|then\b|and\b)?|\band then\b|\bthen\b|\band\b)\s*)")
+TF_REFERENCE = re.compile(r"^(?:tf|transfer function|object(?: number)?)\s*#?\s*(\d+)$")
+
+
+class LocalIntentParser:
+    """
+    parse(text, status, text_embeddings, best_frames) returns (commands, explanations, objects) of a request made
+    only of simple intents, objects being the descriptions CLIP resolved ("a skull", as the extraction call writes
+    them), or None to fall back to the LLM. A request is split into clauses at "and" / "then" / "," / ";"
+    (longest clause that matches a rule first); every clause has to match a rule. Objects are resolved as
+    "TF<n>" / "object <n>", or by CLIP when the best TF has similarity >= min_similarity and a margin >= margin
+    over the second best (only "TF<n>" without text_embeddings); phrases with NON_OBJECT_WORDS are not objects. The commands follow the rules of the
+    LLM prompt: a shown object gets opacity 1 and its best view (best_frames(tf_name), LLM_agent.load_best_frames),
+    a colored one opacity 1 and a legend entry, a hidden one loses its legend entry.
+    """
+    def __init__(self, min_similarity=0.2, margin=0.02):
+        self.min_similarity = min_similarity
+        self.margin = margin
+        self.resolved = 0
+        self.fallbacks = 0
+        self.seconds = 0.0
+        #* first matching rule wins: background, light and mode rules before the generic object rules
+        self.rules = [
+            (r"^(?:reset|restore) (?:the )?(?:view|camera)(?: to (?:the )?default)?$", self.reset_view),
+            (r"^(?:reset|restore) (?:all )?(?:the )?(?:colou?rs?|opacit(?:y|ies))(?: and (?:the )?(?:colou?rs?|opacit(?:y|ies)))?$",
+             self.reset_color_opacity),
+            (rf"^(?:set|change) (?:the )?(?:fov|field of view) to {NUMBER}(?: degrees?)?$", self.set_fov),
+            (r"^zoom (in|out)$", self.zoom),
+            (rf"^(?:set|change|make|turn) (?:the )?background(?: colou?r)? (?:to |into )?{COLOR}$", self.set_background),
+            (rf"^(?:use )?(?:an? )?{COLOR} background$", self.set_background),
+            (rf"^(?:set|change) (?:the )?(ambient|diffuse|specular|shininess)(?: light| term| intensity)? (?:to )?{NUMBER}$",
+             self.set_light),
+            (rf"^(?:set|change) (?:the )?light (angle|elevation) (?:to )?{NUMBER}(?: degrees?)?$", self.set_light),
+            (r"^(?:turn|switch) (on|off) (?:the )?head ?light$", self.set_headlight),
+            (r"^(?:turn|switch) (?:the )?head ?light (on|off)$", self.set_headlight),
+            (r"^(?:switch to|use|change to|set (?:the )?(?:render(?:ing)? )?mode to) "
+             r"(phong|normals?|diffuse|specular|ambient)(?: mode| shading| rendering| term)?$", self.set_mode),
+            (rf"^hide {OBJ}$", self.hide),
+            (rf"^(?:make|set|turn) {OBJ} (?:to )?(?:fully )?{OPACITY}$", self.set_opacity_word),
+            (rf"^set (?:the )?opacity of {OBJ} to {NUMBER}(%?)$", self.set_opacity),
+            (rf"^set {OBJ} opacity to {NUMBER}(%?)$", self.set_opacity),
+            (rf"^(?:show|highlight|display) (?:me )?{OBJ} in {COLOR}$", self.show_in_color),
+            (rf"^(?:make|colou?r|paint|turn|set|change) (?:the )?(?:colou?r of )?{OBJ} (?:to |in |into )?{COLOR}$",
+             self.set_color),
+            (rf"^(?:show|display) (?:me )?{OBJ}$", self.show),
+        ]
+        self.rules = [(re.compile(pattern), handler) for pattern, handler in self.rules]
+
+    @staticmethod
+    def normalize(text):
+        text = text.lower().strip()
+        text = re.sub(r"[.!?]+$", "", text).strip()
+        text = re.sub(r"^(?:please |can you |could you |would you |i want you to |i'd like you to )+", "", text)
+        text = re.sub(r"(?:,? please)$", "", text)
+        return re.sub(r"\s+", " ", text).strip()
+
+    def parse(self, text, status=None, text_embeddings=None, best_frames=None):
+        tic = time.perf_counter()
+        result = self._parse(text, status or {}, text_embeddings, best_frames)
+        self.seconds += time.perf_counter() - tic
+        if result is None:
+            self.fallbacks += 1
+        else:
+            self.resolved += 1
+        return result
+
+    def _parse(self, text, status, text_embeddings, best_frames):
+        #* per-request context of the handlers (several requests can be parsed at once)
+        request = {"status": status, "text_embeddings": text_embeddings, "best_frames": best_frames, "objects": []}
+        num_TFs = len(status["opacity_factors"]) if "opacity_factors" in status else None
+        pieces = SEPARATORS.split(self.normalize(text))
+        commands, explanations = [], []
+        start = 0
+        while start < len(pieces):
+            #* greedy: the longest run of pieces that is one clause ("reset colors and opacity")
+            for end in range(len(pieces), start, -1):
+                if (end - start) % 2 == 0:
+                    continue  # a clause ends on a piece, not on a separator
+                num_objects = len(request["objects"])
+                result = self.parse_clause(request, "".join(pieces[start:end]).strip())
+                if result is not None:
+                    break
+                del request["objects"][num_objects:]  # objects of a clause that did not match
+            else:
+                return None
+            commands += result[0]
+            explanations += result[1]
+            start = end + 1
+        if not commands or validate_batch(commands, num_TFs=num_TFs, modes=MODES.values()):
+            return None
+        return commands, explanations, list(dict.fromkeys(request["objects"]))
+
+    def parse_clause(self, request, clause):
+        for pattern, handler in self.rules:
+            match = pattern.match(clause)
+            if match is not None:
+                return handler(request, *match.groups())
+        return None
+
+    def resolve(self, request, phrase):
+        """(tf_index, name) of an object phrase, name being how the answer refers to it; None if it is not confidently one TF."""
+        phrase = re.sub(r"^(?:the|a|an) ", "", phrase.strip())
+        if phrase in PRONOUNS or not phrase:
+            return None
+        words = phrase.split()
+        if len(words) > MAX_OBJECT_WORDS or any(word in NON_OBJECT_WORDS for word in words):
+            return None
+        match = TF_REFERENCE.match(phrase)
+        if match is not None:
+            return int(match.group(1)), f"TF{int(match.group(1))}"
+        text_embeddings = request["text_embeddings"]
+        if text_embeddings is None:
+            return None
+        #* same description style as the extraction call ("a pencil")
+        similarity = text_embeddings.similarities([f"a {phrase}"])[0]
+        order = similarity.argsort()[::-1]
+        best = similarity[order[0]]
+        second = similarity[order[1]] if len(order) > 1 else -1.0
+        if best < self.min_similarity or best - second < self.margin:
+            return None
+        tf_index = int(re.search(r"\d+", text_embeddings.tf_names[order[0]]).group())
+        request["objects"].append(f"a {phrase}")
+        return tf_index, f"the {phrase} (TF{tf_index})"
+
+    def reset_view(self, request):
+        return ["reset_view"], ["I reset the view to the default."]
+
+    def reset_color_opacity(self, request):
+        return ["reset_color_opacity"], ["I reset the colors and opacities to the default."]
+
+    def set_fov(self, request, fov):
+        return [f"set_fov {int(float(fov))}"], [f"I set the field of view to {int(float(fov))} degrees."]
+
+    def zoom(self, request, direction):
+        status = request["status"]
+        if "field_of_view" not in status:
+            return None
+        fov = int(round(status["field_of_view"] * (0.8 if direction == "in" else 1.25)))
+        fov = min(max(fov, 1), 120)
+        return [f"set_fov {fov}"], [f"I zoomed {direction} by setting the field of view to {fov} degrees."]
+
+    def set_background(self, request, color):
+        r, g, b = COLOR_RGB[color]
+        return [f"set_background {r} {g} {b}"], [f"I set the background to {color}."]
+
+    def set_light(self, request, param, value):
+        return [f"set_light {param} {float(value):g}"], [f"I set the {param} light to {float(value):g}."]
+
+    def set_headlight(self, request, state):
+        return [f"set_light headlight {'true' if state == 'on' else 'false'}"], [f"I turned the headlight {state}."]
+
+    def set_mode(self, request, mode):
+        return [f"set_mode {MODES[mode]}"], [f"I switched to the {mode} rendering mode."]
+
+    def best_view(self, request, tf_index):
+        """First best frame of a TF (the frame set_view uses), None if unknown."""
+        text_embeddings, best_frames = request["text_embeddings"], request["best_frames"]
+        if text_embeddings is None or best_frames is None:
+            return None
+        tf_names = [name for name in text_embeddings.tf_names if int(re.search(r"\d+", name).group()) == tf_index]
+        if not tf_names:
+            return None
+        try:
+            frames = best_frames(tf_names[0])
+        except (OSError, ValueError):
+            return None
+        return int(frames[0]) if frames else None
+
+    @staticmethod
+    def legend_label(tf_index, phrase):
+        label = re.sub(r"^(?:the|a|an) ", "", phrase.strip())
+        return f"TF{tf_index}" if TF_REFERENCE.match(label) else label
+
+    def hide(self, request, phrase):
+        return self.opacity_command(request, phrase, 0.0)
+
+    def show(self, request, phrase):
+        target = self.resolve(request, phrase)
+        if target is None:
+            return None
+        tf_index, name = target
+        commands = [f"set_opacity {tf_index} 1"]
+        explanations = [f"I set the opacity of {name} to 1 so that it is visible."]
+        #* the view is kept while it is frozen (guided tour, stylization)
+        if request["status"].get("freeze_view"):
+            return commands, explanations
+        frame = self.best_view(request, tf_index)
+        if frame is None:
+            return None
+        return (commands + [f"set_view {tf_index} {frame}"],
+                explanations + [f"I moved the camera to frame {frame}, one of its best views."])
+
+    def set_opacity_word(self, request, phrase, word):
+        return self.opacity_command(request, phrase, OPACITY_WORDS[word])
+
+    def set_opacity(self, request, phrase, value, percent):
+        value = float(value) / 100 if percent else float(value)
+        if not 0 <= value <= 1:
+            return None
+        return self.opacity_command(request, phrase, value)
+
+    def opacity_command(self, request, phrase, value):
+        target = self.resolve(request, phrase)
+        if target is None:
+            return None
+        tf_index, name = target
+        commands = [f"set_opacity {tf_index} {value:g}"]
+        label = self.legend_label(tf_index, phrase)
+        if value == 0 and label in request["status"].get("legend", {}):
+            commands.append(f'legend delete "{label}"')
+        return commands, [f"I set the opacity of {name} to {value:g}."]
+
+    def set_color(self, request, phrase, color):
+        target = self.resolve(request, phrase)
+        if target is None:
+            return None
+        tf_index, name = target
+        r, g, b = COLOR_RGB[color]
+        label = self.legend_label(tf_index, phrase)
+        return ([f"set_opacity {tf_index} 1", f"set_color {tf_index} {r} {g} {b}", f'legend add "{label}" {r} {g} {b}'],
+                [f"I colored {name} {color} and set its opacity to 1 so that it is visible."])
+
+    def show_in_color(self, request, phrase, color):
+        shown = self.show(request, phrase)
+        colored = self.set_color(request, phrase, color)
+        if shown is None or colored is None:
+            return None
+        return shown[0] + [c for c in colored[0] if c not in shown[0]], colored[1] + shown[1][1:]
+
+    def stats(self):
+        parsed = self.resolved + self.fallbacks
+        return {"resolved": self.resolved, "fallbacks": self.fallbacks,
+                "resolved_rate": self.resolved / parsed if parsed else 0.0,
+                "mean_ms": self.seconds / parsed * 1e3 if parsed else 0.0}
@@ -0,0 +1,155 @@
+import os
+import json
+import struct
+from collections import OrderedDict
+import numpy as np
+import torch
+from plyfile import PlyData
+
+
+def fill_structured_array(elements, arrays):
+    """
+    Fills the numpy structured array `elements` column by column from a list of [N, C_i] arrays.
+    The columns are matched to the fields by position, i.e. equivalent to
+    elements[:] = list(map(tuple, np.concatenate(arrays, axis=1))) without building one tuple per row.
+    """
+    names = elements.dtype.names
+    field = 0
+    for array in arrays:
+        array = array.reshape(array.shape[0], -1)
+        for column in range(array.shape[1]):
+            elements[names[field]] = array[:, column]
+            field += 1
+    assert field == len(names), f"{field} columns for {len(names)} fields"
+    return elements
+
+
+#* native container of quantised phong Gaussians:
+#* magic (8 bytes) | header size (uint64) | JSON header | columns, each aligned to NATIVE_ALIGNMENT bytes
+NATIVE_MAGIC = b"NLIGSNAT"
+NATIVE_VERSION = 1
+NATIVE_ALIGNMENT = 16
+NATIVE_EXT = ".gsn"
+# uint8 codebook index columns of a quantised checkpoint, in load order
+NATIVE_ID_COLUMNS = [("opacity", 1), ("scaling", 3), ("normal", 3), ("rotation", 4), ("offset_color", 3),
+                     ("diffuse_factor", 1), ("shininess", 1), ("ambient_factor", 1), ("specular_factor", 1)]
+TORCH_DTYPES = {"uint8": torch.uint8, "int16": torch.int16, "float16": torch.float16, "float32": torch.float32}
+
+
+def native_path_of(ply_path):
+    """point_cloud.ply -> point_cloud.gsn"""
+    return os.path.splitext(ply_path)[0] + NATIVE_EXT
+
+
+def _align(offset):
+    return (offset + NATIVE_ALIGNMENT - 1) // NATIVE_ALIGNMENT * NATIVE_ALIGNMENT
+
+
+def write_native_gaussians(path, columns, meta=None):
+    """Writes an ordered dict of numpy arrays (plus JSON serializable meta data) as a native container."""
+    header = dict(meta or {})
+    header["version"] = NATIVE_VERSION
+    header["columns"] = []
+    offset = 0
+    for name, array in columns.items():
+        header["columns"].append({"name": name, "dtype": array.dtype.name, "shape": list(array.shape),
+                                  "offset": offset, "nbytes": array.nbytes})
+        offset = _align(offset + array.nbytes)
+    header["data_nbytes"] = offset
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = _align(len(NATIVE_MAGIC) + 8 + len(header_bytes))
+
+    with open(path, "wb") as f:
+        f.write(NATIVE_MAGIC)
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        f.write(b"\0" * (data_start - f.tell()))
+        for column, array in zip(header["columns"], columns.values()):
+            f.write(b"\0" * (data_start + column["offset"] - f.tell()))
+            f.write(np.ascontiguousarray(array).tobytes())
+        f.write(b"\0" * (data_start + offset - f.tell()))
+
+
+def read_native_header(path):
+    """Returns (header, byte offset of the column data)."""
+    with open(path, "rb") as f:
+        if f.read(len(NATIVE_MAGIC)) != NATIVE_MAGIC:
+            raise ValueError(f"{path} is not a native Gaussian container")
+        header_size, = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(header_size).decode("utf-8"))
+    if header["version"] != NATIVE_VERSION:
+        raise ValueError(f"Unsupported native container version {header['version']} in {path}")
+    return header, _align(len(NATIVE_MAGIC) + 8 + header_size)
+
+
+def load_native_gaussians(path, device="cuda"):
+    """
+    Memory-maps a native container and moves its column data to the device as one contiguous buffer.
+    Returns (header, {column name: tensor}), the tensors are views into that single buffer.
+    """
+    header, data_start = read_native_header(path)
+    data = np.memmap(path, dtype=np.uint8, mode="c", offset=data_start, shape=(header["data_nbytes"],))
+    buffer = torch.from_numpy(data).to(device)
+    columns = {}
+    for column in header["columns"]:
+        start = column["offset"]
+        view = buffer[start:start + column["nbytes"]].view(TORCH_DTYPES[column["dtype"]])
+        columns[column["name"]] = view.view(column["shape"])
+    return header, columns
+
+
+def read_quantised_ply(ply_path):
+    """
+    Reads a quantised point_cloud.ply (GaussianModel.my_save_ply(quantised=True)) into the native columns:
+    positions, uint8 codebook index columns and the codebook table (fp16 for half-float checkpoints, else fp32).
+    Returns (columns, meta).
+    """
+    plydata = PlyData.read(ply_path)
+    vertex_group, codebook_centers = plydata.elements[0], plydata.elements[-1]
+    if codebook_centers.name != "codebook_centers":
+        raise ValueError(f"{ply_path} is not a quantised checkpoint")
+    half_float = vertex_group["x"].dtype == np.int16
+
+    def stack(names, dtype):
+        return np.stack([np.asarray(vertex_group[name]) for name in names], axis=1).astype(dtype, copy=False)
+
+    xyz = stack(["x", "y", "z"], np.int16 if half_float else np.float32)
+    columns = OrderedDict()
+    columns["xyz"] = xyz.view(np.float16) if half_float else xyz
+    for name, count in NATIVE_ID_COLUMNS:
+        prefix = "rot" if name == "rotation" else ("scale" if name == "scaling" else name)
+        names = [name] if count == 1 else [f"{prefix}_{i}" for i in range(count)]
+        columns[name] = stack(names, np.uint8)
+    codebook_keys = [prop.name for prop in codebook_centers.properties]
+    codebook = np.stack([np.asarray(codebook_centers[key]) for key in codebook_keys], axis=1)
+    columns["codebook"] = codebook.view(np.float16) if half_float else codebook.astype(np.float32)
+    return columns, {"num_gaussians": int(xyz.shape[0]),
+                     "codebook_keys": codebook_keys,
+                     "source": os.path.basename(ply_path)}
+
+
+def convert_ply_to_native(ply_path, native_path=None):
+    """Converts a quantised point_cloud.ply into a native container next to it (or at native_path)."""
+    native_path = native_path or native_path_of(ply_path)
+    columns, meta = read_quantised_ply(ply_path)
+    write_native_gaussians(native_path, columns, meta=meta)
+    return native_path
+
+
+def read_quantised_host(ply_path):
+    """
+    Reads the columns of a quantised checkpoint into host memory (pinned when CUDA is available) for
+    GaussianModel.load_composition, from its native container when it is up to date, else from the ply.
+    Safe to call from worker threads. Returns {"num_gaussians", "codebook_keys", "columns"}.
+    """
+    native_path = native_path_of(ply_path)
+    if os.path.exists(native_path) and os.path.getmtime(native_path) >= os.path.getmtime(ply_path):
+        meta, columns = load_native_gaussians(native_path, device="cpu")
+    else:
+        columns, meta = read_quantised_ply(ply_path)
+        columns = {name: torch.from_numpy(np.ascontiguousarray(column)) for name, column in columns.items()}
+    if torch.cuda.is_available():
+        columns = {name: column.pin_memory() for name, column in columns.items()}
+    return {"num_gaussians": meta["num_gaussians"],
+            "codebook_keys": meta["codebook_keys"],
+            "columns": columns}
@@ -0,0 +1,96 @@
+import time
+import threading
+import contextlib
+
+#* Heavy optional subsystems of the GUI (CLIP, InstructPix2Pix, audio, LLM clients) are built on first use,
+#* or warmed up on a background thread once the first frame is on screen. Their modules are imported inside the
+#* factories, so nothing of open_clip / diffusers / openai / pygame / sounddevice is imported before it is needed.
+
+
+class StartupReport:
+    """Wall-clock cost of the startup phases and of each subsystem, printed as one table."""
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.entries = []
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds, where="main"):
+        with self._lock:
+            self.entries.append((name, seconds, where))
+
+    @contextlib.contextmanager
+    def phase(self, name, where="main"):
+        tic = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - tic, where)
+
+    def summary(self):
+        with self._lock:
+            entries = list(self.entries)
+        lines = [f"Startup report ({time.perf_counter() - self.start:.2f} s since start):"]
+        for name, seconds, where in entries:
+            lines.append(f"  {name:28s} {seconds * 1e3:10.1f} ms  [{where}]")
+        return "\n".join(lines)
+
+
+class LazySubsystem:
+    """
+    A subsystem built by factory() on the first get(), at most once even if several threads ask for it.
+    warm_up() builds it on a daemon thread instead, get() then only waits for that thread if it is still running.
+    """
+    def __init__(self, name, factory, report=None):
+        self.name = name
+        self.factory = factory
+        self.report = report
+        self.value = None
+        self.error = None
+        self.loaded = False
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self.loaded:
+            return self.value
+        with self._lock:
+            if not self.loaded:
+                self._build("on demand")
+        if self.error is not None:
+            raise RuntimeError(f"{self.name} failed to load: {self.error}")
+        return self.value
+
+    def _build(self, where):
+        tic = time.perf_counter()
+        try:
+            self.value = self.factory()
+            self.error = None
+        except Exception as e:
+            self.error = e
+            print(f"Loading {self.name} failed: {e}")
+            return
+        finally:
+            if self.report is not None:
+                self.report.record(self.name, time.perf_counter() - tic, where)
+        self.loaded = True
+
+    def warm_up(self):
+        """Starts building the subsystem on a daemon thread (no-op if it is already loaded); returns the thread."""
+        def run():
+            with self._lock:
+                if not self.loaded:
+                    self._build("background")
+        thread = threading.Thread(target=run, name=f"warm_up_{self.name}", daemon=True)
+        thread.start()
+        return thread
+
+
+def warm_up_all(subsystems, report=None):
+    """Builds the subsystems one after the other on one daemon thread (they share the GPU and the disk)."""
+    def run():
+        for subsystem in subsystems:
+            subsystem.warm_up().join()
+        if report is not None:
+            print(report.summary())
+    thread = threading.Thread(target=run, name="warm_up", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,150 @@
+import os
+import re
+import json
+import time
+import threading
+
+#* LLM_agent.call_llm / stream_llm talk to a backend instead of an OpenAI client: complete(params) returns the
+#* answer text, stream(params) yields its deltas; params is the chat completions request (LLM_agent.llm_params).
+
+LLM_BASE_URLS = {"deepseek": "https://api.deepseek.com", "gpt": None, "llama": "https://api.llama-api.com"}
+
+
+class LLMBackend:
+    def complete(self, params):
+        raise NotImplementedError
+
+    def stream(self, params):
+        #* backends without streaming deliver the whole answer as one delta
+        yield self.complete(params)
+
+
+class OpenAIBackend(LLMBackend):
+    """Any OpenAI-compatible chat completions endpoint (OpenAI, DeepSeek, Llama API, a local server)."""
+    def __init__(self, api_key=None, base_url=None, client=None):
+        if client is None:
+            from openai import OpenAI
+            client = OpenAI(api_key=api_key, base_url=base_url)
+        self.client = client
+
+    def complete(self, params):
+        response = self.client.chat.completions.create(**dict(params, stream=False))
+        return response.choices[0].message.content
+
+    def stream(self, params):
+        for chunk in self.client.chat.completions.create(**dict(params, stream=True)):
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+def as_backend(client):
+    """Backends are used as they are, OpenAI clients are wrapped in an OpenAIBackend."""
+    return client if isinstance(client, LLMBackend) else OpenAIBackend(client=client)
+
+
+def request_stage(params):
+    #* the object extraction is the only call in JSON mode
+    return "extraction" if params.get("response_format") else "commands"
+
+
+def request_query(params):
+    """The user request of a chat completions request: the last user message, or its "User request in step N:" line."""
+    text = ""
+    for message in reversed(params["messages"]):
+        if message["role"] == "user":
+            content = message["content"]
+            if isinstance(content, list):
+                content = "\n".join(part.get("text", "") for part in content if part.get("type") == "text")
+            text = content
+            break
+    match = re.search(r"User request in step \d+: (.*?)\n\n", text, re.DOTALL)
+    return match.group(1) if match else text.strip()
+
+
+class RecordReplayBackend(LLMBackend):
+    """
+    Canned answers keyed by (user request, stage), stage being "extraction" (JSON mode) or "commands".
+    With a backend it records: every answer of the backend is stored, save() writes them as JSON.
+    Without it replays them, deterministically: each call waits `latency` seconds (time to first token) and
+    `token_latency` seconds per ~4 characters, stream() spreads the tokens over that time like a real endpoint.
+    A request without a canned answer gets `default` (KeyError if None).
+    """
+    def __init__(self, path=None, backend=None, latency=0.0, token_latency=0.0, default=None):
+        self.path = path
+        self.backend = backend
+        self.latency = latency
+        self.token_latency = token_latency
+        self.default = default
+        self.responses = {}
+        self._lock = threading.Lock()
+        #* recording appends to an existing corpus
+        if path is not None and (backend is None or os.path.exists(path)):
+            self.load(path)
+
+    def load(self, path):
+        with open(path, "r") as f:
+            corpus = json.load(f)
+        for entry in corpus["queries"]:
+            self.responses[entry["query"]] = {stage: entry[stage] for stage in ["extraction", "commands"] if stage in entry}
+
+    def save(self, path=None):
+        with self._lock:
+            queries = [dict(query=query, **answers) for query, answers in self.responses.items()]
+        with open(path or self.path, "w") as f:
+            json.dump({"queries": queries}, f, indent=2)
+
+    def lookup(self, params):
+        answers = self.responses.get(request_query(params), {})
+        answer = answers.get(request_stage(params), self.default)
+        if answer is None:
+            raise KeyError(f"no canned {request_stage(params)} answer for {request_query(params)!r}")
+        return answer
+
+    def record(self, params, answer):
+        with self._lock:
+            self.responses.setdefault(request_query(params), {})[request_stage(params)] = answer
+        return answer
+
+    @staticmethod
+    def tokens(text):
+        return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+    def complete(self, params):
+        if self.backend is not None:
+            return self.record(params, self.backend.complete(params))
+        answer = self.lookup(params)
+        time.sleep(self.latency + self.token_latency * len(self.tokens(answer)))
+        return answer
+
+    def stream(self, params):
+        if self.backend is not None:
+            deltas = []
+            for delta in self.backend.stream(params):
+                deltas.append(delta)
+                yield delta
+            self.record(params, "".join(deltas))
+            return
+        answer = self.lookup(params)
+        time.sleep(self.latency)
+        for token in self.tokens(answer):
+            time.sleep(self.token_latency)
+            yield token
+
+
+def make_backend(api_key, llm_name, replay=None, record=None, latency=0.0, token_latency=0.0):
+    """
+    Backend of the LLM named llm_name (the GUI LLM selector): DeepSeek, GPT or Llama API by name.
+    replay: corpus JSON to answer from instead (offline, see RecordReplayBackend); record: corpus JSON the answers of
+    the real backend are added to (call save() to write it).
+    """
+    if replay is not None:
+        return RecordReplayBackend(replay, latency=latency, token_latency=token_latency)
+    if 'deepseek' in llm_name.lower():
+        backend = OpenAIBackend(api_key=api_key[llm_name], base_url=LLM_BASE_URLS["deepseek"])
+    elif 'gpt' in llm_name.lower():
+        backend = OpenAIBackend(api_key=api_key[llm_name], base_url=LLM_BASE_URLS["gpt"])
+    else:
+        backend = OpenAIBackend(api_key=api_key[llm_name], base_url=LLM_BASE_URLS["llama"])
+    if record is not None:
+        return RecordReplayBackend(record, backend=backend)
+    return backend
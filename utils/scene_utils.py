@@ -0,0 +1,227 @@
+import os
+import glob
+import shlex
+import numpy as np
+import torch
+from scene import GaussianModel
+from scene.palette_color import LearningPaletteColor
+from scene.opacity_trans import LearningOpacityTransform
+from scene.light_trans import LearningLightTransform
+from utils.camera_utils import Camera
+from utils.system_utils import searchForMaxIteration
+from utils.gui_utils import read_initial_view, read_train_view
+from utils.command_server import validate_batch
+
+#* Scene loading and render state shared by NLI.GUI and headless_server.HeadlessRenderer: the socket commands
+#* changing the scene are applied here, the GUI only mirrors their effect in its widgets.
+
+LIGHT_ATTRIBUTES = {"ambient": "ambient_multi", "diffuse": "light_intensity_multi",
+                    "specular": "specular_multi", "shininess": "shininess_multi"}
+SCENE_COMMANDS = ["set_opacity", "set_color", "set_light", "set_mode", "set_fov", "set_background", "set_view",
+                  "reset_view", "reset_color_opacity", "start_tour", "legend"]
+
+
+def load_ckpts_paths(source_dir, stylize_name=None):
+    TFs_folders = sorted(glob.glob(f"{source_dir}/TF*"))
+    TFs_names = sorted([os.path.basename(folder) for folder in TFs_folders])
+
+    ckpts_transforms = {}
+    for idx, TF_folder in enumerate(TFs_folders):
+        one_TF_json = {'path': None, 'palette':None, 'transform': [1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0]}
+        if stylize_name and os.path.exists(os.path.join(TF_folder, "neilf", stylize_name, 'time.txt')):
+            ckpt_dir = os.path.join(TF_folder, "neilf", stylize_name)
+        else:
+            ckpt_dir = os.path.join(TF_folder, "neilf", "point_cloud")
+        max_iters = searchForMaxIteration(ckpt_dir)
+        ckpt_path = os.path.join(ckpt_dir, f"iteration_{max_iters}", "point_cloud.ply")
+        palette_path = os.path.join(ckpt_dir, f"iteration_{max_iters}", "palette_colors_chkpnt.pth")
+        one_TF_json['path'] = ckpt_path
+        one_TF_json['palette'] = palette_path
+        ckpts_transforms[TFs_names[idx]] = one_TF_json
+
+    return ckpts_transforms
+
+def scene_composition(scene_dict: dict, dataset, codebook_resident=False):
+    paths, transforms = [], []
+    for scene in scene_dict:
+        print("Compose scene from GS path:", scene_dict[scene]["path"])
+        paths.append(scene_dict[scene]["path"])
+        transforms.append(torch.tensor(scene_dict[scene]["transform"], device="cuda").reshape(4, 4))
+
+    #* TF files are parsed in parallel and decoded into one preallocated composite (TF order kept)
+    gaussians_composite = GaussianModel.load_composition(paths, transforms, dataset.sh_degree,
+                                                         codebook_resident=codebook_resident)
+    n = gaussians_composite.get_xyz.shape[0]
+    print(f"Totally {n} points loaded.")
+
+    return gaussians_composite
+
+def load_scene(dataset, pipe, source_dir, stylize_name=None, codebook_resident=False, opacity_factor=1.0):
+    """Composes the TFs of source_dir, returns (render_kwargs, TF names)."""
+    scene_dict = load_ckpts_paths(source_dir, stylize_name)
+    TFs_names = list(scene_dict.keys())
+    palette_color_transforms = []
+    opacity_transforms = []
+    for TFs_name in TFs_names:
+        palette_color_transform = LearningPaletteColor()
+        palette_color_transform.create_from_ckpt(f"{scene_dict[TFs_name]['palette']}")
+        palette_color_transforms.append(palette_color_transform)
+        opacity_transforms.append(LearningOpacityTransform(opacity_factor=opacity_factor))
+    light_transform = LearningLightTransform(theta=180, phi=0)
+
+    gaussians_composite = scene_composition(scene_dict, dataset, codebook_resident)
+    bg_color = [1, 1, 1] if dataset.white_background else [0, 0, 0]
+    render_kwargs = {
+        "pc": gaussians_composite,
+        "pipe": pipe,
+        "bg_color": torch.tensor(bg_color, dtype=torch.float32, device="cuda"),
+        "is_training": False,
+        "dict_params": {
+            "palette_colors": palette_color_transforms,
+            "opacity_factors": opacity_transforms,
+            "light_transform": light_transform
+        }
+    }
+    return render_kwargs, TFs_names
+
+
+class SceneState:
+    """
+    Render state of a composed scene and the dearpygui-free part of the command vocabulary.
+    The renderer sets cam, render_kwargs, TFnums, original_palette_colors, img_path, imgH, imgW, downsample,
+    light_angle, light_elevation, useHeadlight, mode, legend_dict, freeze_view and a FrameScheduler as scheduler.
+    """
+    menu_map = {"phong": "Blinn-Phong", "normal": "Normal", "diffuse_term": "Diffuse",
+                "specular_term": "Specular", "ambient_term": "Ambient"}
+
+    @property
+    def custom_cam(self):
+        w2c = self.cam.view
+        R = w2c[:3, :3].T
+        T = w2c[:3, 3]
+        down = self.downsample
+        H, W = self.imgH // down, self.imgW // down
+        fovy = self.cam.fovy * np.pi / 180
+        fovx = fovy * W / H
+        return Camera(colmap_id=0, R=R, T=-T,
+                      FoVx=fovx, FoVy=fovy, fx=None, fy=None, cx=None, cy=None,
+                      image=torch.zeros(3, H, W), image_name=None, uid=0)
+
+    def validate_commands(self, commands):
+        """Errors of a command batch for this scene (see utils.command_server.validate_batch)."""
+        return validate_batch(commands, num_TFs=self.TFnums, modes=self.menu_map, train_views=self.img_path is not None)
+
+    def get_status(self):
+        light_transform = self.render_kwargs["dict_params"]["light_transform"]
+        def as_float(value):
+            return value.item() if isinstance(value, torch.Tensor) else value
+        return {
+            "mode": self.mode,
+            "field_of_view": self.cam.fovy,
+            "background_color": self.render_kwargs["bg_color"].tolist(),
+            "opacity_factors": [as_float(opacity.opacity_factor) for opacity in self.render_kwargs["dict_params"]["opacity_factors"]],
+            "palette_colors": [color.palette_color.tolist() for color in self.render_kwargs["dict_params"]["palette_colors"]],
+            "light": {
+                "angle": self.light_angle,
+                "elevation": self.light_elevation,
+                "ambient": as_float(light_transform.ambient_multi),
+                "diffuse": as_float(light_transform.light_intensity_multi),
+                "specular": as_float(light_transform.specular_multi),
+                "shininess": as_float(light_transform.shininess_multi),
+            },
+            "freeze_view": self.freeze_view,
+            "legend": self.legend_dict,
+        }
+
+    def reset_view(self):
+        """Initial view of the dataset (initial_view.txt of --image_path), else the start camera. Returns True if loaded."""
+        file_path = None if self.img_path is None else os.path.join(self.img_path, "initial_view.txt")
+        initial_view = None
+        if file_path is not None and os.path.exists(file_path):
+            try:
+                initial_view = read_initial_view(file_path)
+            except Exception as e:
+                print("Error loading initial view:", e)
+        if initial_view is None:
+            if file_path is not None:
+                print("No initial view loaded from", file_path)
+            self.cam.reset_view()
+            return False
+        self.cam.rot, self.cam.radius, self.cam.center = initial_view
+        return True
+
+    def reset_color_opacity(self):
+        with torch.no_grad():
+            for TFidx in range(self.TFnums):
+                self.render_kwargs["dict_params"]["opacity_factors"][TFidx].opacity_factor = torch.tensor(1.0, dtype=torch.float32, device="cuda")
+                self.render_kwargs["dict_params"]["palette_colors"][TFidx].palette_color = self.original_palette_colors[TFidx]
+
+    def initialize_visualization(self):
+        """Default opacities and colors and the initial view. Returns True if the initial view was loaded."""
+        self.reset_color_opacity()
+        loaded = self.reset_view()
+        self.scheduler.mark_dirty()
+        return loaded
+
+    def apply_scene_command(self, message):
+        """
+        Applies a validated command of SCENE_COMMANDS to the render state and marks the frame dirty.
+        Returns False for the other commands, which the renderer handles itself.
+        """
+        parts = shlex.split(message)
+        name = parts[0]
+        if name not in SCENE_COMMANDS:
+            return False
+        dict_params = self.render_kwargs["dict_params"]
+        if name == "set_opacity":
+            with torch.no_grad():
+                dict_params["opacity_factors"][int(parts[1])].opacity_factor = torch.tensor(
+                    float(parts[2]), dtype=torch.float32, device="cuda")
+        elif name == "set_color":
+            r, g, b = [int(c) for c in parts[2:5]]
+            with torch.no_grad():
+                dict_params["palette_colors"][int(parts[1])].palette_color = torch.tensor(
+                    [r / 255, g / 255, b / 255], dtype=torch.float32, device="cuda")
+        elif name == "set_light":
+            param, light_transform = parts[1], dict_params["light_transform"]
+            if param == "headlight":
+                self.useHeadlight = parts[2].lower() == "true"
+                light_transform.useHeadLight = self.useHeadlight
+            elif param in ["angle", "elevation"]:
+                if param == "angle":
+                    self.light_angle = float(parts[2])
+                else:
+                    self.light_elevation = float(parts[2])
+                light_transform.set_light_theta_phi(self.light_angle, self.light_elevation)
+            else:
+                setattr(light_transform, LIGHT_ATTRIBUTES[param], torch.tensor(float(parts[2]), dtype=torch.float32, device="cuda"))
+        elif name == "set_mode":
+            self.mode = parts[1]
+        elif name == "set_fov":
+            self.cam.fovy = int(parts[1])
+        elif name == "set_background":
+            self.render_kwargs["bg_color"] = torch.tensor([int(c) / 255 for c in parts[1:4]], dtype=torch.float32, device="cuda")
+        elif name == "set_view":
+            rot, radius = read_train_view(self.img_path, int(parts[1]), int(parts[2]))
+            self.cam.set_view(rot, radius)
+        elif name == "reset_view":
+            self.reset_view()
+            self.freeze_view = False
+        elif name == "reset_color_opacity":
+            self.reset_color_opacity()
+            self.legend_dict = {}
+        elif name == "start_tour":
+            if self.initialize_visualization():
+                self.freeze_view = True
+        elif parts[1] == "add":
+            self.legend_dict[parts[2]] = [int(c) for c in parts[3:6]]
+        else:
+            self.legend_dict.pop(parts[2], None)
+        #* set_color / set_light commands are single steps, not drags: rendered exactly (the screen-space previews are
+        #* for the widgets), but the cached palette layers / G-buffer the edit does not touch stay valid
+        if name in ["set_color", "set_light"]:
+            self.scheduler.mark_dirty("color" if name == "set_color" else "light")
+            self.scheduler.mark_dirty("exact")
+        else:
+            self.scheduler.mark_dirty()
+        return True
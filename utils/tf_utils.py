@@ -0,0 +1,49 @@
+import torch
+
+
+def build_tf_ids(num_GSs_TF, device="cuda"):
+    """
+    Builds the per-Gaussian TF index of a composed scene, e.g. [2, 3] -> [0, 0, 1, 1, 1].
+    Stored compactly as uint8 (up to 256 TFs) or int16.
+    """
+    dtype = torch.uint8 if len(num_GSs_TF) <= 256 else torch.int16
+    counts = torch.tensor(num_GSs_TF, dtype=torch.long, device=device)
+    tf_ids = torch.repeat_interleave(torch.arange(len(num_GSs_TF), device=device), counts)
+    return tf_ids.to(dtype)
+
+
+def stack_palette_colors(palette_color_transforms):
+    """Stacks the palette colors of all TFs into a [num_TF, 3] tensor (clamped to [0, 1])."""
+    return torch.stack([transform.palette_color.reshape(3) for transform in palette_color_transforms]).clamp(0, 1)
+
+
+def stack_opacity_factors(opacity_transforms):
+    """Stacks the opacity factors of all TFs into a [num_TF] tensor."""
+    return torch.cat([torch.as_tensor(transform.opacity_factor).reshape(1) for transform in opacity_transforms])
+
+
+def gather_per_tf(values, tf_ids):
+    """Gathers per-TF values ([num_TF, ...]) for every Gaussian with a single index_select."""
+    return values.index_select(0, tf_ids.int())
+
+
+def build_visible_indices(num_GSs_TF, visible, device="cuda"):
+    """
+    Builds the indices of the Gaussians of all visible TFs, keeping whole TF ranges,
+    e.g. num_GSs_TF=[2, 3, 1], visible=[True, False, True] -> [0, 1, 5].
+    """
+    starts = [0]
+    for n in num_GSs_TF[:-1]:
+        starts.append(starts[-1] + n)
+    ranges = [torch.arange(start, start + n, device=device)
+              for start, n, vis in zip(starts, num_GSs_TF, visible) if vis]
+    if len(ranges) == 0:
+        return torch.zeros(0, dtype=torch.long, device=device)
+    return torch.cat(ranges)
+
+
+def select_visible(visible_idx, *tensors):
+    """Indexes every per-Gaussian tensor with visible_idx (None tensors and a None index are passed through)."""
+    if visible_idx is None:
+        return tensors
+    return tuple(t if t is None else t.index_select(0, visible_idx) for t in tensors)